@@ -1,11 +1,39 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
+import hashlib
+import json
 import pickle
+import threading
 import numpy as np
-from typing import Optional, List
+from typing import Dict, Optional, List
+from collections import namedtuple
+from functools import lru_cache
+import os
+import random
+import time
 import uvicorn
 
+from area_resolver import AreaResolver
+from attribution import FeatureImportance, contribution_dict
+from artifacts import DEFAULT_MODEL_DIR, artifact_fingerprint, load_json, load_model, \
+    model_version as artifact_model_version
+from backends import DEFAULT_BACKEND, build_router, register_backend
+from comps_index import DEFAULT_INDEX_DIR, load_comps_index
+from drift import DriftMonitor
+from inference_executor import DEFAULT_QUEUE_SIZE, DEFAULT_WORKERS, DeadlineExceeded, InferenceExecutor, QueueFull
+from inference import area_multiplier_array, build_feature_matrix, class_index, compare_areas, encode_column, \
+    explain_deduplicated, predict_deduplicated
+from market_store import DEFAULT_STORE_DIR, load_market_data, to_records
+from parallelism import ParallelismPolicy, limit_native_threads
+from profiling import DEFAULT_PROFILE_DIR, Profiler, ProfilingMiddleware, current_profile, stage
+from postprocessing import format_aed, postprocess
+from portfolio import DEFAULT_CHUNK_SIZE, PortfolioAggregator, iter_lines, iter_records
+from sharding import DEFAULT_SHARD_CACHE_MB, SHARD_MANIFEST, SHARDS_DIR, sharded_backend
+from traffic_capture import DEFAULT_CAPTURE_DIR, DEFAULT_FILE_MB, DEFAULT_MAX_FILES, TrafficCapture, \
+    TrafficCaptureMiddleware
+
 app = FastAPI(
     title="Dubai Real Estate Price Prediction API",
     description="API for predicting Dubai residential property prices using Random Forest model",
@@ -21,34 +49,207 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load model and encoders at startup
-print("Loading model and encoders...")
-with open('model/random_forest_model.pkl', 'rb') as f:
-    model = pickle.load(f)
+# Opt-in profiling of /predict and /predict/batch (X-Profile: 1, or sampling via /admin/profiling)
+profiler = Profiler(
+    profile_dir=os.environ.get('PROFILE_DIR', DEFAULT_PROFILE_DIR),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# Opt-in capture of sampled /predict and /predict/batch traffic for replay_traffic.py
+# (CAPTURE_SAMPLE_RATE or POST /admin/capture); written off the request path to CAPTURE_DIR
+traffic_capture = TrafficCapture(
+    directory=os.environ.get('CAPTURE_DIR', DEFAULT_CAPTURE_DIR),
+    sample_rate=float(os.environ.get('CAPTURE_SAMPLE_RATE', 0)),
+    file_mb=float(os.environ.get('CAPTURE_FILE_MB', DEFAULT_FILE_MB)),
+    max_files=int(os.environ.get('CAPTURE_MAX_FILES', DEFAULT_MAX_FILES))
+)
+app.add_middleware(TrafficCaptureMiddleware, capture=traffic_capture, version=lambda: model_version)
 
-with open('model/label_encoder_area.pkl', 'rb') as f:
-    le_area = pickle.load(f)
+# Model artifacts (MODEL_DIR selects an artifact version, e.g. model/versions/<version>).
+# They are (re)loaded by load_artifacts(), which also rebuilds everything derived from them.
+MODEL_DIR = os.environ.get('MODEL_DIR', DEFAULT_MODEL_DIR)
 
-with open('model/label_encoder_subtype.pkl', 'rb') as f:
-    le_subtype = pickle.load(f)
+# Seconds between checks for changed artifact files (0 disables automatic reloading)
+ARTIFACT_CHECK_INTERVAL = float(os.environ.get('ARTIFACT_CHECK_INTERVAL', 5))
 
-with open('model/label_encoder_regtype.pkl', 'rb') as f:
-    le_regtype = pickle.load(f)
+# Browser/CDN cache lifetime for the metadata endpoints
+METADATA_MAX_AGE = int(os.environ.get('METADATA_MAX_AGE', 60))
 
-with open('model/metadata.pkl', 'rb') as f:
-    metadata = pickle.load(f)
+# reload_lock serializes reloads; artifact_lock only guards the swap, so requests never wait for a load
+reload_lock = threading.Lock()
+artifact_lock = threading.Lock()
 
-# Load validation rules
-import json
+# Everything a prediction reads, swapped in as one immutable tuple: each request takes a single
+# snapshot (current_artifacts()) so a hot reload cannot mix the model of one version with the
+# encoders, multipliers or rules of another
+Artifacts = namedtuple('Artifacts', [
+    'predictor', 'le_area', 'le_subtype', 'le_regtype', 'validation_rules', 'area_multipliers',
+    'area_resolver', 'drift_monitor', 'feature_importance', 'model_version', 'area_comparisons'
+])
+
+# Property templates whose area comparison is kept per artifact snapshot
+AREA_COMPARISON_CACHE_SIZE = 256
+
+# Dedicated inference workers with a bounded admission queue (requests beyond it get a fast 429)
+inference_executor = InferenceExecutor(
+    workers=int(os.environ.get('INFERENCE_WORKERS', DEFAULT_WORKERS)),
+    queue_size=int(os.environ.get('INFERENCE_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+)
+
+# Prediction threads come from one shared pool sized to this process's share of the cores
+# (PREDICT_THREADS, or usable cores / WEB_CONCURRENCY); BLAS/OpenMP pools are held to one thread
+limit_native_threads()
+parallelism = ParallelismPolicy()
+
+# Inference backend: a registered name (sklearn, flat, compressed, lookup) or 'auto' to benchmark
+# INFERENCE_BACKENDS at load time and route each batch size to the fastest correct backend
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', DEFAULT_BACKEND)
+# With INFERENCE_BACKEND=sharded only the shards in use are loaded (model/shards, see sharding.py),
+# and the monolithic forest is not loaded at all
+SHARD_CACHE_MB = float(os.environ.get('SHARD_CACHE_MB', DEFAULT_SHARD_CACHE_MB))
+INFERENCE_BACKENDS = [name.strip() for name in os.environ.get('INFERENCE_BACKENDS', '').split(',') if name.strip()]
+
+# Fraction of /predict and /predict/batch requests scored with feature contributions (without returning
+# them) so GET /importance reflects all traffic; requests with include_contributions always count.
+# Off by default: the first explained request builds a compact forest copy and contribution table
+IMPORTANCE_SAMPLE_RATE = float(os.environ.get('IMPORTANCE_SAMPLE_RATE', 0))
+
+# Default time budget for prediction requests without an X-Deadline-Ms header (0 means no deadline)
+INFERENCE_TIMEOUT_MS = float(os.environ.get('INFERENCE_TIMEOUT_MS', 0))
+
+
+def load_artifacts():
+    """Load the model, encoders and rules from MODEL_DIR and rebuild derived state"""
+    global model, le_area, le_subtype, le_regtype, metadata, validation_rules, location_multipliers
+    global predictor, area_multipliers, area_resolver, model_version, loaded_fingerprint, metadata_responses
+    global drift_monitor, feature_importance, artifacts
+
+    with reload_lock:
+        fingerprint = artifact_fingerprint(MODEL_DIR)
+        print(f"Loading model and encoders from {MODEL_DIR}...")
+        backend = INFERENCE_BACKEND
+        if backend == 'sharded' and not os.path.exists(os.path.join(MODEL_DIR, SHARDS_DIR, SHARD_MANIFEST)):
+            print("Warning: No model shards, loading the monolithic model")
+            backend = DEFAULT_BACKEND
+        # The sharded backend loads its own forests, the monolithic one is not needed
+        new_model = None if backend == 'sharded' else load_model(MODEL_DIR)
+
+        with open(os.path.join(MODEL_DIR, 'label_encoder_area.pkl'), 'rb') as f:
+            new_le_area = pickle.load(f)
+
+        with open(os.path.join(MODEL_DIR, 'label_encoder_subtype.pkl'), 'rb') as f:
+            new_le_subtype = pickle.load(f)
+
+        with open(os.path.join(MODEL_DIR, 'label_encoder_regtype.pkl'), 'rb') as f:
+            new_le_regtype = pickle.load(f)
+
+        with open(os.path.join(MODEL_DIR, 'metadata.pkl'), 'rb') as f:
+            new_metadata = pickle.load(f)
+
+        # Load validation rules
+        try:
+            with open(os.path.join(MODEL_DIR, 'validation_rules.json'), 'r') as f:
+                new_validation_rules = json.load(f)
+            print("Validation rules loaded successfully!")
+        except Exception as e:
+            print(f"Warning: Could not load validation rules: {e}")
+            new_validation_rules = None
+
+        # Load location multipliers (premium pricing by area)
+        try:
+            with open(os.path.join(MODEL_DIR, 'location_multipliers.json'), 'r') as f:
+                new_location_multipliers = json.load(f)
+            print("Location multipliers loaded successfully!")
+        except Exception as e:
+            print(f"Warning: Could not load location multipliers: {e}")
+            new_location_multipliers = None
+
+        # Area aliases (JVC, JLT, ...) for the area-name resolver
+        try:
+            new_area_aliases = load_json(MODEL_DIR, 'area_aliases') or {}
+        except Exception as e:
+            print(f"Warning: Could not load area aliases: {e}")
+            new_area_aliases = {}
+
+        # Training-time distributions for drift monitoring
+        try:
+            new_drift_baseline = load_json(MODEL_DIR, 'drift_baseline')
+        except Exception as e:
+            print(f"Warning: Could not load drift baseline: {e}")
+            new_drift_baseline = None
+
+        # Every prediction path calls predictor.predict, which dispatches to the configured backend(s)
+        register_backend('sharded', sharded_backend(os.path.join(MODEL_DIR, SHARDS_DIR), new_le_area.classes_,
+                                                    SHARD_CACHE_MB), exact=False)
+        categories = dict(n_areas=len(new_le_area.classes_), n_subtypes=len(new_le_subtype.classes_),
+                          n_regtypes=len(new_le_regtype.classes_))
+        new_predictor = build_router(new_model, backend, INFERENCE_BACKENDS, policy=parallelism, **categories)
+
+        # Multipliers aligned with area codes so they can be applied to whole prediction arrays
+        new_area_multipliers = area_multiplier_array(new_le_area, new_location_multipliers)
+
+        # Resolves case/punctuation variants, aliases and typos in area names to encoder classes
+        new_area_resolver = AreaResolver(new_le_area.classes_, new_area_aliases)
+
+        # Traffic statistics are per encoder class, so they restart with each artifact version
+        new_drift_monitor = DriftMonitor(new_le_area.classes_, new_le_subtype.classes_, new_drift_baseline)
+        new_feature_importance = FeatureImportance()
+
+        # Swap everything in together once all files have loaded
+        with artifact_lock:
+            predictor = new_predictor
+            model, le_area, le_subtype, le_regtype = new_model, new_le_area, new_le_subtype, new_le_regtype
+            metadata, validation_rules = new_metadata, new_validation_rules
+            location_multipliers = new_location_multipliers
+            area_multipliers, area_resolver = new_area_multipliers, new_area_resolver
+            drift_monitor, feature_importance = new_drift_monitor, new_feature_importance
+            model_version = artifact_model_version(MODEL_DIR)
+            artifacts = Artifacts(predictor, le_area, le_subtype, le_regtype, validation_rules, area_multipliers,
+                                  area_resolver, drift_monitor, feature_importance, model_version,
+                                  area_comparison_cache(predictor, le_area, le_subtype, le_regtype, area_multipliers))
+            metadata_responses = render_metadata_responses()
+        loaded_fingerprint = fingerprint
+        print(f"Model and encoders loaded successfully! (version {model_version})")
+
+
+def current_artifacts():
+    """The loaded Artifacts, taken once per request"""
+    with artifact_lock:
+        return artifacts
+
+
+def watch_artifacts():
+    """Reload the artifacts whenever files in MODEL_DIR change (hot swap)"""
+    while True:
+        time.sleep(ARTIFACT_CHECK_INTERVAL)
+        try:
+            if artifact_fingerprint(MODEL_DIR) != loaded_fingerprint:
+                print("Model artifacts changed, reloading...")
+                load_artifacts()
+        except Exception as e:
+            # Keep serving the previous artifacts; the next check retries
+            print(f"Warning: Could not reload artifacts: {e}")
+
+
+# Load comparable-transactions index (optional, built with comps_index.py)
 try:
-    with open('model/validation_rules.json', 'r') as f:
-        validation_rules = json.load(f)
-    print("Validation rules loaded successfully!")
+    comps_index = load_comps_index(os.environ.get('COMPS_INDEX_DIR', DEFAULT_INDEX_DIR))
+    if comps_index is not None:
+        print(f"Comps index loaded: {len(comps_index):,} transactions")
 except Exception as e:
-    print(f"Warning: Could not load validation rules: {e}")
-    validation_rules = None
+    print(f"Warning: Could not load comps index: {e}")
+    comps_index = None
+
+# Load market rollups (optional, built with market_store.py)
+try:
+    market_data = load_market_data(os.environ.get('MARKET_STORE_DIR', DEFAULT_STORE_DIR))
+    if market_data is not None:
+        print(f"Market rollups loaded: {len(market_data.areas)} areas")
+except Exception as e:
+    print(f"Warning: Could not load market rollups: {e}")
+    market_data = None
 
-print("Model and encoders loaded successfully!")
 
 
 # Request/Response models
@@ -75,13 +276,37 @@ class PropertyInput(BaseModel):
         }
 
 
+class AreaResolution(BaseModel):
+    input: str = Field(..., description="Area name as sent")
+    resolved: str = Field(..., description="Area the property was priced in")
+    match: str = Field(..., description="exact, normalized, alias, fuzzy or unknown (priced in the default area)")
+    score: float = Field(..., description="Match similarity (1.0 for exact, normalized and alias matches)")
+
+
+class FeatureContributions(BaseModel):
+    bias: float = Field(..., description="Model price before any feature is considered (mean training price)")
+    features: Dict[str, float] = Field(
+        ..., description="AED each feature adds to (or subtracts from) the bias; bias + features = base_price"
+    )
+    location_premium: float = Field(..., description="AED added by the location multiplier on top of base_price")
+
+
 class PredictionResponse(BaseModel):
-    predicted_price: float = Field(..., description="Predicted price in AED")
+    predicted_price: float = Field(..., description="Predicted price in AED (location multiplier applied)")
     predicted_price_formatted: str = Field(..., description="Formatted price string")
     price_per_sqm: float = Field(..., description="Price per square meter")
+    base_price: float = Field(..., description="Model output before the location multiplier")
+    location_multiplier: float = Field(..., description="Location premium applied to the model output")
+    location_tier: str = Field(..., description="Location tier (Ultra Luxury, Luxury, Premium, Standard, Budget)")
+    price_lower: float = Field(..., description="Lower end of the estimated price range (-10%)")
+    price_upper: float = Field(..., description="Upper end of the estimated price range (+10%)")
     confidence_level: str = Field(..., description="Confidence level of prediction")
     input_features: dict = Field(..., description="Input features used for prediction")
     validation_warnings: List[str] = Field(default=[], description="Input validation warnings")
+    area_resolution: AreaResolution = Field(..., description="How area_name_en was matched to a known area")
+    contributions: Optional[FeatureContributions] = Field(
+        None, description="Decision-path feature contributions (with include_contributions=true)"
+    )
 
 
 class BatchPropertyInput(BaseModel):
@@ -91,6 +316,67 @@ class BatchPropertyInput(BaseModel):
 class BatchPredictionResponse(BaseModel):
     predictions: List[PredictionResponse]
     total_properties: int
+    unique_properties: int = Field(..., description="Distinct feature rows actually scored by the model")
+    dedup_ratio: float = Field(..., description="total_properties / unique_properties (model work saved by deduplication)")
+
+
+class AreaComparisonInput(BaseModel):
+    procedure_area: float = Field(..., description="Property size in square meters", example=100.0, gt=0, lt=1000)
+    bedrooms: int = Field(..., description="Number of bedrooms (0 for Studio)", example=2, ge=0, le=10)
+    has_parking: int = Field(..., description="Has parking (0 or 1)", example=1, ge=0, le=1)
+    has_project: int = Field(..., description="Part of a named project (0 or 1)", example=1, ge=0, le=1)
+    property_sub_type_en: str = Field(..., description="Property sub-type", example="Flat")
+    reg_type_en: str = Field(..., description="Registration type", example="Off-Plan Properties")
+    areas: Optional[List[str]] = Field(None, description="Areas to compare (defaults to all available areas)")
+
+
+class AreaPrice(BaseModel):
+    area_name_en: str = Field(..., description="Location area name")
+    predicted_price: float = Field(..., description="Predicted price in AED (location multiplier applied)")
+    predicted_price_formatted: str = Field(..., description="Formatted price string")
+    price_per_sqm: float = Field(..., description="Price per square meter")
+    location_multiplier: float = Field(..., description="Location premium applied to the model output")
+
+
+class AreaComparisonResponse(BaseModel):
+    comparisons: List[AreaPrice] = Field(..., description="Prices per area, sorted from most to least expensive")
+    total_areas: int
+    property_features: dict = Field(..., description="Property template priced in every area")
+
+
+class PortfolioValuationResponse(BaseModel):
+    total_properties: int = Field(..., description="Number of properties valued")
+    invalid_rows: int = Field(..., description="Rows skipped because they could not be parsed or validated")
+    errors: List[str] = Field(default=[], description="First few row errors")
+    total_value: float = Field(..., description="Total predicted portfolio value in AED")
+    average_value: float = Field(..., description="Average predicted value per property in AED")
+    value_by_area: dict = Field(..., description="Count and total value per area")
+    value_by_property_subtype: dict = Field(..., description="Count and total value per property sub-type")
+    value_by_registration_type: dict = Field(..., description="Count and total value per registration type")
+    price_per_sqm_percentiles: dict = Field(..., description="Approximate price per sqm percentiles (within 1%)")
+    price_percentiles: dict = Field(..., description="Approximate price percentiles (within 1%)")
+    area_resolution: dict = Field(..., description="Number of properties per area match type")
+
+
+class ComparableTransaction(BaseModel):
+    transaction_date: str = Field(..., description="Transaction date (YYYY-MM-DD)")
+    area_name_en: str
+    property_sub_type_en: str
+    reg_type_en: Optional[str] = None
+    project_name_en: Optional[str] = None
+    procedure_area: float = Field(..., description="Size in square meters")
+    bedrooms: int = Field(..., description="Number of bedrooms (-1 when not recorded)")
+    has_parking: int
+    actual_worth: float = Field(..., description="Transaction price in AED")
+    price_per_sqm: float
+    similarity_distance: float = Field(..., description="Distance in (size, bedrooms, date) space, lower is closer")
+
+
+class CompsResponse(BaseModel):
+    comparables: List[ComparableTransaction]
+    total_found: int
+    query_time_ms: float
+    area_resolution: AreaResolution = Field(..., description="How area_name_en was matched to a known area")
 
 
 class ModelInfoResponse(BaseModel):
@@ -104,6 +390,14 @@ class ModelInfoResponse(BaseModel):
     price_range: dict
 
 
+class ProfilingSettings(BaseModel):
+    sample_rate: float = Field(..., description="Fraction of /predict and /predict/batch requests to profile", ge=0, le=1)
+
+
+class CaptureSettings(BaseModel):
+    sample_rate: float = Field(..., description="Fraction of /predict and /predict/batch requests to capture", ge=0, le=1)
+
+
 # Helper function
 def safe_encode(encoder, value, encoder_name):
     """Safely encode categorical values"""
@@ -115,8 +409,118 @@ def safe_encode(encoder, value, encoder_name):
         return encoder.transform([encoder.classes_[0]])[0]
 
 
-def validate_property_inputs(area_size, bedrooms, property_subtype):
-    """Validate property inputs and return warnings"""
+def area_comparison_cache(predictor, le_area, le_subtype, le_regtype, area_multipliers):
+    """
+    Cached area comparison for one artifact snapshot, keyed by (model_version, property template)
+    since agents reuse the same templates. Each load gets a new cache, so a comparison still running
+    on the previous artifacts can only store its result in the previous snapshot's cache.
+    """
+    @lru_cache(maxsize=AREA_COMPARISON_CACHE_SIZE)
+    def cached(model_version, procedure_area, bedrooms, has_parking, has_project, property_sub_type_en,
+               reg_type_en, areas):
+        return area_comparison(predictor, le_area, le_subtype, le_regtype, area_multipliers, procedure_area,
+                               bedrooms, has_parking, has_project, property_sub_type_en, reg_type_en, areas)
+    return cached
+
+
+def area_comparison(predictor, le_area, le_subtype, le_regtype, area_multipliers, procedure_area, bedrooms,
+                    has_parking, has_project, property_sub_type_en, reg_type_en, areas):
+    """AreaPrice per area for a property template"""
+    results = compare_areas(
+        predictor, le_area, le_subtype, le_regtype, area_multipliers,
+        procedure_area, bedrooms, has_parking, has_project,
+        property_sub_type_en, reg_type_en, areas=list(areas) if areas else None
+    )
+    return tuple(
+        AreaPrice(
+            area_name_en=row['area_name_en'],
+            predicted_price=round(row['predicted_price'], 2),
+            predicted_price_formatted=format_aed(row['predicted_price']),
+            price_per_sqm=round(row['price_per_sqm'], 2),
+            location_multiplier=row['location_multiplier']
+        )
+        for row in results
+    )
+
+
+def resolve_area(resolver, value):
+    """Resolve an area name, warning when it had to fall back to the default area"""
+    match = resolver.resolve(value)
+    if match.match == 'unknown':
+        print(f"Warning: '{value}' not found in area, using default")
+    return match
+
+
+def area_resolution(value, match):
+    """AreaResolution for a response"""
+    return AreaResolution(input=value, resolved=match.name, match=match.match, score=match.score)
+
+
+def area_warnings(value, match):
+    """Validation warning for area names that could not be resolved"""
+    if match.match == 'unknown':
+        return [f"Unknown area '{value}', priced as {match.name}"]
+    return []
+
+
+def build_prediction_responses(properties, priced, row_checks, contributions=None, bias=None):
+    """
+    PredictionResponse per property from post-processed prices and (warnings, confidence, resolution),
+    with FeatureContributions when a contribution matrix is given
+    """
+    columns = priced.rounded()
+    tiers = priced.tier_labels()
+    explained = [None] * len(properties)
+    if contributions is not None:
+        premiums = np.round(priced.price - priced.base_price, 2)
+        explained = [
+            FeatureContributions(bias=round(bias, 2), features=contribution_dict(row), location_premium=premium)
+            for row, premium in zip(contributions, premiums)
+        ]
+    return [
+        PredictionResponse(
+            predicted_price=columns['predicted_price'][i],
+            predicted_price_formatted=format_aed(priced.price[i]),
+            price_per_sqm=columns['price_per_sqm'][i],
+            base_price=columns['base_price'][i],
+            location_multiplier=columns['location_multiplier'][i],
+            location_tier=tiers[i],
+            price_lower=columns['price_lower'][i],
+            price_upper=columns['price_upper'][i],
+            confidence_level=confidence,
+            input_features=prop.dict(),
+            validation_warnings=list(warnings),
+            area_resolution=resolution,
+            contributions=explained[i]
+        )
+        for i, (prop, (warnings, confidence, resolution)) in enumerate(zip(properties, row_checks))
+    ]
+
+
+def wants_contributions(predictor, include_contributions):
+    """Score with contributions when asked, or for the IMPORTANCE_SAMPLE_RATE sample of traffic"""
+    if include_contributions:
+        return True
+    return predictor.explainable and IMPORTANCE_SAMPLE_RATE > 0 and random.random() < IMPORTANCE_SAMPLE_RATE
+
+
+def count_unknown(encoder, values):
+    """Number of values that are not encoder classes (encoded as the default class)"""
+    lookup = class_index(encoder)
+    return sum(1 for value in values if value not in lookup)
+
+
+def encode_batch_column(encoder, values, encoder_name):
+    """Vectorized safe_encode for a batch column, warning once per unknown value"""
+    lookup = class_index(encoder)
+    for value in set(values):
+        if value not in lookup:
+            print(f"Warning: '{value}' not found in {encoder_name}, using default")
+    return encode_column(encoder, values)
+
+
+def validate_property_inputs(area_size, bedrooms, property_subtype, validation_rules):
+    """Validate property inputs against the validation rules and return warnings"""
     warnings = []
 
     if validation_rules is None:
@@ -150,7 +554,7 @@ def validate_property_inputs(area_size, bedrooms, property_subtype):
     return warnings
 
 
-def get_confidence_level(area_size, bedrooms, area_name, subtype):
+def get_confidence_level(area_size, bedrooms, area_name, subtype, le_area, validation_rules):
     """Estimate confidence level based on input characteristics"""
     confidence_score = 100
 
@@ -180,6 +584,116 @@ def get_confidence_level(area_size, bedrooms, area_name, subtype):
         return "Low"
 
 
+def render_metadata_responses():
+    """Serialize the metadata endpoint payloads to bytes once per artifact version, with strong ETags"""
+    payloads = {
+        '/model/info': ModelInfoResponse(
+            model_type=metadata['model_type'],
+            training_samples=metadata['training_samples'],
+            r2_score=round(metadata['r2_score'], 4),
+            mae=round(metadata['mae'], 2),
+            available_areas=sorted(metadata['categorical_mappings']['areas'])[:20],  # Top 20
+            available_property_subtypes=sorted(metadata['categorical_mappings']['property_subtypes']),
+            available_registration_types=sorted(metadata['categorical_mappings']['registration_types']),
+            price_range={
+                "lower_bound": round(metadata['price_bounds']['lower'], 2),
+                "upper_bound": round(metadata['price_bounds']['upper'], 2)
+            }
+        ).dict(),
+        '/areas': {
+            "total_areas": len(le_area.classes_),
+            "areas": sorted(le_area.classes_.tolist())
+        },
+        '/property-types': {
+            "total_types": len(le_subtype.classes_),
+            "property_sub_types": sorted(le_subtype.classes_.tolist())
+        },
+        '/registration-types': {
+            "total_types": len(le_regtype.classes_),
+            "registration_types": sorted(le_regtype.classes_.tolist())
+        }
+    }
+    if validation_rules is not None:
+        payloads['/validation/rules'] = {
+            "size_ranges_by_bedroom": validation_rules.get('size_ranges', {}),
+            "property_type_rules": validation_rules.get('property_type_rules', {}),
+            "property_subtype_specifics": validation_rules.get('property_subtype_specifics', {}),
+            "description": "Validation rules based on analysis of 1.5M Dubai property transactions (2000-2025)"
+        }
+
+    responses = {}
+    for path, payload in payloads.items():
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        responses[path] = (body, etag)
+    return responses
+
+
+def cached_metadata_response(request, path):
+    """Serve a pre-serialized metadata payload, or 304 when the client already has this version"""
+    body, etag = metadata_responses[path]
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age={METADATA_MAX_AGE}'}
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        if '*' in candidates or etag in candidates:
+            return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+def request_deadline(request):
+    """Monotonic deadline from the X-Deadline-Ms header (or INFERENCE_TIMEOUT_MS), or None"""
+    budget = request.headers.get('x-deadline-ms')
+    if budget is None:
+        budget = INFERENCE_TIMEOUT_MS
+    try:
+        budget = float(budget)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Deadline-Ms must be a number of milliseconds")
+    if budget <= 0:
+        return None
+    return time.monotonic() + budget / 1000
+
+
+async def run_inference(request, fn, *args, deadline=None):
+    """
+    Run a CPU-bound prediction on the inference executor, shedding load with 429/503.
+    Handlers making several calls pass the request_deadline computed once, so the budget covers all of them.
+    """
+    if deadline is None:
+        deadline = request_deadline(request)
+    profile = current_profile()
+    if profile is not None:
+        profile.handler_started()
+        fn = profile.wrap(fn)
+    try:
+        return await inference_executor.run(fn, *args, deadline=deadline)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': '1'})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '1'})
+
+
+# Initial artifact load
+load_artifacts()
+
+
+@app.on_event("startup")
+def start_artifact_watcher():
+    """Start the background thread that hot swaps changed artifacts"""
+    if ARTIFACT_CHECK_INTERVAL > 0:
+        threading.Thread(target=watch_artifacts, name='artifact-watcher', daemon=True).start()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    inference_executor.shutdown()
+    parallelism.shutdown()
+    traffic_capture.shutdown()
+
+
 # API Endpoints
 @app.get("/")
 def read_root():
@@ -187,8 +701,18 @@ def read_root():
         "message": "Dubai Real Estate Price Prediction API",
         "version": "1.0.1",
         "endpoints": {
-            "/predict": "POST - Predict price for a single property",
+            "/predict": "POST - Predict price for a single property (include_contributions=true explains it)",
             "/predict/batch": "POST - Predict prices for multiple properties",
+            "/predict/compare-areas": "POST - Price the same property across all (or selected) areas",
+            "/portfolio/valuation": "POST - Stream properties (NDJSON or CSV) and get portfolio aggregates",
+            "/comps": "POST - Get the most similar historical transactions for a property",
+            "/market/areas": "GET - Areas ranked by median price per sqm over the last 12 months",
+            "/market/trends": "GET - Monthly median price per sqm for an area (optionally one sub-type)",
+            "/admin/profiles": "GET - List stored request profiles (send X-Profile: 1 to capture one)",
+            "/metrics": "GET - Inference queue depth, throughput and shed request counts",
+            "/drift": "GET - Traffic distributions compared with the training data (PSI)",
+            "/importance": "GET - Feature importance aggregated from prediction contributions",
+            "/admin/capture": "GET/POST - Traffic capture for replay_traffic.py",
             "/model/info": "GET - Get model information",
             "/validation/rules": "GET - Get validation rules and typical size ranges",
             "/areas": "GET - Get list of available areas",
@@ -199,144 +723,428 @@ def read_root():
 
 
 @app.post("/predict", response_model=PredictionResponse)
-def predict_price(property_input: PropertyInput):
+async def predict_price(property_input: PropertyInput, request: Request,
+                        include_contributions: bool = Query(False, description="Return per-feature price contributions")):
     """Predict price for a single property"""
+    return await run_inference(request, predict_single, property_input, include_contributions)
+
+
+def predict_single(property_input, include_contributions=False):
+    """Single prediction, run on the inference executor"""
+    loaded = current_artifacts()
     try:
-        # Encode categorical features
-        area_encoded = safe_encode(le_area, property_input.area_name_en, "area")
-        subtype_encoded = safe_encode(le_subtype, property_input.property_sub_type_en, "subtype")
-        regtype_encoded = safe_encode(le_regtype, property_input.reg_type_en, "registration type")
+        with stage('encode'):
+            # Encode categorical features
+            area_match = resolve_area(loaded.area_resolver, property_input.area_name_en)
+            area_encoded = area_match.code
+            subtype_encoded = safe_encode(loaded.le_subtype, property_input.property_sub_type_en, "subtype")
+            regtype_encoded = safe_encode(loaded.le_regtype, property_input.reg_type_en, "registration type")
+
+            # Create feature array
+            features = np.array([[
+                property_input.procedure_area,
+                property_input.bedrooms,
+                property_input.has_parking,
+                property_input.has_project,
+                area_encoded,
+                subtype_encoded,
+                regtype_encoded
+            ]])
+
+        with stage('validate'):
+            # Validate inputs
+            warnings = area_warnings(property_input.area_name_en, area_match) + validate_property_inputs(
+                property_input.procedure_area,
+                property_input.bedrooms,
+                property_input.property_sub_type_en,
+                loaded.validation_rules
+            )
+
+            # Get confidence level
+            confidence = get_confidence_level(
+                property_input.procedure_area,
+                property_input.bedrooms,
+                area_match.name,
+                property_input.property_sub_type_en,
+                loaded.le_area,
+                loaded.validation_rules
+            )
+
+        with stage('predict'):
+            # Make prediction (contributions come from the same tree traversal)
+            contributions = bias = None
+            if wants_contributions(loaded.predictor, include_contributions):
+                base_prices, contributions, bias = loaded.predictor.explain(features)
+                loaded.feature_importance.update(contributions)
+            else:
+                base_prices = loaded.predictor.predict(features)
+            loaded.drift_monitor.update(features, base_prices, {
+                'area': int(area_match.match == 'unknown'),
+                'subtype': count_unknown(loaded.le_subtype, [property_input.property_sub_type_en]),
+                'regtype': count_unknown(loaded.le_regtype, [property_input.reg_type_en])
+            })
+
+        with stage('serialize'):
+            # Location multiplier, price per sqm and price range
+            priced = postprocess(base_prices, [area_encoded], [property_input.procedure_area],
+                                 loaded.area_multipliers)
+            resolution = area_resolution(property_input.area_name_en, area_match)
+            if not include_contributions:
+                contributions = None
+            return build_prediction_responses([property_input], priced, [(warnings, confidence, resolution)],
+                                              contributions, bias)[0]
 
-        # Create feature array
-        features = np.array([[
-            property_input.procedure_area,
-            property_input.bedrooms,
-            property_input.has_parking,
-            property_input.has_project,
-            area_encoded,
-            subtype_encoded,
-            regtype_encoded
-        ]])
-
-        # Validate inputs
-        warnings = validate_property_inputs(
-            property_input.procedure_area,
-            property_input.bedrooms,
-            property_input.property_sub_type_en
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Prediction error: {str(e)}")
+
+
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_batch(batch_input: BatchPropertyInput, request: Request,
+                        include_contributions: bool = Query(False, description="Return per-feature price contributions")):
+    """Predict prices for multiple properties (identical properties are only scored once)"""
+    return await run_inference(request, predict_many, batch_input, include_contributions)
+
+
+def predict_many(batch_input, include_contributions=False):
+    """Vectorized batch prediction, run on the inference executor"""
+    loaded = current_artifacts()
+    try:
+        properties = batch_input.properties
+        with stage('encode'):
+            area_names = [p.area_name_en for p in properties]
+            area_codes, area_matches = loaded.area_resolver.resolve_column(area_names)
+            for value in {value for value, match in zip(area_names, area_matches) if match.match == 'unknown'}:
+                print(f"Warning: '{value}' not found in area, using default")
+            sizes = np.array([p.procedure_area for p in properties], dtype=np.float64)
+            features = build_feature_matrix(
+                sizes,
+                [p.bedrooms for p in properties],
+                [p.has_parking for p in properties],
+                [p.has_project for p in properties],
+                area_codes,
+                encode_batch_column(loaded.le_subtype, [p.property_sub_type_en for p in properties], "subtype"),
+                encode_batch_column(loaded.le_regtype, [p.reg_type_en for p in properties], "registration type")
+            )
+
+        with stage('validate'):
+            # Warnings and confidence only depend on a few inputs, so compute them once per distinct combination
+            checks = {}
+            row_checks = []
+            for prop, area_match in zip(properties, area_matches):
+                key = (prop.procedure_area, prop.bedrooms, prop.area_name_en, prop.property_sub_type_en)
+                if key not in checks:
+                    checks[key] = (
+                        area_warnings(prop.area_name_en, area_match) +
+                        validate_property_inputs(prop.procedure_area, prop.bedrooms, prop.property_sub_type_en,
+                                                 loaded.validation_rules),
+                        get_confidence_level(prop.procedure_area, prop.bedrooms, area_match.name,
+                                             prop.property_sub_type_en, loaded.le_area, loaded.validation_rules),
+                        area_resolution(prop.area_name_en, area_match)
+                    )
+                row_checks.append(checks[key])
+
+        with stage('predict'):
+            contributions = bias = None
+            if wants_contributions(loaded.predictor, include_contributions):
+                base_prices, contributions, bias, unique_properties = explain_deduplicated(loaded.predictor, features)
+                loaded.feature_importance.update(contributions)
+            else:
+                base_prices, unique_properties = predict_deduplicated(loaded.predictor, features)
+            loaded.drift_monitor.update(features, base_prices, {
+                'area': sum(match.match == 'unknown' for match in area_matches),
+                'subtype': count_unknown(loaded.le_subtype, [p.property_sub_type_en for p in properties]),
+                'regtype': count_unknown(loaded.le_regtype, [p.reg_type_en for p in properties])
+            })
+
+        with stage('serialize'):
+            priced = postprocess(base_prices, area_codes, sizes, loaded.area_multipliers)
+            if not include_contributions:
+                contributions = None
+            predictions = build_prediction_responses(properties, priced, row_checks, contributions, bias)
+
+            return BatchPredictionResponse(
+                predictions=predictions,
+                total_properties=len(predictions),
+                unique_properties=unique_properties,
+                dedup_ratio=round(len(predictions) / unique_properties, 2) if unique_properties else 1.0
+            )
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Batch prediction error: {str(e)}")
+
+
+@app.post("/predict/compare-areas", response_model=AreaComparisonResponse)
+async def predict_compare_areas(comparison_input: AreaComparisonInput, request: Request):
+    """Price one property in every area (or a chosen subset) using a single batched prediction"""
+    loaded = current_artifacts()
+    # Resolve aliases and spelling variants; names that cannot be resolved are rejected by compare_areas
+    requested = []
+    for area in comparison_input.areas or []:
+        match = loaded.area_resolver.resolve(area)
+        requested.append(area if match.match == 'unknown' else match.name)
+    # Sorted tuple so the same subset in a different order hits the same cache entry
+    areas = tuple(sorted(set(requested))) if requested else None
+    try:
+        comparisons = await run_inference(
+            request,
+            loaded.area_comparisons,
+            loaded.model_version,
+            comparison_input.procedure_area,
+            comparison_input.bedrooms,
+            comparison_input.has_parking,
+            comparison_input.has_project,
+            comparison_input.property_sub_type_en,
+            comparison_input.reg_type_en,
+            areas
         )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Area comparison error: {str(e)}")
 
-        # Make prediction
-        prediction = model.predict(features)[0]
+    return AreaComparisonResponse(
+        comparisons=list(comparisons),
+        total_areas=len(comparisons),
+        property_features=comparison_input.dict(exclude={'areas'})
+    )
 
-        # Calculate derived metrics
-        price_per_sqm = prediction / property_input.procedure_area
 
-        # Get confidence level
-        confidence = get_confidence_level(
+@app.post("/portfolio/valuation", response_model=PortfolioValuationResponse)
+async def portfolio_valuation(
+    request: Request,
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=100, le=50000, description="Properties scored per model call")
+):
+    """
+    Value a whole portfolio and return only the summary.
+
+    The body is streamed as newline-delimited JSON (one property per line) or CSV with a
+    header row (Content-Type: text/csv). Properties are scored chunk by chunk and folded into
+    running aggregates, so memory stays constant regardless of portfolio size.
+    """
+    content_type = request.headers.get('content-type', 'application/x-ndjson')
+    # One artifact snapshot for the whole portfolio, so every chunk is scored by the same version
+    loaded = current_artifacts()
+    # One budget for the whole portfolio, not one per chunk
+    deadline = request_deadline(request)
+    aggregator = PortfolioAggregator(loaded.le_area, loaded.le_subtype, loaded.le_regtype,
+                                     area_resolver=loaded.area_resolver, area_multipliers=loaded.area_multipliers)
+    chunk = []
+
+    try:
+        async for row_number, record in iter_records(iter_lines(request.stream()), content_type):
+            if isinstance(record, Exception):
+                aggregator.record_error(row_number, str(record))
+                continue
+            try:
+                chunk.append(PropertyInput(**record))
+            except ValidationError as e:
+                error = e.errors()[0]
+                aggregator.record_error(row_number, f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}")
+                continue
+            except TypeError:
+                aggregator.record_error(row_number, "Expected a property object")
+                continue
+
+            if len(chunk) >= chunk_size:
+                await run_inference(request, aggregator.add_chunk, loaded.predictor, chunk, deadline=deadline)
+                chunk = []
+
+        await run_inference(request, aggregator.add_chunk, loaded.predictor, chunk, deadline=deadline)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Portfolio valuation error: {str(e)}")
+
+    return PortfolioValuationResponse(**aggregator.summary())
+
+
+@app.post("/comps", response_model=CompsResponse)
+def get_comparables(property_input: PropertyInput, k: int = Query(10, ge=1, le=100, description="Number of comparables")):
+    """Get the k most similar historical transactions (same area and sub-type) for a property"""
+    if comps_index is None:
+        raise HTTPException(status_code=404, detail="Comparable transactions index not available")
+
+    start = time.perf_counter()
+    area_match = current_artifacts().area_resolver.resolve(property_input.area_name_en)
+    try:
+        # An unresolvable area has no comparables (never the default area's transactions)
+        comparables = [] if area_match.match == 'unknown' else comps_index.query(
+            area_match.name,
+            property_input.property_sub_type_en,
             property_input.procedure_area,
             property_input.bedrooms,
-            property_input.area_name_en,
-            property_input.property_sub_type_en
+            k=k
         )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Comps lookup error: {str(e)}")
 
-        return PredictionResponse(
-            predicted_price=round(prediction, 2),
-            predicted_price_formatted=f"{prediction:,.0f} AED",
-            price_per_sqm=round(price_per_sqm, 2),
-            confidence_level=confidence,
-            input_features=property_input.dict(),
-            validation_warnings=warnings
-        )
+    return CompsResponse(
+        comparables=comparables,
+        total_found=len(comparables),
+        query_time_ms=round((time.perf_counter() - start) * 1000, 3),
+        area_resolution=area_resolution(property_input.area_name_en, area_match)
+    )
 
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Prediction error: {str(e)}")
 
+@app.get("/market/areas")
+def get_market_areas(
+    limit: int = Query(20, ge=1, le=500, description="Number of areas to return"),
+    min_transactions: int = Query(10, ge=0, description="Minimum transactions in the last 12 months")
+):
+    """Areas ranked by median price per sqm over the last 12 months, with year-over-year change"""
+    if market_data is None:
+        raise HTTPException(status_code=404, detail="Market data not available")
+
+    return {
+        "areas": to_records(market_data.top_areas(limit=limit, min_transactions=min_transactions))
+    }
+
+
+@app.get("/market/trends")
+def get_market_trends(
+    area: str = Query(..., description="Location area name", example="DUBAI MARINA"),
+    subtype: Optional[str] = Query(None, description="Property sub-type (all sub-types when omitted)"),
+    start: Optional[str] = Query(None, description="First month (YYYY-MM)"),
+    end: Optional[str] = Query(None, description="Last month (YYYY-MM)")
+):
+    """Monthly transaction count, median price per sqm and median price for an area"""
+    if market_data is None:
+        raise HTTPException(status_code=404, detail="Market data not available")
 
-@app.post("/predict/batch", response_model=BatchPredictionResponse)
-def predict_batch(batch_input: BatchPropertyInput):
-    """Predict prices for multiple properties"""
     try:
-        predictions = []
-        for prop in batch_input.properties:
-            pred = predict_price(prop)
-            predictions.append(pred)
-
-        return BatchPredictionResponse(
-            predictions=predictions,
-            total_properties=len(predictions)
-        )
+        trend = market_data.trend(area, subtype, start=start, end=end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date range: {str(e)}")
+    if trend is None:
+        raise HTTPException(status_code=404, detail=f"No market data for {area}" + (f" / {subtype}" if subtype else ""))
 
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Batch prediction error: {str(e)}")
+    return {
+        "area_name_en": area,
+        "property_sub_type_en": subtype,
+        "months": to_records(trend.drop(columns=['area_name_en', 'property_sub_type_en'], errors='ignore'))
+    }
 
 
 @app.get("/model/info", response_model=ModelInfoResponse)
-def get_model_info():
+def get_model_info(request: Request):
     """Get model information and statistics"""
-    return ModelInfoResponse(
-        model_type=metadata['model_type'],
-        training_samples=metadata['training_samples'],
-        r2_score=round(metadata['r2_score'], 4),
-        mae=round(metadata['mae'], 2),
-        available_areas=sorted(metadata['categorical_mappings']['areas'])[:20],  # Top 20
-        available_property_subtypes=sorted(metadata['categorical_mappings']['property_subtypes']),
-        available_registration_types=sorted(metadata['categorical_mappings']['registration_types']),
-        price_range={
-            "lower_bound": round(metadata['price_bounds']['lower'], 2),
-            "upper_bound": round(metadata['price_bounds']['upper'], 2)
-        }
-    )
+    return cached_metadata_response(request, '/model/info')
 
 
 @app.get("/areas")
-def get_areas():
+def get_areas(request: Request):
     """Get list of all available areas"""
-    return {
-        "total_areas": len(le_area.classes_),
-        "areas": sorted(le_area.classes_.tolist())
-    }
+    return cached_metadata_response(request, '/areas')
 
 
 @app.get("/property-types")
-def get_property_types():
+def get_property_types(request: Request):
     """Get list of all available property sub-types"""
-    return {
-        "total_types": len(le_subtype.classes_),
-        "property_sub_types": sorted(le_subtype.classes_.tolist())
-    }
+    return cached_metadata_response(request, '/property-types')
 
 
 @app.get("/registration-types")
-def get_registration_types():
+def get_registration_types(request: Request):
     """Get list of all available registration types"""
-    return {
-        "total_types": len(le_regtype.classes_),
-        "registration_types": sorted(le_regtype.classes_.tolist())
-    }
+    return cached_metadata_response(request, '/registration-types')
 
 
 @app.get("/validation/rules")
-def get_validation_rules():
+def get_validation_rules(request: Request):
     """Get validation rules and typical size ranges"""
-    if validation_rules is None:
+    if '/validation/rules' not in metadata_responses:
         raise HTTPException(status_code=404, detail="Validation rules not available")
 
+    return cached_metadata_response(request, '/validation/rules')
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Inference executor queue depth, throughput and load shedding counters"""
+    return inference_executor.stats()
+
+
+@app.get("/drift")
+def get_drift():
+    """Prediction traffic compared with the training baseline: sizes, prices, areas, sub-types, unknowns"""
+    return drift_monitor.report()
+
+
+@app.get("/importance")
+def get_importance():
+    """Global feature importance: mean absolute contribution per feature over scored traffic"""
+    report = feature_importance.report()
+    report['sample_rate'] = IMPORTANCE_SAMPLE_RATE
+    return report
+
+
+@app.post("/admin/drift/reset")
+def reset_drift():
+    """Start a new drift monitoring window"""
+    drift_monitor.reset()
+    return {"since": drift_monitor.since}
+
+
+@app.get("/admin/capture")
+def get_capture_settings():
+    """Traffic capture sample rate and counters"""
+    return traffic_capture.stats()
+
+
+@app.post("/admin/capture")
+def set_capture_settings(settings: CaptureSettings):
+    """Set the fraction of prediction requests to capture (0 stops capturing)"""
+    traffic_capture.sample_rate = settings.sample_rate
+    return traffic_capture.stats()
+
+
+@app.get("/admin/profiling")
+def get_profiling_settings():
+    """Current profiling sample rate and stored profile count"""
     return {
-        "size_ranges_by_bedroom": validation_rules.get('size_ranges', {}),
-        "property_type_rules": validation_rules.get('property_type_rules', {}),
-        "property_subtype_specifics": validation_rules.get('property_subtype_specifics', {}),
-        "description": "Validation rules based on analysis of 1.5M Dubai property transactions (2000-2025)"
+        "sample_rate": profiler.sample_rate,
+        "profile_dir": profiler.profile_dir,
+        "stored_profiles": len(profiler.list_names())
     }
 
 
+@app.post("/admin/profiling")
+def set_profiling_settings(settings: ProfilingSettings):
+    """Set the fraction of prediction requests to profile (0 disables sampling)"""
+    profiler.sample_rate = settings.sample_rate
+    return get_profiling_settings()
+
+
+@app.get("/admin/profiles")
+def list_profiles():
+    """Stored CPU profiles, newest first, with their stage timings"""
+    return {"profiles": profiler.list_profiles()}
+
+
+@app.get("/admin/profiles/{name}")
+def download_profile(name: str):
+    """Download a stored profile (open with pstats or snakeviz)"""
+    path = profiler.path_for(name)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Profile {name} not found")
+    return FileResponse(path, media_type='application/octet-stream', filename=name)
+
+
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "model_loaded": model is not None,
+        "model_loaded": predictor is not None,
+        "model_version": model_version,
         "encoders_loaded": all([le_area is not None, le_subtype is not None, le_regtype is not None]),
-        "validation_rules_loaded": validation_rules is not None
+        "validation_rules_loaded": validation_rules is not None,
+        "comps_index_loaded": comps_index is not None,
+        "market_data_loaded": market_data is not None,
+        "inference_backends": predictor.describe()
     }
 
 
@@ -1,12 +1,18 @@
 import streamlit as st
-import pandas as pd
 import pickle
 import numpy as np
 import json
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
 
+# pandas and plotly are imported where they are used, so the first page render does not wait for them
+from area_resolver import AreaResolver, match_counts
+from artifacts import load_json, model_version
+from attribution import CONTRIBUTION_FEATURES, FEATURE_LABELS, FeatureImportance, contribution_dict
+from comps_index import load_comps_index
+from inference import area_multiplier_array, build_feature_matrix, compare_areas, encode_column, \
+    explain_deduplicated, predict_deduplicated
+from postprocessing import format_price_millions, postprocess
+
 # Page config
 st.set_page_config(
     page_title="Dubai Real Estate Price Predictor",
@@ -15,8 +21,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS
-st.markdown("""
+# Custom CSS. Streamlit drops every element a rerun does not write, so the style tag has to be
+# emitted on each rerun; the string is a module constant and the browser skips unchanged elements.
+CUSTOM_CSS = """
     <style>
     .main-header {
         font-size: 3rem;
@@ -53,12 +60,13 @@ st.markdown("""
         border-radius: 8px;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # Load model and rules
-@st.cache_resource
-def load_all_components():
-    """Load model, encoders, and rules"""
+@st.cache_resource(max_entries=1)
+def load_all_components(version):
+    """Load model, encoders, and rules (once per artifact version)"""
     import gzip
 
     # Load compressed model
@@ -108,6 +116,107 @@ def load_all_components():
 
     return model, le_area, le_subtype, le_regtype, metadata, validation_rules, form_rules, categorization, location_multipliers
 
+@st.cache_resource
+def load_comps():
+    """Load the comparable-transactions index if it has been built"""
+    try:
+        return load_comps_index()
+    except Exception:
+        return None
+
+@st.cache_resource
+def load_market():
+    """Load the precomputed market rollups if the market store has been built"""
+    from market_store import load_market_data
+
+    try:
+        return load_market_data()
+    except Exception:
+        return None
+
+@st.cache_resource(max_entries=1)
+def load_form_options(version):
+    """Sorted option lists for every form state, derived once per artifact version instead of on every rerun"""
+    all_subtypes = sorted(le_subtype.classes_)
+    all_regtypes = sorted(le_regtype.classes_)
+    areas = sorted(le_area.classes_)
+
+    if form_rules and 'property_usage_options' in form_rules:
+        usage_options = sorted(form_rules['property_usage_options'])
+    else:
+        usage_options = ['Residential', 'Commercial']
+
+    type_options = {}
+    subtype_options = {}
+    for usage in usage_options:
+        # Property types allowed for this usage
+        types = []
+        if form_rules and usage in form_rules.get('property_type_by_usage', {}):
+            types = form_rules['property_type_by_usage'][usage]
+        if not types:
+            types = ['Unit', 'Villa', 'Land', 'Building']
+        type_options[usage] = sorted(types)
+
+        for property_type in type_options[usage]:
+            # Sub-types for the specific usage, falling back to type-based
+            if form_rules and usage in form_rules.get('property_subtype_by_usage', {}):
+                subtypes = form_rules['property_subtype_by_usage'][usage]
+            elif form_rules and property_type in form_rules.get('property_subtype_by_type', {}):
+                subtypes = form_rules['property_subtype_by_type'][property_type]
+            else:
+                subtypes = all_subtypes
+
+            # Filter based on categorization
+            if categorization and usage == 'Residential':
+                residential_types = categorization.get('residential_subtypes', [])
+                subtypes = [subtype for subtype in subtypes if subtype in residential_types]
+            elif categorization and usage == 'Commercial':
+                commercial_types = categorization.get('commercial_subtypes', [])
+                subtypes = [subtype for subtype in subtypes if subtype in commercial_types]
+
+            if not subtypes:
+                subtypes = all_subtypes[:20]
+            subtype_options[(usage, property_type)] = sorted(subtypes)
+
+    reg_type_options = {}
+    for property_type in {t for types in type_options.values() for t in types}:
+        reg_types = []
+        if form_rules and property_type in form_rules.get('typical_registration_types', {}):
+            reg_types = form_rules['typical_registration_types'][property_type]
+        reg_type_options[property_type] = reg_types or all_regtypes
+
+    return {
+        'usage': usage_options,
+        'types': type_options,
+        'subtypes': subtype_options,
+        'reg_types': reg_type_options,
+        'all_subtypes': all_subtypes,
+        'all_regtypes': all_regtypes,
+        'areas': areas,
+        'default_area_index': areas.index('DUBAI MARINA') if 'DUBAI MARINA' in areas else 0
+    }
+
+@st.cache_resource(max_entries=1)
+def load_area_resolver(version):
+    """Area-name resolver (aliases, spelling variants, typos), built once per artifact version"""
+    return AreaResolver(le_area.classes_, load_json('model', 'area_aliases'))
+
+@st.cache_resource(max_entries=1)
+def load_explainer(version):
+    """
+    Predictor returning prices with per-feature contributions from one traversal. Only built once a
+    user asks for contributions: its compact forest copy and contribution table take about a third of
+    the model's memory, and backends pulls in scipy.sparse.
+    """
+    from backends import build_router
+
+    return build_router(load_all_components(version)[0], 'sklearn')
+
+@st.cache_resource(max_entries=1)
+def load_traffic_importance(version):
+    """Feature importance aggregated over the predictions made in this app (per artifact version)"""
+    return FeatureImportance()
+
 # Helper functions
 def safe_encode(encoder, value):
     """Safely encode categorical values"""
@@ -192,23 +301,25 @@ def get_expected_size_range(bedrooms, validation_rules):
         }
     return None
 
-def format_price_millions(price):
-    """Format price in millions (e.g., 1.2M, 1.3M)"""
-    if price >= 1_000_000:
-        millions = price / 1_000_000
-        if millions >= 10:
-            return f"{millions:.1f}M"
-        else:
-            return f"{millions:.2f}M"
-    elif price >= 1_000:
-        thousands = price / 1_000
-        return f"{thousands:.0f}K"
-    else:
-        return f"{price:.0f}"
+@st.cache_data(show_spinner=False, max_entries=256)
+def cached_area_comparison(version, procedure_area, bedrooms, has_parking, has_project, property_subtype, reg_type, areas):
+    """Price a property template across areas with one batched prediction (cached per artifact version and template)"""
+    return compare_areas(
+        model, le_area, le_subtype, le_regtype, area_multipliers,
+        procedure_area, bedrooms, has_parking, has_project,
+        property_subtype, reg_type, areas=list(areas) if areas else None
+    )
 
 # Load components
 try:
-    model, le_area, le_subtype, le_regtype, metadata, validation_rules, form_rules, categorization, location_multipliers = load_all_components()
+    artifact_version = model_version()
+    model, le_area, le_subtype, le_regtype, metadata, validation_rules, form_rules, categorization, location_multipliers = load_all_components(artifact_version)
+    area_multipliers = area_multiplier_array(le_area, location_multipliers)
+    form_options = load_form_options(artifact_version)
+    area_resolver = load_area_resolver(artifact_version)
+    traffic_importance = load_traffic_importance(artifact_version)
+    comps_index = load_comps()
+    market_data = load_market()
     model_loaded = True
 except Exception as e:
     st.error(f"Error loading model: {str(e)}")
@@ -245,10 +356,12 @@ if model_loaded:
         st.caption(f"Last updated: {datetime.now().strftime('%Y-%m-%d')}")
 
     # Main content - Tabs
-    tab1, tab2, tab3 = st.tabs(["🔮 Price Prediction", "📈 Batch Prediction", "📊 Data Insights"])
+    tab1, tab2, tab_compare, tab3 = st.tabs(["🔮 Price Prediction", "📈 Batch Prediction", "🗺️ Area Comparison", "📊 Data Insights"])
 
     # TAB 1: Single Prediction with Dynamic Form
-    with tab1:
+    # Each tab is a fragment, so a widget change only reruns its own tab
+    @st.fragment
+    def prediction_tab():
         col1, col2 = st.columns([2, 1])
 
         with col1:
@@ -264,13 +377,7 @@ if model_loaded:
 
             with col_a:
                 # 1. Property Usage
-                if form_rules and 'property_usage_options' in form_rules:
-                    usage_options = sorted(form_rules['property_usage_options'])
-                    default_usage = 'Residential' if 'Residential' in usage_options else usage_options[0]
-                else:
-                    usage_options = ['Residential', 'Commercial']
-                    default_usage = 'Residential'
-
+                usage_options = form_options['usage']
                 property_usage = st.selectbox(
                     "🏠 Property Usage",
                     options=usage_options,
@@ -279,63 +386,30 @@ if model_loaded:
                     key='usage_select'
                 )
 
-                # Update session state
-                if property_usage != st.session_state.property_usage:
-                    st.session_state.property_usage = property_usage
-                    st.rerun()
+                # Dependent options below are derived from the new value in this same run, so no extra rerun
+                st.session_state.property_usage = property_usage
 
                 # 2. Property Type (dynamic based on usage)
-                if form_rules and property_usage in form_rules.get('property_type_by_usage', {}):
-                    type_options = form_rules['property_type_by_usage'][property_usage]
-                else:
-                    type_options = ['Unit', 'Villa', 'Land', 'Building']
-
-                if not type_options:
-                    type_options = ['Unit', 'Villa', 'Land', 'Building']
+                type_options = form_options['types'][property_usage]
 
                 property_type = st.selectbox(
                     "🏗️ Property Type",
-                    options=sorted(type_options),
-                    index=sorted(type_options).index(st.session_state.property_type) if st.session_state.property_type in type_options else 0,
+                    options=type_options,
+                    index=type_options.index(st.session_state.property_type) if st.session_state.property_type in type_options else 0,
                     help="Select property type",
                     key='type_select'
                 )
 
-                # Update session state
-                if property_type != st.session_state.property_type:
-                    st.session_state.property_type = property_type
-                    st.rerun()
+                st.session_state.property_type = property_type
 
                 # 3. Property Sub-Type (dynamic based on usage AND type)
-                if form_rules:
-                    # Try to get subtypes for the specific usage
-                    if property_usage in form_rules.get('property_subtype_by_usage', {}):
-                        subtype_options = form_rules['property_subtype_by_usage'][property_usage]
-                    # Fallback to type-based
-                    elif property_type in form_rules.get('property_subtype_by_type', {}):
-                        subtype_options = form_rules['property_subtype_by_type'][property_type]
-                    else:
-                        subtype_options = sorted(le_subtype.classes_)
-                else:
-                    subtype_options = sorted(le_subtype.classes_)
-
-                # Filter based on categorization
-                if categorization and property_usage == 'Residential':
-                    residential_types = categorization.get('residential_subtypes', [])
-                    subtype_options = [st for st in subtype_options if st in residential_types]
-                elif categorization and property_usage == 'Commercial':
-                    commercial_types = categorization.get('commercial_subtypes', [])
-                    subtype_options = [st for st in subtype_options if st in commercial_types]
-
-                if not subtype_options:
-                    subtype_options = sorted(le_subtype.classes_)[:20]
-
+                subtype_options = form_options['subtypes'][(property_usage, property_type)]
                 default_subtype = 'Flat' if 'Flat' in subtype_options else subtype_options[0]
 
                 property_subtype = st.selectbox(
                     "🏘️ Property Sub-Type",
-                    options=sorted(subtype_options),
-                    index=sorted(subtype_options).index(default_subtype),
+                    options=subtype_options,
+                    index=subtype_options.index(default_subtype),
                     help="Select property sub-type"
                 )
 
@@ -408,23 +482,15 @@ if model_loaded:
                 # 7. Location Area
                 area_name = st.selectbox(
                     "📍 Location Area",
-                    options=sorted(le_area.classes_),
-                    index=sorted(le_area.classes_).index('DUBAI MARINA') if 'DUBAI MARINA' in le_area.classes_ else 0,
+                    options=form_options['areas'],
+                    index=form_options['default_area_index'],
                     help="Select the property location"
                 )
 
             # 8. Registration Type (dynamic based on property type)
-            if form_rules and property_type in form_rules.get('typical_registration_types', {}):
-                reg_type_options = form_rules['typical_registration_types'][property_type]
-            else:
-                reg_type_options = sorted(le_regtype.classes_)
-
-            if not reg_type_options:
-                reg_type_options = sorted(le_regtype.classes_)
-
             reg_type = st.selectbox(
                 "📋 Registration Type",
-                options=reg_type_options,
+                options=form_options['reg_types'][property_type],
                 help="Select registration type"
             )
 
@@ -448,6 +514,11 @@ if model_loaded:
                     for warning in input_warnings:
                         st.warning(warning)
 
+            explain_price = st.checkbox(
+                "Explain the price (feature contributions)",
+                help="Shows how much each input raises or lowers the estimate"
+            )
+
             # Predict button
             if st.button("🎯 Predict Price", type="primary", use_container_width=True):
                 try:
@@ -467,16 +538,14 @@ if model_loaded:
                         regtype_encoded
                     ]])
 
-                    # Make prediction
-                    base_prediction = model.predict(features)[0]
-
-                    # Apply location multiplier if available
-                    location_multiplier = 1.0
-                    if location_multipliers and area_name in location_multipliers:
-                        location_multiplier = location_multipliers[area_name]
-
-                    prediction = base_prediction * location_multiplier
-                    price_per_sqm = prediction / area_size
+                    # Make prediction (with feature contributions from the same traversal when asked),
+                    # then apply the location multiplier and derive the price range
+                    if explain_price:
+                        base_prices, contributions, bias = load_explainer(artifact_version).explain(features)
+                        traffic_importance.update(contributions)
+                    else:
+                        base_prices = model.predict(features)
+                    priced = postprocess(base_prices, [area_encoded], [area_size], area_multipliers)
 
                     # Get confidence
                     confidence, emoji = get_confidence_level(
@@ -484,10 +553,15 @@ if model_loaded:
                     )
 
                     # Store in session state
-                    st.session_state['prediction'] = prediction
-                    st.session_state['base_prediction'] = base_prediction
-                    st.session_state['location_multiplier'] = location_multiplier
-                    st.session_state['price_per_sqm'] = price_per_sqm
+                    st.session_state['prediction'] = float(priced.price[0])
+                    st.session_state['base_prediction'] = float(priced.base_price[0])
+                    st.session_state['location_multiplier'] = float(priced.location_multiplier[0])
+                    st.session_state['location_tier'] = priced.tier_labels()[0]
+                    st.session_state['price_per_sqm'] = float(priced.price_per_sqm[0])
+                    st.session_state['contributions'] = (
+                        (bias, contribution_dict(contributions[0])) if explain_price else None
+                    )
+                    st.session_state['price_range'] = (float(priced.lower_bound[0]), float(priced.upper_bound[0]))
                     st.session_state['confidence'] = confidence
                     st.session_state['confidence_emoji'] = emoji
                     st.session_state['warnings'] = input_warnings if validation_rules and show_bedrooms else []
@@ -500,6 +574,12 @@ if model_loaded:
                         'area': area_name
                     }
 
+                    # Comparable historical transactions backing the estimate
+                    if comps_index is not None:
+                        st.session_state['comparables'] = comps_index.query(
+                            area_name, property_subtype, area_size, bedrooms if show_bedrooms else -1, k=10
+                        )
+
                 except Exception as e:
                     st.error(f"Prediction error: {str(e)}")
 
@@ -514,8 +594,7 @@ if model_loaded:
                 details = st.session_state.get('property_details', {})
 
                 # Price range display (±10%)
-                lower_bound = prediction * 0.90
-                upper_bound = prediction * 1.10
+                lower_bound, upper_bound = st.session_state['price_range']
                 lower_formatted = format_price_millions(lower_bound)
                 upper_formatted = format_price_millions(upper_bound)
 
@@ -531,12 +610,7 @@ if model_loaded:
                 # Show exact price and location multiplier
                 multiplier = st.session_state.get('location_multiplier', 1.0)
                 if multiplier != 1.0:
-                    tier_name = {
-                        2.0: "Ultra Luxury",
-                        1.5: "Luxury",
-                        1.2: "Premium",
-                        0.9: "Budget"
-                    }.get(multiplier, "Standard")
+                    tier_name = st.session_state['location_tier']
                     st.caption(f"Mid-point: {format_price_millions(prediction)} AED ({tier_name} Location {multiplier}x)")
                 else:
                     st.caption(f"Mid-point: {format_price_millions(prediction)} AED")
@@ -554,6 +628,38 @@ if model_loaded:
                     help="Model confidence in this prediction"
                 )
 
+                # What moved the price away from the average: decision-path contribution per feature
+                if st.session_state.get('contributions'):
+                    import pandas as pd
+                    import plotly.express as px
+
+                    bias, contributions = st.session_state['contributions']
+                    base_prediction = st.session_state['base_prediction']
+                    st.divider()
+                    st.caption("**Why this price:**")
+                    contrib_df = pd.DataFrame({
+                        'Feature': [FEATURE_LABELS[feature] for feature in contributions],
+                        'AED': list(contributions.values())
+                    })
+                    contrib_df = contrib_df[contrib_df['AED'].abs() >= 1]
+                    contrib_df['Effect'] = np.where(contrib_df['AED'] >= 0, 'Raises price', 'Lowers price')
+                    fig = px.bar(
+                        contrib_df, x='AED', y='Feature', orientation='h', color='Effect',
+                        color_discrete_map={'Raises price': '#2ca02c', 'Lowers price': '#d62728'}
+                    )
+                    fig.update_layout(
+                        yaxis={'categoryorder': 'array', 'categoryarray': contrib_df.sort_values(
+                            'AED', key=abs)['Feature'].tolist()},
+                        height=280, margin=dict(l=0, r=0, t=10, b=0), showlegend=False
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+                    premium = prediction - base_prediction
+                    st.caption(
+                        f"Average model price {format_price_millions(bias)} AED; the features above move it to "
+                        f"{format_price_millions(base_prediction)} AED"
+                        + (f", and the location premium adds {format_price_millions(premium)} AED." if premium else ".")
+                    )
+
                 # Additional info
                 st.divider()
                 st.caption(f"**Usage:** {details.get('usage', 'N/A')}")
@@ -571,11 +677,39 @@ if model_loaded:
                     for warning in st.session_state['warnings']:
                         st.caption(warning)
 
+                # Comparable transactions
+                if st.session_state.get('comparables'):
+                    import pandas as pd
+
+                    st.divider()
+                    st.caption("**Comparable Transactions:**")
+                    comps_df = pd.DataFrame(st.session_state['comparables'])[
+                        ['transaction_date', 'procedure_area', 'bedrooms', 'actual_worth', 'price_per_sqm', 'project_name_en']
+                    ].rename(columns={
+                        'transaction_date': 'Date',
+                        'procedure_area': 'Size (sqm)',
+                        'bedrooms': 'Beds',
+                        'actual_worth': 'Price (AED)',
+                        'price_per_sqm': 'AED/sqm',
+                        'project_name_en': 'Project'
+                    })
+                    st.dataframe(
+                        comps_df.style.format({'Size (sqm)': '{:.0f}', 'Price (AED)': '{:,.0f}', 'AED/sqm': '{:,.0f}'}),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+
             else:
                 st.info("👈 Fill in the property details and click 'Predict Price' to see results")
 
+    with tab1:
+        prediction_tab()
+
     # TAB 2: Batch Prediction
-    with tab2:
+    @st.fragment
+    def batch_tab():
+        import pandas as pd
+
         st.subheader("Batch Price Prediction")
         st.write("Upload a CSV file with multiple properties to predict prices in bulk")
 
@@ -611,44 +745,56 @@ if model_loaded:
                 df = pd.read_csv(uploaded_file)
                 st.write(f"Loaded {len(df)} properties")
 
+                explain_prices = st.checkbox("Add feature contribution columns")
                 if st.button("🚀 Predict All Prices"):
-                    predictions = []
-
-                    progress_bar = st.progress(0)
-                    for idx, row in df.iterrows():
-                        area_encoded = safe_encode(le_area, row['area_name_en'])
-                        subtype_encoded = safe_encode(le_subtype, row['property_sub_type_en'])
-                        regtype_encoded = safe_encode(le_regtype, row['reg_type_en'])
-
-                        features = np.array([[
-                            row['procedure_area'],
-                            row['bedrooms'],
-                            row['has_parking'],
-                            row['has_project'],
-                            area_encoded,
-                            subtype_encoded,
-                            regtype_encoded
-                        ]])
-
-                        pred = model.predict(features)[0]
-                        predictions.append(pred)
-
-                        progress_bar.progress((idx + 1) / len(df))
-
-                    df['predicted_price'] = predictions
-                    df['price_per_sqm'] = df['predicted_price'] / df['procedure_area']
+                    # Encode whole columns and score each distinct property once
+                    area_codes, area_matches = area_resolver.resolve_column(df['area_name_en'].tolist())
+                    features = build_feature_matrix(
+                        df['procedure_area'],
+                        df['bedrooms'],
+                        df['has_parking'],
+                        df['has_project'],
+                        area_codes,
+                        encode_column(le_subtype, df['property_sub_type_en'].tolist()),
+                        encode_column(le_regtype, df['reg_type_en'].tolist())
+                    )
+                    if explain_prices:
+                        base_prices, contributions, _, unique_properties = explain_deduplicated(
+                            load_explainer(artifact_version), features
+                        )
+                        traffic_importance.update(contributions)
+                    else:
+                        base_prices, unique_properties = predict_deduplicated(model, features)
+                    priced = postprocess(base_prices, area_codes, df['procedure_area'], area_multipliers)
+
+                    df['base_price'] = priced.base_price
+                    df['location_multiplier'] = priced.location_multiplier
+                    df['predicted_price'] = priced.price
+                    df['price_per_sqm'] = priced.price_per_sqm
+                    df['resolved_area'] = [match.name for match in area_matches]
+                    df['area_match'] = [match.match for match in area_matches]
+                    if explain_prices:
+                        for i, feature in enumerate(CONTRIBUTION_FEATURES):
+                            df[f'contribution_{feature}'] = contributions[:, i].round(2)
 
                     st.success(f"✅ Successfully predicted prices for {len(df)} properties!")
 
+                    counts = match_counts(area_matches)
+                    if counts['alias'] or counts['fuzzy']:
+                        st.info(f"ℹ️ {counts['alias'] + counts['fuzzy']} area names were matched by alias or spelling (see resolved_area)")
+                    if counts['unknown']:
+                        st.warning(f"⚠️ {counts['unknown']} area names could not be matched and were priced as {area_resolver.classes[0]}")
+
                     # Display results
                     st.dataframe(df, use_container_width=True)
 
                     # Summary statistics
-                    col1, col2, col3, col4 = st.columns(4)
+                    col1, col2, col3, col4, col5 = st.columns(5)
                     col1.metric("Total Properties", len(df))
-                    col2.metric("Avg. Price", f"{df['predicted_price'].mean():,.0f} AED")
-                    col3.metric("Min Price", f"{df['predicted_price'].min():,.0f} AED")
-                    col4.metric("Max Price", f"{df['predicted_price'].max():,.0f} AED")
+                    col2.metric("Unique Properties", unique_properties, help="Distinct properties scored by the model")
+                    col3.metric("Avg. Price", f"{df['predicted_price'].mean():,.0f} AED")
+                    col4.metric("Min Price", f"{df['predicted_price'].min():,.0f} AED")
+                    col5.metric("Max Price", f"{df['predicted_price'].max():,.0f} AED")
 
                     # Download results
                     st.download_button(
@@ -661,8 +807,109 @@ if model_loaded:
             except Exception as e:
                 st.error(f"Error processing file: {str(e)}")
 
+    with tab2:
+        batch_tab()
+
+    # TAB: Area Comparison
+    @st.fragment
+    def compare_tab():
+        st.subheader("Compare Areas")
+        st.write("Price the same property in every location (or a selection) to see where it is worth the most")
+
+        col_a, col_b, col_c = st.columns(3)
+        with col_a:
+            compare_size = st.number_input("📐 Property Size (sqm)", min_value=10.0, max_value=999.0, value=100.0, step=5.0, key='compare_size')
+            compare_bedrooms = st.selectbox(
+                "🛏️ Bedrooms",
+                options=[0, 1, 2, 3, 4, 5, 6],
+                index=2,
+                format_func=lambda x: "Studio" if x == 0 else f"{x} Bedroom{'s' if x > 1 else ''}",
+                key='compare_bedrooms'
+            )
+        with col_b:
+            subtype_choices = form_options['all_subtypes']
+            compare_subtype = st.selectbox(
+                "🏘️ Property Sub-Type",
+                options=subtype_choices,
+                index=subtype_choices.index('Flat') if 'Flat' in subtype_choices else 0,
+                key='compare_subtype'
+            )
+            compare_reg_type = st.selectbox("📋 Registration Type", options=form_options['all_regtypes'], key='compare_reg_type')
+        with col_c:
+            compare_parking = st.radio(
+                "🚗 Parking",
+                options=[1, 0],
+                format_func=lambda x: "Yes" if x == 1 else "No",
+                horizontal=True,
+                key='compare_parking'
+            )
+            compare_areas_selected = st.multiselect(
+                "📍 Areas (leave empty for all)",
+                options=form_options['areas'],
+                key='compare_areas'
+            )
+
+        if st.button("🗺️ Compare Areas", use_container_width=True):
+            import pandas as pd
+            import plotly.express as px
+
+            try:
+                results = cached_area_comparison(
+                    artifact_version,
+                    compare_size,
+                    compare_bedrooms,
+                    compare_parking,
+                    1,
+                    compare_subtype,
+                    compare_reg_type,
+                    tuple(sorted(compare_areas_selected))
+                )
+                comparison_df = pd.DataFrame(results).rename(columns={
+                    'area_name_en': 'Area',
+                    'predicted_price': 'Price (AED)',
+                    'price_per_sqm': 'Price per sqm (AED)',
+                    'location_multiplier': 'Location Multiplier'
+                }).drop(columns=['base_price'])
+
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Areas Compared", len(comparison_df))
+                col2.metric("Most Expensive", comparison_df['Area'].iloc[0])
+                col3.metric("Most Affordable", comparison_df['Area'].iloc[-1])
+
+                top_areas = comparison_df.head(20)
+                fig = px.bar(
+                    top_areas,
+                    x='Price (AED)',
+                    y='Area',
+                    orientation='h',
+                    title='Top 20 Areas by Predicted Price',
+                    color='Price per sqm (AED)',
+                    color_continuous_scale='Blues'
+                )
+                fig.update_layout(yaxis={'categoryorder': 'total ascending'}, height=600)
+                st.plotly_chart(fig, use_container_width=True)
+
+                st.dataframe(
+                    comparison_df.style.format({
+                        'Price (AED)': '{:,.0f}',
+                        'Price per sqm (AED)': '{:,.0f}',
+                        'Location Multiplier': '{:.1f}x'
+                    }),
+                    use_container_width=True
+                )
+
+            except Exception as e:
+                st.error(f"Area comparison error: {str(e)}")
+
+    with tab_compare:
+        compare_tab()
+
     # TAB 3: Data Insights
-    with tab3:
+    @st.fragment
+    def insights_tab():
+        import pandas as pd
+        import plotly.express as px
+
         st.subheader("Data Insights & Validation Rules")
 
         if form_rules:
@@ -704,12 +951,69 @@ if model_loaded:
 
         st.divider()
 
-        # Feature importance
+        # Market trends from the precomputed rollups
+        if market_data is not None:
+            st.markdown("### 📈 Market Trends")
+
+            col1, col2 = st.columns(2)
+            with col1:
+                trend_area = st.selectbox(
+                    "📍 Area",
+                    options=market_data.areas,
+                    index=market_data.areas.index('DUBAI MARINA') if 'DUBAI MARINA' in market_data.areas else 0,
+                    key='trend_area'
+                )
+            with col2:
+                trend_subtype = st.selectbox("🏘️ Sub-Type", options=['All'] + market_data.subtypes, key='trend_subtype')
+
+            trend = market_data.trend(trend_area, None if trend_subtype == 'All' else trend_subtype)
+            if trend is not None and len(trend):
+                fig = px.line(
+                    trend,
+                    x='month',
+                    y='median_price_per_sqm',
+                    hover_data=['transactions', 'median_price'],
+                    title=f'Median Price per sqm - {trend_area}',
+                    labels={'month': 'Month', 'median_price_per_sqm': 'Median AED/sqm'}
+                )
+                fig.update_layout(height=400)
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No transactions recorded for this selection")
+
+            st.markdown("#### 🏆 Most Expensive Areas (last 12 months)")
+            top_areas = market_data.top_areas(limit=15)
+            fig = px.bar(
+                top_areas,
+                x='median_price_per_sqm_12m',
+                y='area_name_en',
+                orientation='h',
+                hover_data=['transactions_12m', 'yoy_change_pct'],
+                labels={'median_price_per_sqm_12m': 'Median AED/sqm', 'area_name_en': 'Area'},
+                color='yoy_change_pct',
+                color_continuous_scale='RdYlGn'
+            )
+            fig.update_layout(yaxis={'categoryorder': 'total ascending'}, height=500)
+            st.plotly_chart(fig, use_container_width=True)
+
+            st.divider()
+
+        # Feature importance: mean absolute contribution over the explained predictions so far,
+        # or the model's own (impurity-based) importances before any
         st.markdown("### 🎯 Key Price Factors")
-        importance_data = pd.DataFrame({
-            'Feature': ['Property Size', 'Location', 'Registration Type', 'Property Type', 'Bedrooms', 'Project', 'Parking'],
-            'Importance': [66.2, 22.7, 5.1, 2.4, 1.5, 1.3, 0.7]
-        })
+        report = traffic_importance.report()
+        if report['rows']:
+            importance_data = pd.DataFrame({
+                'Feature': [item['label'] for item in report['features']],
+                'Importance': [item['share'] for item in report['features']]
+            })
+            source = f"Share of the average price contribution ({report['rows']:,} properties explained in this app)"
+        else:
+            importance_data = pd.DataFrame({
+                'Feature': [FEATURE_LABELS[feature] for feature in CONTRIBUTION_FEATURES],
+                'Importance': np.round(np.asarray(model.feature_importances_) * 100, 1)
+            }).sort_values('Importance', ascending=False)
+            source = "Model training importances (shown until a price has been explained)"
 
         fig = px.bar(
             importance_data,
@@ -722,11 +1026,17 @@ if model_loaded:
         )
         fig.update_layout(showlegend=False, height=400)
         st.plotly_chart(fig, use_container_width=True)
+        st.caption(source)
 
+        top = importance_data.iloc[:2]
         st.info(
-            "**Key Insight:** Property size accounts for 66% of price variation, "
-            "followed by location at 23%. The smart form ensures you only see relevant options!"
+            f"**Key Insight:** {top['Feature'].iloc[0]} accounts for {top['Importance'].iloc[0]:.0f}% of price variation, "
+            f"followed by {top['Feature'].iloc[1].lower()} at {top['Importance'].iloc[1]:.0f}%. "
+            "The smart form ensures you only see relevant options!"
         )
 
+    with tab3:
+        insights_tab()
+
 else:
     st.error("⚠️ Model files not found. Please run 'save_model.py' first to train and save the model.")
@@ -0,0 +1,116 @@
+"""
+Area-name resolution: map free-text area names onto the area encoder's classes
+
+Resolution order: exact class name, normalized name (case, punctuation and spacing),
+alias table (model/area_aliases.json, e.g. JVC, JLT), then the closest name by character
+trigram similarity. Names that score below min_score are reported as unknown and fall back
+to code 0, like safe_encode. Results are cached per distinct input, so resolving a column
+costs one dict lookup per row after the first occurrence of each value.
+"""
+import re
+from collections import namedtuple
+
+import numpy as np
+
+# Minimum trigram (Dice) similarity for a fuzzy match
+DEFAULT_MIN_SCORE = 0.6
+
+# Distinct inputs remembered before the cache is reset
+MAX_CACHE_SIZE = 100_000
+
+MATCH_TYPES = ('exact', 'normalized', 'alias', 'fuzzy', 'unknown')
+
+AreaMatch = namedtuple('AreaMatch', ['code', 'name', 'match', 'score'])
+
+_NON_ALNUM = re.compile(r'[^0-9A-Z&]+')
+
+
+def normalize_area_name(value):
+    """Upper-case, drop apostrophes and collapse punctuation/whitespace to single spaces"""
+    return _NON_ALNUM.sub(' ', str(value).upper().replace("'", '')).strip()
+
+
+def trigrams(normalized):
+    """Set of character trigrams of a normalized name, padded so word starts count"""
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AreaResolver:
+    """Precomputed lookup tables and trigram index over the known area names"""
+
+    def __init__(self, classes, aliases=None, min_score=DEFAULT_MIN_SCORE):
+        self.classes = [str(name) for name in classes]
+        self.min_score = min_score
+        self.exact = {name: code for code, name in enumerate(self.classes)}
+        self.normalized = {normalize_area_name(name): code for code, name in enumerate(self.classes)}
+
+        self.aliases = {}
+        for alias, name in (aliases or {}).items():
+            if name in self.exact:
+                self.aliases[normalize_area_name(alias)] = self.exact[name]
+            else:
+                print(f"Warning: Alias '{alias}' points to unknown area '{name}', skipping")
+
+        # Inverted index: trigram -> codes of the names containing it
+        postings = {}
+        self.trigram_counts = np.zeros(len(self.classes), dtype=np.float64)
+        for normalized, code in self.normalized.items():
+            grams = trigrams(normalized)
+            self.trigram_counts[code] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(code)
+        self.postings = {gram: np.array(codes, dtype=np.int64) for gram, codes in postings.items()}
+
+        self._cache = {}
+
+    def resolve(self, value):
+        """AreaMatch(code, name, match, score) for one input value"""
+        result = self._cache.get(value)
+        if result is None:
+            result = self._resolve(value)
+            if len(self._cache) >= MAX_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[value] = result
+        return result
+
+    def _resolve(self, value):
+        code = self.exact.get(value)
+        if code is not None:
+            return AreaMatch(code, self.classes[code], 'exact', 1.0)
+
+        normalized = normalize_area_name(value)
+        code = self.normalized.get(normalized)
+        if code is not None:
+            return AreaMatch(code, self.classes[code], 'normalized', 1.0)
+
+        code = self.aliases.get(normalized)
+        if code is not None:
+            return AreaMatch(code, self.classes[code], 'alias', 1.0)
+
+        grams = trigrams(normalized)
+        candidates = [self.postings[gram] for gram in grams if gram in self.postings]
+        if normalized and candidates:
+            shared = np.bincount(np.concatenate(candidates), minlength=len(self.classes))
+            scores = 2 * shared / (len(grams) + self.trigram_counts)
+            code = int(np.argmax(scores))
+            score = float(scores[code])
+            if score >= self.min_score:
+                return AreaMatch(code, self.classes[code], 'fuzzy', round(score, 3))
+
+        return AreaMatch(0, self.classes[0], 'unknown', 0.0)
+
+    def resolve_column(self, values):
+        """Vectorized resolution: (codes array, AreaMatch per row), resolving each distinct value once"""
+        unique = {value: self.resolve(value) for value in set(values)}
+        matches = [unique[value] for value in values]
+        codes = np.fromiter((match.code for match in matches), dtype=np.int64, count=len(matches))
+        return codes, matches
+
+
+def match_counts(matches):
+    """Number of rows per match type"""
+    counts = dict.fromkeys(MATCH_TYPES, 0)
+    for match in matches:
+        counts[match.match] += 1
+    return counts
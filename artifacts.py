@@ -0,0 +1,120 @@
+"""
+Model artifact loading and versioned artifact output
+"""
+import gzip
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime
+
+DEFAULT_MODEL_DIR = 'model'
+VERSIONS_DIR = 'versions'
+MANIFEST_FILE = 'manifest.json'
+
+MODEL_FILE = 'random_forest_model.pkl'
+ENCODER_FILES = {
+    'le_area': 'label_encoder_area.pkl',
+    'le_subtype': 'label_encoder_subtype.pkl',
+    'le_regtype': 'label_encoder_regtype.pkl'
+}
+METADATA_FILE = 'metadata.pkl'
+JSON_FILES = {
+    'validation_rules': 'validation_rules.json',
+    'form_rules': 'dynamic_form_rules.json',
+    'categorization': 'property_categorization.json',
+    'location_multipliers': 'location_multipliers.json',
+    'area_aliases': 'area_aliases.json',
+    'drift_baseline': 'drift_baseline.json'
+}
+
+
+def load_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def load_model(model_dir=DEFAULT_MODEL_DIR):
+    """Load the Random Forest, preferring the uncompressed pickle and falling back to .pkl.gz"""
+    path = os.path.join(model_dir, MODEL_FILE)
+    if os.path.exists(path):
+        return load_pickle(path)
+    with gzip.open(path + '.gz', 'rb') as f:
+        return pickle.load(f)
+
+
+def load_json(model_dir, name):
+    """Load one of the JSON rule files, or None if it is missing"""
+    path = os.path.join(model_dir, JSON_FILES[name])
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def model_version(model_dir=DEFAULT_MODEL_DIR):
+    """Version recorded in the artifact manifest ('base' for the original unversioned artifact)"""
+    path = os.path.join(model_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return 'base'
+    with open(path, 'r') as f:
+        return json.load(f).get('version', 'base')
+
+
+def write_artifact_version(source_dir, model=None, metadata=None, json_updates=None, manifest=None, output_root=None):
+    """
+    Write a complete, self-contained artifact version next to the current one.
+
+    Files not being replaced are copied from source_dir, so the new directory can be
+    served on its own (point MODEL_DIR at it to hot swap). Returns the new directory.
+    """
+    # Microseconds keep back-to-back versions apart; makedirs still refuses an existing name
+    version = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    output_root = output_root or os.path.join(DEFAULT_MODEL_DIR, VERSIONS_DIR)
+    output_dir = os.path.join(output_root, version)
+    os.makedirs(output_dir)
+
+    for filename in list(ENCODER_FILES.values()) + list(JSON_FILES.values()) + [METADATA_FILE]:
+        source = os.path.join(source_dir, filename)
+        if os.path.exists(source):
+            shutil.copy2(source, os.path.join(output_dir, filename))
+
+    if model is not None:
+        with open(os.path.join(output_dir, MODEL_FILE), 'wb') as f:
+            pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    else:
+        for filename in [MODEL_FILE, MODEL_FILE + '.gz']:
+            source = os.path.join(source_dir, filename)
+            if os.path.exists(source):
+                shutil.copy2(source, os.path.join(output_dir, filename))
+
+    if metadata is not None:
+        with open(os.path.join(output_dir, METADATA_FILE), 'wb') as f:
+            pickle.dump(metadata, f)
+
+    for name, content in (json_updates or {}).items():
+        with open(os.path.join(output_dir, JSON_FILES[name]), 'w') as f:
+            json.dump(content, f, indent=2)
+
+    manifest = dict(manifest or {})
+    manifest.update({
+        'version': version,
+        'parent_version': model_version(source_dir),
+        'created': datetime.now().isoformat(timespec='seconds')
+    })
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return output_dir
+
+
+def artifact_fingerprint(model_dir=DEFAULT_MODEL_DIR):
+    """Cheap change detector: resolved directory plus (name, mtime, size) of every artifact file"""
+    resolved = os.path.realpath(model_dir)
+    entries = []
+    for name in sorted(os.listdir(resolved)):
+        path = os.path.join(resolved, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append((name, stat.st_mtime_ns, stat.st_size))
+    return resolved, tuple(entries)
@@ -0,0 +1,85 @@
+"""
+Per-prediction feature contributions and their aggregate over real traffic
+
+The inference backends return decision-path contributions for the 7 model features (see
+backends.py): a property's base price is the forest's bias plus one AED amount per feature.
+FeatureImportance folds the contributions of scored rows into running totals, so global
+importance is the mean absolute contribution of each feature over the properties actually
+priced, rather than a fixed list.
+"""
+import threading
+from datetime import datetime
+
+import numpy as np
+
+# Input fields in model feature order (inference.FEATURES)
+CONTRIBUTION_FEATURES = [
+    'procedure_area',
+    'bedrooms',
+    'has_parking',
+    'has_project',
+    'area_name_en',
+    'property_sub_type_en',
+    'reg_type_en'
+]
+
+# Display names for charts
+FEATURE_LABELS = {
+    'procedure_area': 'Property Size',
+    'bedrooms': 'Bedrooms',
+    'has_parking': 'Parking',
+    'has_project': 'Project',
+    'area_name_en': 'Location',
+    'property_sub_type_en': 'Property Type',
+    'reg_type_en': 'Registration Type'
+}
+
+
+def contribution_dict(row):
+    """{feature: AED} for one row of contributions"""
+    return {feature: round(float(value), 2) for feature, value in zip(CONTRIBUTION_FEATURES, row)}
+
+
+class FeatureImportance:
+    """Running mean absolute and mean signed contribution per feature over scored rows"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.abs_total = np.zeros(len(CONTRIBUTION_FEATURES))
+            self.total = np.zeros(len(CONTRIBUTION_FEATURES))
+            self.rows = 0
+            self.since = datetime.now().isoformat(timespec='seconds')
+
+    def update(self, contributions):
+        """Fold in a (n_rows, 7) contribution matrix"""
+        abs_sum = np.abs(contributions).sum(axis=0)
+        signed_sum = contributions.sum(axis=0)
+        with self.lock:
+            self.abs_total += abs_sum
+            self.total += signed_sum
+            self.rows += len(contributions)
+
+    def report(self):
+        """Features by share of the total mean absolute contribution, largest first"""
+        with self.lock:
+            rows = self.rows
+            abs_total, total = self.abs_total.copy(), self.total.copy()
+            since = self.since
+        mean_abs = abs_total / max(rows, 1)
+        shares = mean_abs / mean_abs.sum() if mean_abs.sum() else mean_abs
+        features = [
+            {
+                'feature': feature,
+                'label': FEATURE_LABELS[feature],
+                'share': round(float(share) * 100, 2),
+                'mean_abs_contribution': round(float(value), 2),
+                'mean_contribution': round(float(signed / max(rows, 1)), 2)
+            }
+            for feature, share, value, signed in zip(CONTRIBUTION_FEATURES, shares, mean_abs, total)
+        ]
+        features.sort(key=lambda item: -item['share'])
+        return {'since': since, 'rows': rows, 'features': features}
@@ -0,0 +1,594 @@
+"""
+Pluggable inference backends for the Random Forest, with startup calibration and routing
+
+Backends (all produce the forest's predictions for the (n_rows, 7) feature matrix):
+    sklearn     the model's own predict
+    flat        all trees flattened into contiguous arrays, traversed for every row and tree at once
+    compressed  the flat layout with float32 thresholds/values and int32 children (about 40% of the
+                memory); thresholds are rounded down so splits are exact, values carry float32 error
+    lookup      exact piecewise-constant surface over procedure_area for each categorical combination
+                (the forest is a step function of size once the other features are fixed), built on
+                first use and kept in an LRU
+
+INFERENCE_BACKEND picks one backend, or 'auto' to benchmark every backend in INFERENCE_BACKENDS on
+synthetic batches at startup and route each batch size to the fastest backend whose output matches
+sklearn.
+
+The flat traversal also yields decision-path (Saabas) contributions: each split along a row's path
+credits the change in node value to the split feature, so a prediction is the forest's bias (mean
+training target) plus one contribution per feature. BackendRouter.explain returns them.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse
+
+from parallelism import single_threaded, with_estimators
+
+DEFAULT_BACKEND = 'sklearn'
+CALIBRATION_BATCH_SIZES = (1, 10, 100, 1000, 10000)
+CALIBRATION_REPEATS = 3
+
+# Relative tolerance for a backend to count as correct during calibration
+CORRECTNESS_RTOL = {'sklearn': 1e-12, 'flat': 1e-9, 'compressed': 1e-5, 'lookup': 1e-9}
+
+N_FEATURES = 7
+
+# Rows from which contributions are averaged with a sparse product rather than a gather (setup cost)
+SPARSE_CONTRIBUTION_ROWS = 64
+
+# Elements (rows x trees) traversed per step by the flat backends, bounding temporary memory
+FLAT_CHUNK_ELEMENTS = 1_000_000
+
+# Categorical combinations whose size surface is kept by the lookup backend
+LOOKUP_CACHE_SIZE = 4096
+
+# Surfaces built per predict call; rows of further unseen combinations use the flat traversal,
+# so a cold batch of mostly distinct combinations does not pay for thousands of surfaces at once
+LOOKUP_BUILDS_PER_CALL = 64
+
+BACKENDS = {}
+
+# Backends that reproduce the model's predictions; only these are calibrated by default with 'auto'
+EXACT_BACKENDS = set()
+
+
+def register_backend(name, factory, exact=True):
+    """
+    Register a backend factory: factory(model) -> object with predict(features).
+
+    exact=False marks backends that answer with different models (e.g. sharded sub-models),
+    which are only used when selected by name.
+    """
+    BACKENDS[name] = factory
+    if exact:
+        EXACT_BACKENDS.add(name)
+    else:
+        EXACT_BACKENDS.discard(name)
+
+
+def forest_trees(model):
+    """Fitted sklearn trees of a forest, or raise TypeError for models that are not tree ensembles"""
+    estimators = getattr(model, 'estimators_', None)
+    if not estimators or not all(hasattr(estimator, 'tree_') for estimator in estimators):
+        raise TypeError(f"{type(model).__name__} is not a fitted tree ensemble")
+    return [estimator.tree_ for estimator in estimators]
+
+
+class SklearnBackend:
+    name = 'sklearn'
+
+    def __init__(self, model):
+        self.model = model
+        self.serial = single_threaded(model)
+        self.groups = {}
+        self.flat = None
+        self.lock = threading.Lock()
+
+    def predict(self, features):
+        return self.serial.predict(features)
+
+    def explainer(self):
+        """Compact flat copy of the forest for contributions, built on first use"""
+        with self.lock:
+            if self.flat is None:
+                self.flat = ExplainerForest(self.model)
+        return self.flat
+
+    def tree_groups(self, n_groups):
+        """The forest split into n_groups single-threaded sub-forests (None for other models)"""
+        if n_groups not in self.groups:
+            try:
+                estimators = list(self.model.estimators_)
+                forest_trees(self.model)
+            except (AttributeError, TypeError):
+                return None
+            self.groups[n_groups] = [
+                with_estimators(self.model, list(part))
+                for part in np.array_split(np.array(estimators, dtype=object), n_groups) if len(part)
+            ]
+        return self.groups[n_groups]
+
+
+class FlatForestBackend:
+    """Every tree's nodes concatenated into flat arrays; leaves point to themselves"""
+
+    name = 'flat'
+    threshold_dtype = np.float64
+    value_dtype = np.float64
+    index_dtype = np.int64
+    feature_dtype = np.int64
+
+    def __init__(self, model):
+        trees = forest_trees(model)
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        self.roots = offsets[:-1].astype(self.index_dtype)
+        self.depth = max(tree.max_depth for tree in trees)
+
+        # Filled one tree at a time into arrays of the final dtypes, so building holds little beyond the result
+        n_nodes = offsets[-1]
+        self.feature = np.empty(n_nodes, dtype=self.feature_dtype)
+        self.threshold = np.empty(n_nodes, dtype=self.threshold_dtype)
+        self.left = np.empty(n_nodes, dtype=self.index_dtype)
+        self.right = np.empty(n_nodes, dtype=self.index_dtype)
+        self.value = np.empty(n_nodes, dtype=self.value_dtype)
+        for offset, tree in zip(offsets, trees):
+            nodes = slice(offset, offset + tree.node_count)
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            self.feature[nodes] = np.where(is_leaf, 0, tree.feature)
+            # A leaf compares against +inf and both children are itself, so traversal needs no leaf test
+            self.threshold[nodes] = np.where(is_leaf, np.inf, self.round_thresholds(tree.threshold))
+            self.left[nodes] = np.where(is_leaf, node_ids, tree.children_left) + offset
+            self.right[nodes] = np.where(is_leaf, node_ids, tree.children_right) + offset
+            self.value[nodes] = tree.value[:, 0, 0]
+        self.path_contributions = None
+        self.leaf_row = None
+        self.table_lock = threading.Lock()
+
+    def round_thresholds(self, thresholds):
+        return thresholds
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in [self.feature, self.threshold, self.left, self.right, self.value])
+
+    def leaves(self, features):
+        """Leaf node index for every (row, tree) pair"""
+        rows = np.ascontiguousarray(features, dtype=np.float32)  # sklearn compares in float32
+        n_rows = len(rows)
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        row_index = np.arange(n_rows)[:, None]
+        for _ in range(self.depth):
+            go_left = rows[row_index, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict(self, features):
+        features = np.asarray(features)
+        chunk = max(1, FLAT_CHUNK_ELEMENTS // len(self.roots))
+        predictions = np.empty(len(features), dtype=np.float64)
+        for start in range(0, len(features), chunk):
+            leaves = self.leaves(features[start:start + chunk])
+            predictions[start:start + chunk] = self.value[leaves].astype(np.float64).mean(axis=1)
+        return predictions
+
+    def explainer(self):
+        return self
+
+    @property
+    def bias(self):
+        """Mean training target over the trees' roots: the prediction before any split"""
+        return float(self.value[self.roots].astype(np.float64).mean())
+
+    def contribution_table(self):
+        """
+        (n_leaves, 7) float32 change in node value along each leaf's path from the root, per split
+        feature, and the int32 row of each node in it (valid for leaves).
+
+        A node's row is its parent's row plus value[node] - value[parent] on the parent's split
+        feature, so a leaf's row sums to value[leaf] - value[root]. Built on first use, one tree at
+        a time, so only the leaves' rows are kept and the build never holds a table for every node.
+        """
+        with self.table_lock:
+            if self.path_contributions is None:
+                is_leaf = self.left == np.arange(len(self.value), dtype=self.index_dtype)
+                leaf_row = np.cumsum(is_leaf, dtype=np.int32) - 1
+                table = np.empty((int(is_leaf.sum()), N_FEATURES), dtype=np.float32)
+                ends = np.append(self.roots[1:], len(self.value))
+                for root, end in zip(self.roots, ends):
+                    tree_table = np.zeros((end - root, N_FEATURES))
+                    nodes = np.array([root])
+                    while len(nodes):
+                        nodes = nodes[self.left[nodes] != nodes]
+                        feature = self.feature[nodes]
+                        gain = self.value[nodes].astype(np.float64)
+                        for children in (self.left[nodes], self.right[nodes]):
+                            tree_table[children - root] = tree_table[nodes - root]
+                            tree_table[children - root, feature] += self.value[children] - gain
+                        nodes = np.concatenate([self.left[nodes], self.right[nodes]])
+                    tree_leaves = np.flatnonzero(is_leaf[root:end])
+                    table[leaf_row[root + tree_leaves]] = tree_table[tree_leaves]
+                self.leaf_row = leaf_row
+                self.path_contributions = table
+        return self.path_contributions, self.leaf_row
+
+    def contributions(self, features):
+        """
+        Predictions and (n_rows, 7) decision-path contributions from one traversal.
+
+        Each row satisfies prediction = bias + contributions.sum() up to the float32 rounding of
+        the table (a few AED on a multi-million price).
+        """
+        features = np.asarray(features)
+        table, leaf_row = self.contribution_table()
+        n_trees = len(self.roots)
+        chunk = max(1, FLAT_CHUNK_ELEMENTS // n_trees)
+        predictions = np.empty(len(features), dtype=np.float64)
+        contributions = np.empty((len(features), N_FEATURES), dtype=np.float64)
+        for start in range(0, len(features), chunk):
+            leaves = self.leaves(features[start:start + chunk])
+            predictions[start:start + chunk] = self.value[leaves].astype(np.float64).mean(axis=1)
+            rows = leaf_row[leaves]
+            if len(rows) < SPARSE_CONTRIBUTION_ROWS:
+                contributions[start:start + chunk] = table[rows].astype(np.float64).mean(axis=1)
+                continue
+            # Averaging the leaves' table rows as a sparse (rows x leaves) product avoids a
+            # (rows, trees, 7) temporary and is several times faster than gathering and reducing
+            # (float32 weights, so the table is used as stored instead of being upcast per call)
+            weights = scipy.sparse.csr_matrix(
+                (np.full(rows.size, 1.0 / n_trees, dtype=np.float32), rows.ravel(),
+                 np.arange(0, rows.size + 1, n_trees)),
+                shape=(len(rows), len(table))
+            )
+            contributions[start:start + chunk] = weights @ table
+        return predictions, contributions
+
+
+class CompressedForestBackend(FlatForestBackend):
+    """Flat forest in float32/int32; thresholds rounded down to float32 keep every split decision exact"""
+
+    name = 'compressed'
+    threshold_dtype = np.float32
+    value_dtype = np.float32
+    index_dtype = np.int32
+    feature_dtype = np.int8
+
+    def round_thresholds(self, thresholds):
+        # For float32 x: x <= t  <=>  x <= (largest float32 <= t)
+        rounded = thresholds.astype(np.float32)
+        too_high = rounded.astype(np.float64) > thresholds
+        rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+        return rounded
+
+
+class ExplainerForest(CompressedForestBackend):
+    """
+    Compact flat forest kept only to explain the sklearn backend: float32 splits and int32 indices,
+    but float64 node values, so its predictions match sklearn's
+    """
+
+    name = 'explainer'
+    value_dtype = np.float64
+
+
+class LookupSurfaceBackend:
+    """
+    Exact prediction by table lookup on procedure_area.
+
+    With bedrooms, parking, project, area, sub-type and registration type fixed, the forest only
+    changes value at the procedure_area thresholds reachable in each tree. The surface for a
+    combination is those thresholds plus one forest prediction per interval.
+    """
+
+    name = 'lookup'
+
+    def __init__(self, model, cache_size=LOOKUP_CACHE_SIZE):
+        self.model = single_threaded(model)
+        self.flat = FlatForestBackend(model)
+        self.cache_size = cache_size
+        self.surfaces = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def size_thresholds(self, combination):
+        """procedure_area thresholds reachable in any tree with the other features fixed"""
+        flat = self.flat
+        row = np.zeros(7, dtype=np.float32)
+        row[1:] = combination
+        found = []
+        # Walk every tree a level at a time: size splits keep both children, others follow the row
+        nodes = flat.roots
+        while len(nodes):
+            nodes = nodes[flat.left[nodes] != nodes]
+            feature = flat.feature[nodes]
+            on_size = feature == 0
+            found.append(flat.threshold[nodes[on_size]])
+            fixed = nodes[~on_size]
+            go_left = row[flat.feature[fixed]] <= flat.threshold[fixed]
+            nodes = np.concatenate([
+                flat.left[nodes[on_size]], flat.right[nodes[on_size]],
+                np.where(go_left, flat.left[fixed], flat.right[fixed])
+            ])
+        return np.unique(np.concatenate(found).astype(np.float64))
+
+    def build_surfaces(self, combinations):
+        """(thresholds, values) per combination, scoring every interval of every combination in one call"""
+        thresholds = [self.size_thresholds(combination) for combination in combinations]
+        blocks = []
+        for combination, combination_thresholds in zip(combinations, thresholds):
+            # One float32 representative per interval (t[i-1], t[i]], plus one above the last threshold
+            representatives = combination_thresholds.astype(np.float32)
+            too_high = representatives.astype(np.float64) > combination_thresholds
+            representatives[too_high] = np.nextafter(representatives[too_high], np.float32(-np.inf))
+            last = representatives[-1] if len(representatives) else np.float32(0)
+            representatives = np.append(representatives, np.nextafter(last, np.float32(np.inf)))
+            block = np.empty((len(representatives), 7), dtype=np.float64)
+            block[:, 0] = representatives
+            block[:, 1:] = combination
+            blocks.append(block)
+
+        values = self.model.predict(np.vstack(blocks))
+        splits = np.cumsum([len(block) for block in blocks])[:-1]
+        return list(zip(thresholds, np.split(values, splits)))
+
+    def surfaces_for(self, combinations):
+        """Cached or newly built surface per combination (None past the per-call build budget)"""
+        keys = [tuple(combination) for combination in combinations]
+        with self.lock:
+            found = [self.surfaces.get(key) for key in keys]
+        missing = [i for i, surface in enumerate(found) if surface is None]
+        build = missing[:LOOKUP_BUILDS_PER_CALL]
+        if build:
+            for i, surface in zip(build, self.build_surfaces(combinations[build])):
+                found[i] = surface
+
+        with self.lock:
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            for key, surface in zip(keys, found):
+                if surface is not None:
+                    self.surfaces[key] = surface
+                    self.surfaces.move_to_end(key)
+            while len(self.surfaces) > self.cache_size:
+                self.surfaces.popitem(last=False)
+        return found
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        sizes = features[:, 0].astype(np.float32).astype(np.float64)
+        predictions = np.empty(len(features), dtype=np.float64)
+
+        combinations, inverse = np.unique(features[:, 1:], axis=0, return_inverse=True)
+        order = np.argsort(inverse.ravel(), kind='stable')
+        bounds = np.cumsum(np.bincount(inverse.ravel(), minlength=len(combinations)))
+        start = 0
+        uncached = []
+        for end, surface in zip(bounds, self.surfaces_for(combinations)):
+            rows = order[start:end]
+            if surface is None:
+                uncached.append(rows)
+            else:
+                thresholds, values = surface
+                predictions[rows] = values[np.searchsorted(thresholds, sizes[rows], side='left')]
+            start = end
+
+        if uncached:
+            rows = np.concatenate(uncached)
+            predictions[rows] = self.flat.predict(features[rows])
+        return predictions
+
+    def explainer(self):
+        return self.flat
+
+    def stats(self):
+        with self.lock:
+            return {'cached_surfaces': len(self.surfaces), 'hits': self.hits, 'misses': self.misses}
+
+
+register_backend('sklearn', SklearnBackend)
+register_backend('flat', FlatForestBackend)
+register_backend('compressed', CompressedForestBackend)
+register_backend('lookup', LookupSurfaceBackend)
+
+
+def create_backends(model, names):
+    """Instantiate the named backends, skipping (with a warning) any that do not support this model"""
+    backends = {}
+    for name in names:
+        if name not in BACKENDS:
+            print(f"Warning: Unknown inference backend '{name}', skipping")
+            continue
+        try:
+            backends[name] = BACKENDS[name](model)
+        except Exception as e:
+            print(f"Warning: Inference backend '{name}' unavailable: {e}")
+    return backends
+
+
+def synthetic_features(n_rows, n_areas, n_subtypes, n_regtypes, seed=0):
+    """Random but plausible feature rows for benchmarking"""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(30, 500, n_rows).round(1),
+        rng.integers(0, 7, n_rows),
+        rng.integers(0, 2, n_rows),
+        rng.integers(0, 2, n_rows),
+        rng.integers(0, n_areas, n_rows),
+        rng.integers(0, n_subtypes, n_rows),
+        rng.integers(0, n_regtypes, n_rows)
+    ]).astype(np.float64)
+
+
+def calibration_features(n_rows, n_areas, n_subtypes, n_regtypes):
+    """
+    Synthetic batch whose rows share a small pool of categorical combinations, as repeat traffic
+    does; scoring it once before timing measures caches (the lookup surfaces) warm
+    """
+    features = synthetic_features(n_rows, n_areas, n_subtypes, n_regtypes)
+    pool = synthetic_features(32, n_areas, n_subtypes, n_regtypes, seed=1)
+    features[:, 1:] = pool[np.random.default_rng(2).integers(0, len(pool), n_rows), 1:]
+    return features
+
+
+class BackendRouter:
+    """Routes each predict call to a backend by batch size; drop-in replacement for model.predict"""
+
+    def __init__(self, backends, default=DEFAULT_BACKEND, policy=None):
+        self.backends = backends
+        self.policy = policy
+        self.default = default if default in backends else next(iter(backends))
+        self.routes = []  # (max_batch_size, backend name), ascending
+        self.calibration = {}
+        # Call counters are updated from the inference executor's worker threads
+        self.lock = threading.Lock()
+        self.calls = dict.fromkeys(backends, 0)
+        self.explanations = 0
+
+    def backend_for(self, n_rows):
+        for max_batch_size, name in self.routes:
+            if n_rows <= max_batch_size:
+                return name
+        return self.routes[-1][1] if self.routes else self.default
+
+    def predict(self, features):
+        name = self.backend_for(len(features))
+        with self.lock:
+            self.calls[name] += 1
+        return self.run(self.backends[name], features)
+
+    @property
+    def explainable(self):
+        """Whether explain() is supported by any backend"""
+        return any(hasattr(backend, 'explainer') for backend in self.backends.values())
+
+    def explain(self, features):
+        """
+        Predictions, (n_rows, 7) decision-path contributions and the bias they add up from,
+        from the flat traversal of the routed backend (or of another that supports it).
+        Raises ValueError when no backend can explain this model (e.g. sharded sub-models).
+        """
+        routed = self.backend_for(len(features))
+        # Backends that already hold a flat forest (the routed one first), then sklearn, which builds one
+        names = sorted(self.backends, key=lambda name: (name == 'sklearn', name != routed))
+        for name in names:
+            if hasattr(self.backends[name], 'explainer'):
+                explainer = self.backends[name].explainer()
+                break
+        else:
+            raise ValueError("Feature contributions are not supported by the active inference backend")
+
+        with self.lock:
+            self.explanations += 1
+        if self.policy is not None and self.policy.strategy_for(explainer, len(features)) == 'rows':
+            parts = self.policy.map_rows(explainer.contributions, features)
+            predictions = np.concatenate([part[0] for part in parts])
+            contributions = np.concatenate([part[1] for part in parts])
+        else:
+            predictions, contributions = explainer.contributions(features)
+        return predictions, contributions, explainer.bias
+
+    def run(self, backend, features):
+        """Predict with one backend, parallelized per the policy when there is one"""
+        if self.policy is None:
+            return backend.predict(features)
+        return self.policy.predict(backend, features)
+
+    def calibrate(self, n_areas, n_subtypes, n_regtypes, batch_sizes=CALIBRATION_BATCH_SIZES,
+                  repeats=CALIBRATION_REPEATS):
+        """
+        Time every backend on synthetic batches and route each size to the fastest correct one
+        (with the parallelism policy applied, so the comparison is the one requests will see)
+        """
+        reference = self.backends.get('sklearn')
+        self.calibration = {}
+        self.routes = []
+        for batch_size in batch_sizes:
+            features = calibration_features(batch_size, n_areas, n_subtypes, n_regtypes)
+            expected = reference.predict(features) if reference is not None else None
+
+            results = {}
+            for name, backend in self.backends.items():
+                try:
+                    output = self.run(backend, features)
+                    correct = expected is None or np.allclose(
+                        output, expected, rtol=CORRECTNESS_RTOL.get(name, 1e-9), atol=1e-6
+                    )
+                    timings = []
+                    for _ in range(repeats):
+                        start = time.perf_counter()
+                        self.run(backend, features)
+                        timings.append(time.perf_counter() - start)
+                    results[name] = {'ms': round(min(timings) * 1000, 3), 'correct': bool(correct)}
+                except Exception as e:
+                    results[name] = {'ms': None, 'correct': False, 'error': str(e)}
+
+            candidates = [(result['ms'], name) for name, result in results.items() if result['correct']]
+            fastest = min(candidates)[1] if candidates else self.default
+            self.calibration[batch_size] = results
+            self.routes.append((batch_size, fastest))
+            timings = ', '.join(f"{name} {result['ms']} ms" for name, result in results.items())
+            print(f"  Batch size {batch_size}: {fastest} ({timings})")
+
+        # Merge neighbouring sizes routed to the same backend
+        merged = []
+        for max_batch_size, name in self.routes:
+            if merged and merged[-1][1] == name:
+                merged[-1] = (max_batch_size, name)
+            else:
+                merged.append((max_batch_size, name))
+        self.routes = merged
+
+    def describe(self):
+        """Routing table, calibration results and call counts for /health"""
+        with self.lock:
+            calls, explanations = dict(self.calls), self.explanations
+        return {
+            'available': list(self.backends),
+            'default': self.default,
+            'routes': [
+                {'max_batch_size': max_batch_size if i < len(self.routes) - 1 else None, 'backend': name}
+                for i, (max_batch_size, name) in enumerate(self.routes)
+            ] or [{'max_batch_size': None, 'backend': self.default}],
+            'calibration': {str(size): results for size, results in self.calibration.items()},
+            'calls': calls,
+            'explanations': explanations,
+            'parallelism': self.policy.describe() if self.policy is not None else None,
+            'backend_stats': {
+                name: backend.stats() for name, backend in self.backends.items() if hasattr(backend, 'stats')
+            }
+        }
+
+
+def build_router(model, backend=DEFAULT_BACKEND, names=None, n_areas=1, n_subtypes=1, n_regtypes=1, policy=None):
+    """
+    Router for a loaded model.
+
+    backend is a backend name or 'auto'; names lists the backends to consider for 'auto'.
+    policy (a ParallelismPolicy) is calibrated for the chosen backends before they are compared.
+    model is None for backends that load their own forests (sharded); such a backend failing
+    raises ValueError since there is no model to fall back to.
+    """
+    if backend != 'auto':
+        backends = create_backends(model, [backend])
+        if not backends:
+            if model is None:
+                raise ValueError(f"Inference backend '{backend}' is unavailable and no model is loaded")
+            print("Warning: Falling back to the sklearn backend")
+            backends = create_backends(model, ['sklearn'])
+    else:
+        names = list(names or [name for name in BACKENDS if name in EXACT_BACKENDS])
+        if 'sklearn' not in names:
+            names.insert(0, 'sklearn')
+        backends = create_backends(model, names)
+
+    router = BackendRouter(backends, default=next(iter(backends)), policy=policy)
+    if policy is not None:
+        policy.calibrate(backends, lambda n_rows: calibration_features(n_rows, n_areas, n_subtypes, n_regtypes))
+    if backend == 'auto':
+        print("Calibrating inference backends...")
+        router.calibrate(n_areas, n_subtypes, n_regtypes)
+    return router
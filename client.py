@@ -0,0 +1,346 @@
+"""
+Python client for the price prediction API
+
+Keeps one pooled keep-alive session per client and groups single-property predict() calls
+made within linger_ms of each other into one /predict/batch request. With model_dir
+pointing at local artifacts, the same interface calls the inference engine in-process
+instead of going over HTTP.
+
+    from client import create_client
+
+    with create_client('http://localhost:8000') as client:
+        client.predict({...})              # auto-batched
+        client.predict_batch([{...}, ...])
+
+    async with create_async_client(model_dir='model') as client:
+        await asyncio.gather(*(client.predict(p) for p in properties))
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_BASE_URL = 'http://localhost:8000'
+DEFAULT_LINGER_MS = 5
+DEFAULT_MAX_BATCH_SIZE = 500
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+
+# Retries for requests shed by the server (429 queue full, 503 deadline), honouring Retry-After
+DEFAULT_RETRIES = 2
+
+_STOP = object()
+
+
+class HTTPBackend:
+    """Pooled keep-alive session against a running API"""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=retries, status_forcelist=[429, 503], allowed_methods=None,
+                      backoff_factor=0.1, respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, path, payload):
+        response = self.session.post(self.base_url + path, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def predict_batch(self, properties):
+        return self.post('/predict/batch', {'properties': properties})['predictions']
+
+    def compare_areas(self, template, areas=None):
+        return self.post('/predict/compare-areas', dict(template, areas=areas))['comparisons']
+
+    def close(self):
+        self.session.close()
+
+
+class LocalBackend:
+    """In-process inference from artifact files, for consumers running next to the model"""
+
+    def __init__(self, model_dir):
+        from area_resolver import AreaResolver
+        from artifacts import ENCODER_FILES, load_json, load_model, load_pickle
+        from inference import area_multiplier_array
+
+        self.model = load_model(model_dir)
+        encoders = {name: load_pickle(os.path.join(model_dir, filename)) for name, filename in ENCODER_FILES.items()}
+        self.le_area = encoders['le_area']
+        self.le_subtype = encoders['le_subtype']
+        self.le_regtype = encoders['le_regtype']
+        self.area_multipliers = area_multiplier_array(self.le_area, load_json(model_dir, 'location_multipliers'))
+        self.area_resolver = AreaResolver(self.le_area.classes_, load_json(model_dir, 'area_aliases'))
+
+    def predict_batch(self, properties):
+        from inference import build_feature_matrix, encode_column, predict_deduplicated
+        from postprocessing import format_aed, postprocess
+
+        if not properties:
+            return []
+        sizes = np.array([p['procedure_area'] for p in properties], dtype=np.float64)
+        area_codes, area_matches = self.area_resolver.resolve_column([p['area_name_en'] for p in properties])
+        features = build_feature_matrix(
+            sizes,
+            [p['bedrooms'] for p in properties],
+            [p['has_parking'] for p in properties],
+            [p['has_project'] for p in properties],
+            area_codes,
+            encode_column(self.le_subtype, [p['property_sub_type_en'] for p in properties]),
+            encode_column(self.le_regtype, [p['reg_type_en'] for p in properties])
+        )
+        base_prices, _ = predict_deduplicated(self.model, features)
+        priced = postprocess(base_prices, area_codes, sizes, self.area_multipliers)
+        columns = priced.rounded()
+        tiers = priced.tier_labels()
+        return [
+            {
+                'predicted_price': columns['predicted_price'][i],
+                'predicted_price_formatted': format_aed(priced.price[i]),
+                'price_per_sqm': columns['price_per_sqm'][i],
+                'base_price': columns['base_price'][i],
+                'location_multiplier': columns['location_multiplier'][i],
+                'location_tier': tiers[i],
+                'price_lower': columns['price_lower'][i],
+                'price_upper': columns['price_upper'][i],
+                'input_features': dict(prop),
+                'area_resolution': {
+                    'input': prop['area_name_en'],
+                    'resolved': match.name,
+                    'match': match.match,
+                    'score': match.score
+                }
+            }
+            for i, (prop, match) in enumerate(zip(properties, area_matches))
+        ]
+
+    def compare_areas(self, template, areas=None):
+        from inference import compare_areas
+        from postprocessing import format_aed
+
+        if areas:
+            areas = [area if match.match == 'unknown' else match.name
+                     for area, match in zip(areas, map(self.area_resolver.resolve, areas))]
+        rows = compare_areas(
+            self.model, self.le_area, self.le_subtype, self.le_regtype, self.area_multipliers,
+            template['procedure_area'], template['bedrooms'], template['has_parking'], template['has_project'],
+            template['property_sub_type_en'], template['reg_type_en'], areas=areas
+        )
+        return [
+            {
+                'area_name_en': row['area_name_en'],
+                'predicted_price': round(row['predicted_price'], 2),
+                'predicted_price_formatted': format_aed(row['predicted_price']),
+                'price_per_sqm': round(row['price_per_sqm'], 2),
+                'location_multiplier': row['location_multiplier']
+            }
+            for row in rows
+        ]
+
+    def close(self):
+        pass
+
+
+class PredictionClient:
+    """
+    Thread-safe synchronous client.
+
+    predict() calls from any number of threads are collected for up to linger_ms (or until
+    max_batch_size) and sent as one batch; linger_ms=0 sends each call on its own.
+    """
+
+    def __init__(self, backend, linger_ms=DEFAULT_LINGER_MS, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 pool_size=DEFAULT_POOL_SIZE):
+        self.backend = backend
+        self.linger = linger_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._senders = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='predict-batch')
+        self._collector = None
+        self._start_lock = threading.Lock()
+
+    def predict(self, prop):
+        """Price one property (a dict shaped like the API's PropertyInput)"""
+        return self.predict_async(prop).result()
+
+    def predict_async(self, prop):
+        """Queue one property for the next batch and return a concurrent.futures.Future"""
+        future = Future()
+        if self.linger <= 0:
+            self._senders.submit(self._send, [(prop, future)])
+            return future
+        self._ensure_collector()
+        self._queue.put((prop, future))
+        return future
+
+    def predict_batch(self, properties):
+        """Price a list of properties, split into max_batch_size requests"""
+        results = []
+        for start in range(0, len(properties), self.max_batch_size):
+            results.extend(self.backend.predict_batch(list(properties[start:start + self.max_batch_size])))
+        return results
+
+    def compare_areas(self, template, areas=None):
+        """Price one property template in every area (or the given areas)"""
+        return self.backend.compare_areas(template, areas)
+
+    def _ensure_collector(self):
+        if self._collector is None:
+            with self._start_lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(target=self._collect, name='predict-collector', daemon=True)
+                    self._collector.start()
+
+    def _collect(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            flush_at = time.monotonic() + self.linger
+            while len(batch) < self.max_batch_size:
+                remaining = flush_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._senders.submit(self._send, batch)
+
+    def _send(self, batch):
+        try:
+            results = self.backend.predict_batch([prop for prop, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def close(self):
+        if self._collector is not None:
+            self._queue.put(_STOP)
+            self._collector.join()
+        self._senders.shutdown(wait=True)
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncPredictionClient:
+    """
+    asyncio client with the same batching; backend calls run in worker threads so the
+    event loop is never blocked on HTTP or model.predict.
+    """
+
+    def __init__(self, backend, linger_ms=DEFAULT_LINGER_MS, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+        self.backend = backend
+        self.linger = linger_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def predict(self, prop):
+        """Price one property, batched with other predict() calls made within linger_ms"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((prop, future))
+        if len(self._pending) >= self.max_batch_size or self.linger <= 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self._flush)
+        return await future
+
+    async def predict_batch(self, properties):
+        """Price a list of properties, split into max_batch_size requests sent concurrently"""
+        chunks = [list(properties[start:start + self.max_batch_size])
+                  for start in range(0, len(properties), self.max_batch_size)]
+        results = await asyncio.gather(*(asyncio.to_thread(self.backend.predict_batch, chunk) for chunk in chunks))
+        return [row for chunk in results for row in chunk]
+
+    async def compare_areas(self, template, areas=None):
+        """Price one property template in every area (or the given areas)"""
+        return await asyncio.to_thread(self.backend.compare_areas, template, areas)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        try:
+            results = await asyncio.to_thread(self.backend.predict_batch, [prop for prop, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.backend.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+def create_backend(base_url=DEFAULT_BASE_URL, model_dir=None, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+    """In-process backend when model_dir holds the model artifacts, HTTP backend otherwise"""
+    if model_dir is not None:
+        from artifacts import MODEL_FILE
+
+        model_path = os.path.join(model_dir, MODEL_FILE)
+        if os.path.exists(model_path) or os.path.exists(model_path + '.gz'):
+            return LocalBackend(model_dir)
+        print(f"Warning: No model found in {model_dir}, using the API at {base_url}")
+    return HTTPBackend(base_url, pool_size=pool_size, timeout=timeout)
+
+
+def create_client(base_url=DEFAULT_BASE_URL, model_dir=None, linger_ms=DEFAULT_LINGER_MS,
+                  max_batch_size=DEFAULT_MAX_BATCH_SIZE, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+    """Synchronous client (in-process when model_dir has the artifacts)"""
+    backend = create_backend(base_url, model_dir, pool_size, timeout)
+    return PredictionClient(backend, linger_ms=linger_ms, max_batch_size=max_batch_size, pool_size=pool_size)
+
+
+def create_async_client(base_url=DEFAULT_BASE_URL, model_dir=None, linger_ms=DEFAULT_LINGER_MS,
+                        max_batch_size=DEFAULT_MAX_BATCH_SIZE, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+    """asyncio client (in-process when model_dir has the artifacts)"""
+    backend = create_backend(base_url, model_dir, pool_size, timeout)
+    return AsyncPredictionClient(backend, linger_ms=linger_ms, max_batch_size=max_batch_size)
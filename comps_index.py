@@ -0,0 +1,239 @@
+"""
+Comparable-transactions index
+
+Compresses the historical transaction CSVs into a memory-mapped columnar store, sorted and
+partitioned by (area, property sub-type). Each partition gets a KD-tree over
+(log size, bedrooms, date) so the nearest historical sales for a property are found in milliseconds.
+
+Build:
+    python comps_index.py --data data/transaction_2000_2024.csv data/transaction_2025_cleaned.csv
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+import numpy as np
+
+DEFAULT_INDEX_DIR = 'comps_index'
+MANIFEST_FILE = 'manifest.json'
+
+# Distance scales: one unit of distance is a 10% size difference, 1/1.5 of a bedroom or one year
+SIZE_SCALE = math.log(1.1)
+BEDROOM_WEIGHT = 1.5
+DATE_SCALE_DAYS = 365.0
+
+# Dictionary-encoded string columns
+DICTIONARY_COLUMNS = ['area_name_en', 'property_sub_type_en', 'reg_type_en', 'project_name_en']
+
+# Numeric columns and the compact dtype each one is stored with
+NUMERIC_COLUMNS = {
+    'days': np.int32,
+    'procedure_area': np.float32,
+    'bedrooms': np.int8,
+    'has_parking': np.int8,
+    'actual_worth': np.float64
+}
+
+
+def encode_categorical(series, mapping):
+    """Map a categorical series onto a growing {value: code} dictionary (-1 for missing)"""
+    categories = series.cat.categories
+    category_codes = np.empty(len(categories) + 1, dtype=np.int32)
+    for i, value in enumerate(categories):
+        category_codes[i] = mapping.setdefault(value, len(mapping))
+    category_codes[-1] = -1  # cat.codes uses -1 for missing values
+    return category_codes[series.cat.codes.to_numpy()]
+
+
+def build_comps_index(paths, output_dir=DEFAULT_INDEX_DIR, chunksize=None):
+    """Read transaction CSVs in chunks and write the partitioned columnar comps store"""
+    from transactions import DEFAULT_CHUNK_SIZE, read_transactions
+
+    start_time = time.time()
+    mappings = {column: {} for column in DICTIONARY_COLUMNS}
+    parts = {column: [] for column in DICTIONARY_COLUMNS + list(NUMERIC_COLUMNS)}
+
+    for chunk in read_transactions(paths, chunksize=chunksize or DEFAULT_CHUNK_SIZE):
+        for column in DICTIONARY_COLUMNS:
+            if column in chunk.columns:
+                parts[column].append(encode_categorical(chunk[column], mappings[column]))
+            else:
+                parts[column].append(np.full(len(chunk), -1, dtype=np.int32))
+
+        days = chunk['instance_date'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+        parts['days'].append(days.astype(np.int32))
+        for column in ['procedure_area', 'bedrooms', 'has_parking', 'actual_worth']:
+            parts[column].append(chunk[column].to_numpy().astype(NUMERIC_COLUMNS[column]))
+        print(f"  Read {sum(len(p) for p in parts['days']):,} transactions...")
+
+    columns = {column: np.concatenate(arrays) if arrays else np.array([], dtype=np.int32)
+               for column, arrays in parts.items()}
+    # Rows without a sub-type cannot be matched to a partition
+    keep = columns['property_sub_type_en'] >= 0
+    columns = {column: values[keep] for column, values in columns.items()}
+
+    # Sort by partition, then by size so partitions are contiguous and size-local
+    order = np.lexsort((columns['procedure_area'], columns['property_sub_type_en'], columns['area_name_en']))
+    columns = {column: values[order] for column, values in columns.items()}
+
+    area_codes = columns['area_name_en']
+    subtype_codes = columns['property_sub_type_en']
+    boundaries = np.flatnonzero((np.diff(area_codes) != 0) | (np.diff(subtype_codes) != 0)) + 1
+    starts = np.concatenate([[0], boundaries]) if len(area_codes) else np.array([], dtype=np.int64)
+    ends = np.concatenate([boundaries, [len(area_codes)]]) if len(area_codes) else np.array([], dtype=np.int64)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for column, values in columns.items():
+        np.save(os.path.join(output_dir, f'{column}.npy'), values)
+
+    manifest = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'sources': [os.path.basename(path) for path in paths],
+        'total_transactions': int(len(area_codes)),
+        'max_date': str(np.datetime64(int(columns['days'].max()), 'D')) if len(area_codes) else None,
+        'dictionaries': {column: list(mapping) for column, mapping in mappings.items()},
+        'partitions': [
+            [int(area_codes[s]), int(subtype_codes[s]), int(s), int(e)] for s, e in zip(starts, ends)
+        ],
+        'scales': {
+            'size_log': SIZE_SCALE,
+            'bedroom_weight': BEDROOM_WEIGHT,
+            'date_days': DATE_SCALE_DAYS
+        }
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+    size_mb = sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir)) / 1e6
+    print(f"Comps index written to {output_dir}: {len(area_codes):,} transactions, "
+          f"{len(starts):,} partitions, {size_mb:.1f} MB in {time.time() - start_time:.1f}s")
+    return manifest
+
+
+class CompsIndex:
+    """Memory-mapped comps store with lazily built per-partition KD-trees"""
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR, max_cached_trees=512):
+        with open(os.path.join(index_dir, MANIFEST_FILE), 'r') as f:
+            self.manifest = json.load(f)
+
+        self.columns = {
+            column: np.load(os.path.join(index_dir, f'{column}.npy'), mmap_mode='r')
+            for column in DICTIONARY_COLUMNS + list(NUMERIC_COLUMNS)
+        }
+        self.dictionaries = self.manifest['dictionaries']
+        self.codes = {
+            column: {value: code for code, value in enumerate(values)}
+            for column, values in self.dictionaries.items()
+        }
+        self.partitions = {(a, s): (start, end) for a, s, start, end in self.manifest['partitions']}
+        self.scales = self.manifest['scales']
+        self.max_date = self.manifest['max_date']
+        self.max_cached_trees = max_cached_trees
+        self._trees = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.manifest['total_transactions']
+
+    def scaled_points(self, procedure_area, bedrooms, days):
+        """Project (size, bedrooms, date) into the space the distances are measured in"""
+        return np.column_stack([
+            np.log(np.maximum(np.asarray(procedure_area, dtype=np.float64), 1e-3)) / self.scales['size_log'],
+            np.asarray(bedrooms, dtype=np.float64) * self.scales['bedroom_weight'],
+            np.asarray(days, dtype=np.float64) / self.scales['date_days']
+        ])
+
+    def partition_tree(self, key):
+        """KD-tree for one partition, built on first use and kept in a bounded LRU"""
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is not None:
+                self._trees.move_to_end(key)
+                return tree
+
+        from sklearn.neighbors import KDTree
+
+        start, end = self.partitions[key]
+        points = self.scaled_points(
+            self.columns['procedure_area'][start:end],
+            self.columns['bedrooms'][start:end],
+            self.columns['days'][start:end]
+        )
+        tree = KDTree(points, leaf_size=32)
+
+        with self._lock:
+            self._trees[key] = tree
+            while len(self._trees) > self.max_cached_trees:
+                self._trees.popitem(last=False)
+        return tree
+
+    def query(self, area_name_en, property_sub_type_en, procedure_area, bedrooms, k=10, as_of=None):
+        """Nearest historical transactions for a property, closest first"""
+        area_code = self.codes['area_name_en'].get(area_name_en)
+        subtype_code = self.codes['property_sub_type_en'].get(property_sub_type_en)
+        key = (area_code, subtype_code)
+        if key not in self.partitions:
+            return []
+
+        as_of = as_of or self.max_date or date.today().isoformat()
+        as_of_days = np.datetime64(as_of, 'D').astype(np.int64)
+
+        start, _ = self.partitions[key]
+        tree = self.partition_tree(key)
+        k = min(k, tree.data.shape[0])
+        distances, positions = tree.query(self.scaled_points([procedure_area], [bedrooms], [as_of_days]), k=k)
+        rows = positions[0] + start
+
+        regtypes = self.dictionaries['reg_type_en']
+        projects = self.dictionaries['project_name_en']
+        comparables = []
+        for distance, row in zip(distances[0], rows):
+            size = float(self.columns['procedure_area'][row])
+            price = float(self.columns['actual_worth'][row])
+            regtype_code = int(self.columns['reg_type_en'][row])
+            project_code = int(self.columns['project_name_en'][row])
+            comparables.append({
+                'transaction_date': str(np.datetime64(int(self.columns['days'][row]), 'D')),
+                'area_name_en': area_name_en,
+                'property_sub_type_en': property_sub_type_en,
+                'reg_type_en': regtypes[regtype_code] if regtype_code >= 0 else None,
+                'project_name_en': projects[project_code] if project_code >= 0 else None,
+                'procedure_area': round(size, 2),
+                'bedrooms': int(self.columns['bedrooms'][row]),
+                'has_parking': int(self.columns['has_parking'][row]),
+                'actual_worth': round(price, 2),
+                'price_per_sqm': round(price / size, 2),
+                'similarity_distance': round(float(distance), 4)
+            })
+        return comparables
+
+
+def load_comps_index(index_dir=DEFAULT_INDEX_DIR):
+    """Load the comps index if it has been built, otherwise return None"""
+    if not os.path.exists(os.path.join(index_dir, MANIFEST_FILE)):
+        return None
+    return CompsIndex(index_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the comparable-transactions index")
+    parser.add_argument('--data', nargs='+', default=['data/transaction_2000_2024.csv'],
+                        help="Transaction CSV files to index")
+    parser.add_argument('--output', default=DEFAULT_INDEX_DIR, help="Output directory")
+    parser.add_argument('--chunksize', type=int, default=None, help="CSV rows read per chunk")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Building comparable-transactions index")
+    print("=" * 80)
+    build_comps_index(args.data, args.output, args.chunksize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Constant-memory drift monitoring of prediction traffic against the training data
+
+The API folds every scored row into fixed-size state: quantile sketches of procedure_area
+and of the model's price (the base price, before location multipliers, comparable to the
+training target), request counts per area and sub-type code, and how often an area, sub-type
+or registration type was unknown and fell back to the default class. Memory does not grow
+with traffic. GET /drift compares that state with drift_baseline.json, computed from the
+training data, using the population stability index (PSI).
+
+Build the baseline for an artifact from prepared training data (prepare_training_data.py
+also writes one next to its output):
+    python drift.py --training-data training_data --model-dir model
+"""
+import argparse
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from artifacts import DEFAULT_MODEL_DIR, ENCODER_FILES, JSON_FILES, load_pickle
+from streaming_stats import QuantileSketch
+
+# Sketch parameters shared by the baseline and the live monitor (their buckets must line up)
+SIZE_SKETCH = {'relative_accuracy': 0.01, 'min_value': 1.0, 'max_value': 1e5}
+PRICE_SKETCH = {'relative_accuracy': 0.01, 'min_value': 1e3, 'max_value': 1e10}
+
+# Numeric features are compared over this many equal-count bins of the baseline
+PSI_BINS = 10
+# Usual PSI reading: below 0.1 stable, 0.1-0.25 moderate shift, above 0.25 significant shift
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# Share of requests with an unknown category that counts as drift
+UNKNOWN_RATE_ALERT = 0.05
+# Rows needed before a comparison is reported
+MIN_ROWS = 100
+# Categories listed under the largest share changes
+TOP_SHIFTS = 5
+
+BASELINE_CHUNK_ROWS = 1_000_000
+UNKNOWN_COLUMNS = ('area', 'subtype', 'regtype')
+
+
+def build_baseline(features, prices, area_classes, subtype_classes):
+    """Baseline statistics of a training set, with categories keyed by name (encoder independent)"""
+    size = QuantileSketch(**SIZE_SKETCH)
+    price = QuantileSketch(**PRICE_SKETCH)
+    areas = np.zeros(len(area_classes), dtype=np.int64)
+    subtypes = np.zeros(len(subtype_classes), dtype=np.int64)
+    for start in range(0, len(prices), BASELINE_CHUNK_ROWS):
+        chunk = np.asarray(features[start:start + BASELINE_CHUNK_ROWS])
+        size.add(chunk[:, 0])
+        price.add(prices[start:start + BASELINE_CHUNK_ROWS])
+        areas += np.bincount(chunk[:, 4].astype(np.int64), minlength=len(areas))[:len(areas)]
+        subtypes += np.bincount(chunk[:, 5].astype(np.int64), minlength=len(subtypes))[:len(subtypes)]
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'rows': int(len(prices)),
+        'procedure_area': size.to_dict(),
+        'price': price.to_dict(),
+        'areas': {str(name): int(count) for name, count in zip(area_classes, areas) if count},
+        'subtypes': {str(name): int(count) for name, count in zip(subtype_classes, subtypes) if count}
+    }
+
+
+def psi(expected, actual):
+    """Population stability index between two count vectors over the same bins"""
+    expected = np.maximum(np.asarray(expected, dtype=np.float64) / max(np.sum(expected), 1), 1e-4)
+    actual = np.maximum(np.asarray(actual, dtype=np.float64) / max(np.sum(actual), 1), 1e-4)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def psi_status(value):
+    if value is None:
+        return 'unknown'
+    if value >= PSI_SIGNIFICANT:
+        return 'significant'
+    if value >= PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
+
+
+def sketch_psi(baseline, current, bins=PSI_BINS):
+    """PSI of two sketches with the same parameters, over equal-count bins of the baseline"""
+    cumulative = np.cumsum(baseline.counts)
+    edges = np.unique(np.searchsorted(cumulative, cumulative[-1] * np.arange(1, bins) / bins, side='left') + 1)
+    starts = np.concatenate([[0], edges[edges < len(cumulative)]])
+    return psi(np.add.reduceat(baseline.counts, starts), np.add.reduceat(current.counts, starts))
+
+
+def sketch_summary(sketch):
+    p10, p50, p90 = sketch.quantiles([0.1, 0.5, 0.9])
+    return {'p10': p10, 'p50': p50, 'p90': p90, 'mean': sketch.mean}
+
+
+def share_shifts(labels, expected, actual, limit=TOP_SHIFTS):
+    """Categories whose share of traffic moved the most from the baseline"""
+    expected_share = expected / max(expected.sum(), 1)
+    actual_share = actual / max(actual.sum(), 1)
+    order = np.argsort(-np.abs(actual_share - expected_share), kind='stable')[:limit]
+    return [
+        {'name': str(labels[i]), 'share': round(float(actual_share[i]), 4),
+         'baseline_share': round(float(expected_share[i]), 4)}
+        for i in order if actual[i] or expected[i]
+    ]
+
+
+class DriftMonitor:
+    """Fixed-size running statistics of scored requests, compared on demand with the baseline"""
+
+    def __init__(self, area_classes, subtype_classes, baseline=None):
+        self.area_classes = list(area_classes)
+        self.subtype_classes = list(subtype_classes)
+        self.baseline = baseline
+        if baseline is not None:
+            self.baseline_size = QuantileSketch.from_dict(baseline['procedure_area'])
+            self.baseline_price = QuantileSketch.from_dict(baseline['price'])
+            self.baseline_areas = np.array([baseline['areas'].get(name, 0) for name in self.area_classes])
+            self.baseline_subtypes = np.array([baseline['subtypes'].get(name, 0) for name in self.subtype_classes])
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.size = QuantileSketch(**SIZE_SKETCH)
+            self.price = QuantileSketch(**PRICE_SKETCH)
+            self.areas = np.zeros(len(self.area_classes), dtype=np.int64)
+            self.subtypes = np.zeros(len(self.subtype_classes), dtype=np.int64)
+            self.unknown = dict.fromkeys(UNKNOWN_COLUMNS, 0)
+            self.rows = 0
+            self.since = datetime.now().isoformat(timespec='seconds')
+
+    def update(self, features, base_prices, unknown):
+        """Fold a scored batch in: feature matrix, model prices and unknown counts per column"""
+        area_codes = features[:, 4].astype(np.int64)
+        subtype_codes = features[:, 5].astype(np.int64)
+        with self.lock:
+            self.size.add(features[:, 0])
+            self.price.add(base_prices)
+            if len(features) == 1:
+                self.areas[area_codes[0]] += 1
+                self.subtypes[subtype_codes[0]] += 1
+            else:
+                np.add.at(self.areas, area_codes, 1)
+                np.add.at(self.subtypes, subtype_codes, 1)
+            for column, count in unknown.items():
+                self.unknown[column] += count
+            self.rows += len(features)
+
+    def report(self):
+        """Current distributions, PSI against the baseline and an overall status"""
+        with self.lock:
+            rows = self.rows
+            size, price = self.size, self.price
+            size_summary, price_summary = sketch_summary(size), sketch_summary(price)
+            areas, subtypes = self.areas.copy(), self.subtypes.copy()
+            size_counts, price_counts = size.counts.copy(), price.counts.copy()
+            unknown = dict(self.unknown)
+            since = self.since
+
+        unknown_rate = {column: round(count / rows, 4) if rows else None for column, count in unknown.items()}
+        report = {
+            'since': since,
+            'rows': rows,
+            'baseline_rows': self.baseline['rows'] if self.baseline else None,
+            'features': {
+                'procedure_area': {'current': size_summary},
+                'predicted_price': {'current': price_summary},
+                'area': {},
+                'subtype': {}
+            },
+            'unknown_rate': unknown_rate,
+            'unknown_status': 'significant' if any(
+                rate is not None and rate > UNKNOWN_RATE_ALERT for rate in unknown_rate.values()
+            ) else 'stable'
+        }
+        if self.baseline is None:
+            report['status'] = 'no_baseline'
+            return report
+
+        features = report['features']
+        features['procedure_area']['baseline'] = sketch_summary(self.baseline_size)
+        features['predicted_price']['baseline'] = sketch_summary(self.baseline_price)
+        if rows < MIN_ROWS:
+            report['status'] = 'insufficient_data'
+            return report
+
+        current_size = QuantileSketch(**SIZE_SKETCH)
+        current_size.counts = size_counts
+        current_price = QuantileSketch(**PRICE_SKETCH)
+        current_price.counts = price_counts
+        features['procedure_area']['psi'] = round(sketch_psi(self.baseline_size, current_size), 4)
+        features['predicted_price']['psi'] = round(sketch_psi(self.baseline_price, current_price), 4)
+        features['area'] = {
+            'psi': round(psi(self.baseline_areas, areas), 4),
+            'top_shifts': share_shifts(self.area_classes, self.baseline_areas, areas),
+            'not_in_baseline': [name for name, count, expected in zip(self.area_classes, areas, self.baseline_areas)
+                                if count and not expected]
+        }
+        features['subtype'] = {
+            'psi': round(psi(self.baseline_subtypes, subtypes), 4),
+            'top_shifts': share_shifts(self.subtype_classes, self.baseline_subtypes, subtypes),
+            'not_in_baseline': [name for name, count, expected in
+                                zip(self.subtype_classes, subtypes, self.baseline_subtypes) if count and not expected]
+        }
+        for feature in features.values():
+            feature['status'] = psi_status(feature['psi'])
+
+        statuses = [feature['status'] for feature in features.values()] + [report['unknown_status']]
+        report['status'] = next((status for status in ['significant', 'moderate'] if status in statuses), 'stable')
+        return report
+
+
+def main():
+    from prepare_training_data import load_training_data
+    from sharding import code_remap
+
+    parser = argparse.ArgumentParser(description="Write drift_baseline.json for an artifact from training data")
+    parser.add_argument('--training-data', default='training_data', help="Output of prepare_training_data.py")
+    parser.add_argument('--model-dir', default=DEFAULT_MODEL_DIR, help="Artifact the baseline is written to")
+    args = parser.parse_args()
+
+    features, prices, _ = load_training_data(args.training_data)
+    le_area = load_pickle(os.path.join(args.training_data, ENCODER_FILES['le_area']))
+    le_subtype = load_pickle(os.path.join(args.training_data, ENCODER_FILES['le_subtype']))
+    baseline = build_baseline(features, prices, le_area.classes_, le_subtype.classes_)
+
+    # Warn about training categories the artifact's encoders do not know (they cannot be monitored)
+    model_area = load_pickle(os.path.join(args.model_dir, ENCODER_FILES['le_area']))
+    missing = int((code_remap(le_area, model_area) < 0).sum())
+    if missing:
+        print(f"Warning: {missing} training areas are not in the model's area encoder")
+
+    path = os.path.join(args.model_dir, JSON_FILES['drift_baseline'])
+    with open(path, 'w') as f:
+        json.dump(baseline, f)
+    print(f"Wrote drift baseline for {baseline['rows']:,} rows to {path}")
+
+
+if __name__ == "__main__":
+    main()
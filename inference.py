@@ -0,0 +1,134 @@
+"""
+Shared inference helpers used by both the FastAPI backend and the Streamlit app
+"""
+import numpy as np
+
+from postprocessing import postprocess
+
+# Feature order expected by the Random Forest model
+FEATURES = [
+    'procedure_area',
+    'bedrooms',
+    'has_parking',
+    'has_project',
+    'area_encoded',
+    'subtype_encoded',
+    'regtype_encoded'
+]
+
+
+def class_index(encoder):
+    """Return a {class: code} lookup for a fitted LabelEncoder (built once per encoder)"""
+    lookup = getattr(encoder, '_class_index', None)
+    if lookup is None:
+        lookup = {value: code for code, value in enumerate(encoder.classes_)}
+        encoder._class_index = lookup
+    return lookup
+
+
+def encode_column(encoder, values):
+    """Encode a sequence of categorical values, mapping unknown values to the first class"""
+    lookup = class_index(encoder)
+    return np.fromiter((lookup.get(value, 0) for value in values), dtype=np.int64, count=len(values))
+
+
+def build_feature_matrix(procedure_area, bedrooms, has_parking, has_project,
+                         area_codes, subtype_codes, regtype_codes):
+    """Stack feature columns into the (n_rows, 7) matrix expected by the model"""
+    return np.column_stack([
+        np.asarray(procedure_area, dtype=np.float64),
+        np.asarray(bedrooms, dtype=np.float64),
+        np.asarray(has_parking, dtype=np.float64),
+        np.asarray(has_project, dtype=np.float64),
+        np.asarray(area_codes, dtype=np.float64),
+        np.asarray(subtype_codes, dtype=np.float64),
+        np.asarray(regtype_codes, dtype=np.float64)
+    ])
+
+
+def area_multiplier_array(le_area, location_multipliers):
+    """Location multipliers aligned with le_area codes (1.0 for areas without a premium)"""
+    multipliers = location_multipliers or {}
+    return np.array([multipliers.get(area, 1.0) for area in le_area.classes_], dtype=np.float64)
+
+
+def compare_areas(model, le_area, le_subtype, le_regtype, multiplier_array,
+                  procedure_area, bedrooms, has_parking, has_project,
+                  property_sub_type_en, reg_type_en, areas=None):
+    """
+    Price one property template in every area (or a subset) with a single batched predict.
+
+    Returns a list of dicts sorted by predicted price, highest first.
+    Raises ValueError if any requested area is unknown.
+    """
+    if areas:
+        lookup = class_index(le_area)
+        unknown = [area for area in areas if area not in lookup]
+        if unknown:
+            raise ValueError(f"Unknown areas: {', '.join(unknown)}")
+        area_codes = np.unique(np.array([lookup[area] for area in areas], dtype=np.int64))
+    else:
+        area_codes = np.arange(len(le_area.classes_), dtype=np.int64)
+
+    n_rows = len(area_codes)
+    subtype_code = encode_column(le_subtype, [property_sub_type_en])[0]
+    regtype_code = encode_column(le_regtype, [reg_type_en])[0]
+
+    features = build_feature_matrix(
+        np.full(n_rows, procedure_area),
+        np.full(n_rows, bedrooms),
+        np.full(n_rows, has_parking),
+        np.full(n_rows, has_project),
+        area_codes,
+        np.full(n_rows, subtype_code),
+        np.full(n_rows, regtype_code)
+    )
+
+    priced = postprocess(model.predict(features), area_codes, np.full(n_rows, procedure_area), multiplier_array)
+
+    order = np.argsort(-priced.price, kind='stable')
+    area_names = le_area.classes_[area_codes]
+    return [
+        {
+            'area_name_en': str(area_names[i]),
+            'predicted_price': float(priced.price[i]),
+            'base_price': float(priced.base_price[i]),
+            'location_multiplier': float(priced.location_multiplier[i]),
+            'price_per_sqm': float(priced.price_per_sqm[i])
+        }
+        for i in order
+    ]
+
+
+def predict_deduplicated(model, features):
+    """
+    Predict only the distinct feature rows and scatter the results back to the original order.
+
+    Rows are hashed by their raw bytes, so identical units (same floor plan on many floors)
+    cost a single model evaluation. Returns (predictions, number of unique rows).
+    """
+    rows = np.ascontiguousarray(features, dtype=np.float64)
+    if len(rows) == 0:
+        return np.empty(0), 0
+    unique, inverse = unique_rows(rows)
+    unique_predictions = model.predict(unique)
+    return unique_predictions[inverse], len(unique)
+
+
+def explain_deduplicated(router, features):
+    """
+    predict_deduplicated with decision-path contributions (router is a backends.BackendRouter).
+
+    Returns (predictions, (n_rows, 7) contributions, bias, number of unique rows).
+    """
+    rows = np.ascontiguousarray(features, dtype=np.float64)
+    unique, inverse = unique_rows(rows)
+    predictions, contributions, bias = router.explain(unique)
+    return predictions[inverse], contributions[inverse], bias, len(unique)
+
+
+def unique_rows(rows):
+    """Distinct rows of a contiguous float64 matrix (hashed by their raw bytes) and the inverse index"""
+    keys = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    return rows[first], inverse.ravel()
@@ -0,0 +1,137 @@
+"""
+Bounded executor for model inference with admission control and load shedding
+
+A fixed number of worker threads run model.predict, and at most queue_size further calls
+may wait for a worker. Anything beyond that is rejected immediately (QueueFull), and calls
+whose deadline cannot be met are rejected before they use a worker (DeadlineExceeded).
+Under a spike some requests fail fast instead of every request slowing down.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_QUEUE_SIZE = 32
+
+# Weight of the latest call in the moving average of service time
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class Overloaded(Exception):
+    """Base class for calls rejected by the executor"""
+
+
+class QueueFull(Overloaded):
+    """All workers are busy and the admission queue is full"""
+
+
+class DeadlineExceeded(Overloaded):
+    """The call could not finish before its deadline"""
+
+
+class InferenceExecutor:
+    """Thread pool with a bounded admission queue, per-call deadlines and shedding counters"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='inference')
+        self._lock = threading.Lock()
+        self._pending = 0  # admitted and not finished (queued + running)
+        self._running = 0
+        self._service_time = None  # moving average, seconds
+        self.completed = 0
+        self.failed = 0
+        self.shed_queue_full = 0
+        self.shed_deadline = 0
+
+    def estimated_wait(self):
+        """Expected seconds until a newly admitted call finishes"""
+        if self._service_time is None:
+            return 0.0
+        queued = max(0, self._pending - self.workers + 1)
+        return (queued / self.workers + 1) * self._service_time
+
+    def submit(self, fn, *args, deadline=None):
+        """
+        Admit a call and return its concurrent.futures.Future.
+
+        deadline is a time.monotonic() value. Raises QueueFull or DeadlineExceeded
+        instead of queueing work that would be rejected or late anyway.
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                self.shed_queue_full += 1
+                raise QueueFull(f"Inference queue is full ({self.queue_size} waiting)")
+            if deadline is not None and deadline - time.monotonic() <= self.estimated_wait():
+                self.shed_deadline += 1
+                raise DeadlineExceeded("Deadline cannot be met at the current queue depth")
+            self._pending += 1
+
+        future = self._pool.submit(self._execute, fn, args, deadline)
+        # Runs whether the call finished, failed or was cancelled while still queued
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, deadline=None):
+        """Await a call from async code; a call still queued at its deadline is cancelled"""
+        future = asyncio.wrap_future(self.submit(fn, *args, deadline=deadline))
+        if deadline is None:
+            return await future
+        try:
+            return await asyncio.wait_for(future, max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.shed_deadline += 1
+            raise DeadlineExceeded("Deadline exceeded while waiting for inference")
+
+    def _execute(self, fn, args, deadline):
+        if deadline is not None and time.monotonic() >= deadline:
+            with self._lock:
+                self.shed_deadline += 1
+            raise DeadlineExceeded("Deadline expired in the inference queue")
+
+        with self._lock:
+            self._running += 1
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._running -= 1
+                if self._service_time is None:
+                    self._service_time = elapsed
+                else:
+                    self._service_time += SERVICE_TIME_SMOOTHING * (elapsed - self._service_time)
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self):
+        """Snapshot of queue depth, throughput and shedding counters"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'in_flight': self._running,
+                'queue_depth': max(0, self._pending - self._running),
+                'completed': self.completed,
+                'failed': self.failed,
+                'shed_queue_full': self.shed_queue_full,
+                'shed_deadline': self.shed_deadline,
+                'avg_service_time_ms': round(self._service_time * 1000, 3) if self._service_time else None
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,245 @@
+"""
+Columnar transaction history store with precomputed market rollups
+
+Ingestion converts the transaction CSVs into a Parquet dataset partitioned by year and area
+(categoricals are dictionary-encoded by Parquet), then computes small rollup tables
+(median price per sqm by area / month / sub-type) that the API and the Streamlit
+insights tab read instead of scanning the raw history.
+
+Ingest:
+    python market_store.py --data data/transaction_2000_2024.csv data/transaction_2025_cleaned.csv
+"""
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_STORE_DIR = 'market_store'
+HISTORY_DIR = 'history'
+STAGING_DIR = '_staging'
+ROLLUP_DIR = 'rollups'
+
+# Columns kept in the history store
+HISTORY_COLUMNS = [
+    'instance_date',
+    'area_name_en',
+    'property_sub_type_en',
+    'reg_type_en',
+    'property_usage_en',
+    'procedure_area',
+    'bedrooms',
+    'has_parking',
+    'actual_worth',
+    'price_per_sqm'
+]
+
+# The area summary compares the latest 12 months with the 12 before; that 24-month window can reach
+# back into the second year before the latest one
+SUMMARY_MONTHS = 24
+SUMMARY_YEARS = 2
+
+ROLLUP_FILES = {
+    'area_month_subtype': 'area_month_subtype.parquet',
+    'area_month': 'area_month.parquet',
+    'area_summary': 'area_summary.parquet'
+}
+
+
+def ingest_transactions(paths, store_dir=DEFAULT_STORE_DIR, chunksize=None):
+    """Convert transaction CSVs into the partitioned Parquet history store and build the rollups"""
+    from transactions import DEFAULT_CHUNK_SIZE, read_transactions
+
+    start_time = time.time()
+    history_dir = os.path.join(store_dir, HISTORY_DIR)
+    staging_dir = os.path.join(store_dir, STAGING_DIR)
+    for directory in [history_dir, staging_dir]:
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+
+    # Pass 1: spill chunks to per-year staging files so memory stays bounded by the chunk size
+    total = 0
+    for chunk in read_transactions(paths, chunksize=chunksize or DEFAULT_CHUNK_SIZE):
+        columns = [column for column in HISTORY_COLUMNS if column in chunk.columns]
+        chunk = chunk[columns].copy()
+        chunk['year'] = chunk['instance_date'].dt.year.astype(np.int16)
+        chunk['procedure_area'] = chunk['procedure_area'].astype(np.float32)
+        chunk['price_per_sqm'] = chunk['price_per_sqm'].astype(np.float32)
+        chunk.to_parquet(staging_dir, partition_cols=['year'], index=False)
+        total += len(chunk)
+        print(f"  Staged {total:,} transactions...")
+
+    # Pass 2: compact each year into one dictionary-encoded file per area and roll it up
+    rollups = []
+    years = staged_years(staging_dir)
+    for year in years:
+        frame = pd.read_parquet(os.path.join(staging_dir, f'year={year}'))
+        frame['area_name_en'] = frame['area_name_en'].astype(str)
+        frame = frame.sort_values(['area_name_en', 'instance_date'])
+        frame.to_parquet(os.path.join(history_dir, f'year={year}'), partition_cols=['area_name_en'], index=False)
+        rollups.append(rollup_year(frame, keep_recent=year >= years[-1] - SUMMARY_YEARS))
+        prune_recent(rollups)
+        print(f"  Compacted {year}: {len(frame):,} transactions")
+    shutil.rmtree(staging_dir)
+
+    write_rollups(store_dir, rollups)
+    print(f"Market store written to {store_dir}: {total:,} transactions in {time.time() - start_time:.1f}s")
+
+
+def staged_years(directory):
+    """Years present as year=YYYY partitions in a directory"""
+    return sorted(int(name.split('=', 1)[1]) for name in os.listdir(directory) if name.startswith('year='))
+
+
+def rollup_year(frame, keep_recent=True):
+    """
+    Median price per sqm by (area, month, sub-type) and by (area, month) for one year of transactions.
+
+    The transaction-level (date, area, price per sqm) frame needed for the area summary is only
+    kept when keep_recent is set; it is None otherwise.
+    """
+    frame = frame.assign(month=frame['instance_date'].dt.to_period('M').dt.to_timestamp())
+    aggregations = dict(
+        transactions=('price_per_sqm', 'size'),
+        median_price_per_sqm=('price_per_sqm', 'median'),
+        median_price=('actual_worth', 'median')
+    )
+    by_subtype = frame.groupby(['area_name_en', 'month', 'property_sub_type_en'], observed=True).agg(**aggregations)
+    by_area = frame.groupby(['area_name_en', 'month'], observed=True).agg(**aggregations)
+    recent = frame[['instance_date', 'area_name_en', 'price_per_sqm']] if keep_recent else None
+    return by_subtype.reset_index(), by_area.reset_index(), recent
+
+
+def prune_recent(rollups):
+    """Drop the transaction-level frames of years that end before the summary window of the latest month so far"""
+    latest_month = max(by_area['month'].max() for _, by_area, _ in rollups)
+    previous_start = latest_month - pd.DateOffset(months=SUMMARY_MONTHS - 1)
+    for index, (by_subtype, by_area, recent) in enumerate(rollups):
+        if recent is not None and by_area['month'].max() < previous_start:
+            rollups[index] = (by_subtype, by_area, None)
+
+
+def build_rollups(store_dir=DEFAULT_STORE_DIR):
+    """Recompute the rollups from an existing history store, one year partition at a time"""
+    history_dir = os.path.join(store_dir, HISTORY_DIR)
+    rollups = []
+    years = staged_years(history_dir)
+    for year in years:
+        frame = pd.read_parquet(
+            os.path.join(history_dir, f'year={year}'),
+            columns=['instance_date', 'area_name_en', 'property_sub_type_en', 'actual_worth', 'price_per_sqm']
+        )
+        frame['area_name_en'] = frame['area_name_en'].astype(str)
+        rollups.append(rollup_year(frame, keep_recent=year >= years[-1] - SUMMARY_YEARS))
+        prune_recent(rollups)
+        print(f"  Rolled up {year}: {len(frame):,} transactions")
+    write_rollups(store_dir, rollups)
+
+
+def write_rollups(store_dir, rollups):
+    """Write the monthly rollups and the latest-12-months area summary"""
+    rollup_dir = os.path.join(store_dir, ROLLUP_DIR)
+    os.makedirs(rollup_dir, exist_ok=True)
+
+    area_month_subtype = pd.concat([by_subtype for by_subtype, _, _ in rollups], ignore_index=True)
+    area_month_subtype['property_sub_type_en'] = area_month_subtype['property_sub_type_en'].astype(str)
+    area_month = pd.concat([by_area for _, by_area, _ in rollups], ignore_index=True)
+    area_month_subtype.to_parquet(os.path.join(rollup_dir, ROLLUP_FILES['area_month_subtype']), index=False)
+    area_month.to_parquet(os.path.join(rollup_dir, ROLLUP_FILES['area_month']), index=False)
+
+    # Latest 12 months per area versus the 12 months before (only the years kept by prune_recent)
+    latest_month = area_month['month'].max()
+    recent_start = latest_month - pd.DateOffset(months=11)
+    previous_start = recent_start - pd.DateOffset(months=12)
+    window = pd.concat([recent for _, _, recent in rollups if recent is not None], ignore_index=True)
+    recent = window[window['instance_date'] >= recent_start]
+    previous = window[(window['instance_date'] >= previous_start) & (window['instance_date'] < recent_start)]
+
+    summary = recent.groupby('area_name_en').agg(
+        transactions_12m=('price_per_sqm', 'size'),
+        median_price_per_sqm_12m=('price_per_sqm', 'median')
+    )
+    summary['previous_median_price_per_sqm'] = previous.groupby('area_name_en')['price_per_sqm'].median()
+    summary['yoy_change_pct'] = (
+        (summary['median_price_per_sqm_12m'] / summary['previous_median_price_per_sqm'] - 1) * 100
+    )
+    summary = summary.reset_index().sort_values('median_price_per_sqm_12m', ascending=False)
+    summary.to_parquet(os.path.join(rollup_dir, ROLLUP_FILES['area_summary']), index=False)
+
+
+class MarketData:
+    """Read-only view over the precomputed rollups, pre-grouped for millisecond lookups"""
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR):
+        rollup_dir = os.path.join(store_dir, ROLLUP_DIR)
+        self.area_month_subtype = pd.read_parquet(os.path.join(rollup_dir, ROLLUP_FILES['area_month_subtype']))
+        self.area_month = pd.read_parquet(os.path.join(rollup_dir, ROLLUP_FILES['area_month']))
+        self.area_summary = pd.read_parquet(os.path.join(rollup_dir, ROLLUP_FILES['area_summary']))
+
+        self._trends = {
+            (area, None): group.sort_values('month').reset_index(drop=True)
+            for area, group in self.area_month.groupby('area_name_en')
+        }
+        self._trends.update({
+            (area, subtype): group.sort_values('month').reset_index(drop=True)
+            for (area, subtype), group in self.area_month_subtype.groupby(['area_name_en', 'property_sub_type_en'])
+        })
+        self.areas = sorted(self.area_month['area_name_en'].unique())
+        self.subtypes = sorted(self.area_month_subtype['property_sub_type_en'].unique())
+
+    def trend(self, area_name_en, property_sub_type_en=None, start=None, end=None):
+        """Monthly medians for an area (optionally one sub-type), or None if there is no data"""
+        trend = self._trends.get((area_name_en, property_sub_type_en))
+        if trend is None:
+            return None
+        if start is not None:
+            trend = trend[trend['month'] >= pd.Timestamp(start)]
+        if end is not None:
+            trend = trend[trend['month'] <= pd.Timestamp(end)]
+        return trend
+
+    def top_areas(self, limit=20, min_transactions=10):
+        """Areas ranked by median price per sqm over the last 12 months"""
+        summary = self.area_summary[self.area_summary['transactions_12m'] >= min_transactions]
+        return summary.head(limit)
+
+
+def to_records(frame):
+    """DataFrame rows as JSON-ready dicts (dates as YYYY-MM, NaN as None)"""
+    frame = frame.copy()
+    if 'month' in frame.columns:
+        frame['month'] = frame['month'].dt.strftime('%Y-%m')
+    frame = frame.round(2).astype(object)
+    return frame.where(frame.notna(), None).to_dict('records')
+
+
+def load_market_data(store_dir=DEFAULT_STORE_DIR):
+    """Load the market rollups if the store has been built, otherwise return None"""
+    if not os.path.exists(os.path.join(store_dir, ROLLUP_DIR, ROLLUP_FILES['area_summary'])):
+        return None
+    return MarketData(store_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar market history store and rollups")
+    parser.add_argument('--data', nargs='+', default=['data/transaction_2000_2024.csv'],
+                        help="Transaction CSV files to ingest")
+    parser.add_argument('--output', default=DEFAULT_STORE_DIR, help="Output directory")
+    parser.add_argument('--chunksize', type=int, default=None, help="CSV rows read per chunk")
+    parser.add_argument('--rollups-only', action='store_true', help="Rebuild rollups from an existing store")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Building market history store")
+    print("=" * 80)
+    if args.rollups_only:
+        build_rollups(args.output)
+    else:
+        ingest_transactions(args.data, args.output, args.chunksize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Batch-size-aware parallelism for forest prediction
+
+The serving layer, not the pickled n_jobs, decides how many threads a prediction uses:
+    inline  the calling thread alone (the model is used through an n_jobs=1 copy)
+    rows    the batch is split into row chunks scored on the shared pool
+    trees   the forest is split into groups of trees scored on the shared pool (sklearn only)
+
+The shared pool has one thread per core this process may use: the usable cores divided by
+WEB_CONCURRENCY (uvicorn/gunicorn worker processes), or PREDICT_THREADS when set. All parallel
+predictions share that pool, so concurrent requests queue for cores instead of each starting its
+own threads, and BLAS/OpenMP pools are capped at one thread since tree inference does not use them.
+Which strategy wins at which batch size is measured on the host at startup.
+"""
+import copy
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+STRATEGIES = ('inline', 'rows', 'trees')
+CALIBRATION_BATCH_SIZES = (500, 5000, 50000)
+CALIBRATION_REPEATS = 3
+
+# A parallel strategy has to beat inline by this factor to be chosen (guards against timing noise)
+MIN_SPEEDUP = 1.15
+
+# Rows per chunk below which splitting a batch is never worthwhile
+MIN_ROWS_PER_CHUNK = 64
+
+
+def usable_cpus():
+    """Cores this process may run on (respects CPU affinity / container cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_threads():
+    """Prediction threads per server process: PREDICT_THREADS, else usable cores / WEB_CONCURRENCY"""
+    if os.environ.get('PREDICT_THREADS'):
+        return max(1, int(os.environ['PREDICT_THREADS']))
+    processes = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+    return max(1, usable_cpus() // processes)
+
+
+def limit_native_threads(limit=1):
+    """Cap BLAS/OpenMP thread pools so they do not compete with the prediction threads"""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        print("Warning: threadpoolctl not installed, native thread pools are not limited")
+        return None
+    return threadpool_limits(limits=limit)
+
+
+def single_threaded(model):
+    """Shallow copy of the model with n_jobs=1, whatever it was pickled with"""
+    if getattr(model, 'n_jobs', 1) in (1, None):
+        return model
+    serial = copy.copy(model)
+    serial.n_jobs = 1
+    return serial
+
+
+def with_estimators(model, estimators):
+    """Shallow copy of a forest using the given trees, always single-threaded"""
+    subset = copy.copy(model)
+    subset.estimators_ = estimators
+    subset.n_estimators = len(estimators)
+    subset.n_jobs = 1
+    return subset
+
+
+class ParallelismPolicy:
+    """Chooses inline, row-chunk or tree-group execution for each predict call"""
+
+    def __init__(self, threads=None):
+        self.threads = threads or default_threads()
+        self.pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='predict') \
+            if self.threads > 1 else None
+        self.routes = {}  # backend name -> [(max_batch_size, strategy)], ascending
+        self.calibration = {}
+        self.lock = threading.Lock()
+        self.calls = dict.fromkeys(STRATEGIES, 0)
+
+    def strategy_for(self, backend, n_rows):
+        if self.pool is None or n_rows < MIN_ROWS_PER_CHUNK * 2:
+            return 'inline'
+        for max_batch_size, strategy in self.routes.get(backend.name, []):
+            if max_batch_size is None or n_rows <= max_batch_size:
+                return strategy
+        return 'inline'
+
+    def predict(self, backend, features, strategy=None):
+        strategy = strategy or self.strategy_for(backend, len(features))
+        if self.pool is None:
+            strategy = 'inline'
+        with self.lock:
+            self.calls[strategy] += 1
+        return self.run(backend, features, strategy)
+
+    def run(self, backend, features, strategy):
+        """Predict with the given strategy without counting the call"""
+        if strategy == 'rows':
+            return np.concatenate(self.map_rows(backend.predict, features))
+        if strategy == 'trees':
+            groups = backend.tree_groups(self.threads)
+            parts = self.pool.map(lambda group: group.predict(features) * group.n_estimators, groups)
+            return sum(parts) / sum(group.n_estimators for group in groups)
+        return backend.predict(features)
+
+    def map_rows(self, function, features):
+        """function applied to row chunks of features on the shared pool, results in row order"""
+        n_chunks = min(self.threads, len(features) // MIN_ROWS_PER_CHUNK)
+        return list(self.pool.map(function, np.array_split(features, n_chunks)))
+
+    def available(self, backend):
+        can_split_trees = hasattr(backend, 'tree_groups') and backend.tree_groups(self.threads) is not None
+        return [strategy for strategy in STRATEGIES if strategy != 'trees' or can_split_trees]
+
+    def calibrate(self, backends, features_for, batch_sizes=CALIBRATION_BATCH_SIZES, repeats=CALIBRATION_REPEATS):
+        """
+        Time each backend's strategies on synthetic batches; a batch size keeps the fastest
+        parallel strategy only when it beats inline by MIN_SPEEDUP.
+
+        features_for(n_rows) returns a feature matrix. Skipped when there is only one thread.
+        Backends that already have routes keep them, so a hot reload never changes the routing
+        table under in-flight requests; only backend names seen for the first time are timed.
+        """
+        if self.pool is None:
+            print("Prediction parallelism: 1 thread, all batches run inline")
+            return
+        if all(name in self.routes or not getattr(backend, 'calibrate', True) for name, backend in backends.items()):
+            return
+        print(f"Calibrating prediction parallelism ({self.threads} threads)...")
+        for name, backend in backends.items():
+            if not getattr(backend, 'calibrate', True) or name in self.routes:
+                continue
+            routes, timings = [], {}
+            for batch_size in batch_sizes:
+                features = features_for(batch_size)
+                results = {}
+                for strategy in self.available(backend):
+                    self.run(backend, features, strategy)  # warm up
+                    best = float('inf')
+                    for _ in range(repeats):
+                        start = time.perf_counter()
+                        self.run(backend, features, strategy)
+                        best = min(best, time.perf_counter() - start)
+                    results[strategy] = best
+                parallel = min((seconds, strategy) for strategy, seconds in results.items() if strategy != 'inline')
+                chosen = parallel[1] if parallel[0] * MIN_SPEEDUP < results['inline'] else 'inline'
+                routes.append((batch_size, chosen))
+                timings[str(batch_size)] = {strategy: round(seconds * 1000, 3) for strategy, seconds in results.items()}
+            # Parallelism only pays more as batches grow: below a size where inline won, stay inline
+            for i in range(len(routes) - 2, -1, -1):
+                if routes[i + 1][1] == 'inline':
+                    routes[i] = (routes[i][0], 'inline')
+            print(f"  {name}: " + ', '.join(f"{size} rows -> {strategy}" for size, strategy in routes))
+
+            # Batches larger than the biggest calibrated size use the strategy chosen for it
+            routes[-1] = (None, routes[-1][1])
+            self.calibration[name] = timings
+            self.routes[name] = routes
+
+    def describe(self):
+        with self.lock:
+            calls = dict(self.calls)
+        return {
+            'threads': self.threads,
+            'usable_cpus': usable_cpus(),
+            'web_concurrency': int(os.environ.get('WEB_CONCURRENCY', 1)),
+            'routes': {
+                name: [{'max_batch_size': size, 'strategy': strategy} for size, strategy in routes]
+                for name, routes in self.routes.items()
+            },
+            'calibration_ms': self.calibration,
+            'calls': calls
+        }
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,214 @@
+"""
+Streaming portfolio valuation: score properties chunk by chunk and keep only running aggregates
+"""
+import csv
+import json
+from collections import deque
+import numpy as np
+
+from area_resolver import MATCH_TYPES, match_counts
+from inference import build_feature_matrix, encode_column
+from postprocessing import postprocess
+from streaming_stats import GroupedSums, QuantileSketch
+
+# Rows scored per model.predict call
+DEFAULT_CHUNK_SIZE = 5000
+
+# Percentiles reported for price and price per sqm
+PERCENTILES = [5, 10, 25, 50, 75, 90, 95]
+
+# Number of row errors echoed back in the summary
+MAX_REPORTED_ERRORS = 10
+
+# Longest CSV record (characters over all its lines) buffered while a quoted field is open
+MAX_CSV_RECORD_CHARS = 64 * 1024
+
+
+class PortfolioAggregator:
+    """Running portfolio totals; memory depends only on the number of encoder classes"""
+
+    def __init__(self, le_area, le_subtype, le_regtype, area_resolver=None, area_multipliers=None):
+        self.le_area = le_area
+        self.area_resolver = area_resolver
+        # Location multipliers by area code (no premium when not given)
+        self.area_multipliers = area_multipliers if area_multipliers is not None else np.ones(len(le_area.classes_))
+        self.area_match_counts = dict.fromkeys(MATCH_TYPES, 0)
+        self.le_subtype = le_subtype
+        self.le_regtype = le_regtype
+        self.total_properties = 0
+        self.invalid_rows = 0
+        self.errors = []
+        self.total_value = 0.0
+        self.by_area = GroupedSums(le_area.classes_)
+        self.by_subtype = GroupedSums(le_subtype.classes_)
+        self.by_regtype = GroupedSums(le_regtype.classes_)
+        self.price_sketch = QuantileSketch()
+        self.price_per_sqm_sketch = QuantileSketch()
+
+    def record_error(self, row_number, message):
+        """Count an unusable row, keeping the first few messages for the summary"""
+        self.invalid_rows += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Row {row_number}: {message}")
+
+    def add_chunk(self, model, properties):
+        """Score a chunk of validated properties and fold the results into the aggregates"""
+        if not properties:
+            return
+
+        area_names = [p.area_name_en for p in properties]
+        if self.area_resolver is not None:
+            area_codes, matches = self.area_resolver.resolve_column(area_names)
+            for match_type, count in match_counts(matches).items():
+                self.area_match_counts[match_type] += count
+        else:
+            area_codes = encode_column(self.le_area, area_names)
+        subtype_codes = encode_column(self.le_subtype, [p.property_sub_type_en for p in properties])
+        regtype_codes = encode_column(self.le_regtype, [p.reg_type_en for p in properties])
+        sizes = np.array([p.procedure_area for p in properties], dtype=np.float64)
+
+        features = build_feature_matrix(
+            sizes,
+            [p.bedrooms for p in properties],
+            [p.has_parking for p in properties],
+            [p.has_project for p in properties],
+            area_codes,
+            subtype_codes,
+            regtype_codes
+        )
+        priced = postprocess(model.predict(features), area_codes, sizes, self.area_multipliers)
+        prices = priced.price
+
+        self.total_properties += len(properties)
+        self.total_value += float(prices.sum())
+        self.by_area.add(area_codes, prices)
+        self.by_subtype.add(subtype_codes, prices)
+        self.by_regtype.add(regtype_codes, prices)
+        self.price_sketch.add(prices)
+        self.price_per_sqm_sketch.add(priced.price_per_sqm)
+
+    def summary(self):
+        """Portfolio summary as a plain dict"""
+        qs = [p / 100 for p in PERCENTILES]
+        price_per_sqm = self.price_per_sqm_sketch.quantiles(qs)
+        prices = self.price_sketch.quantiles(qs)
+        return {
+            'total_properties': self.total_properties,
+            'invalid_rows': self.invalid_rows,
+            'errors': self.errors,
+            'total_value': round(self.total_value, 2),
+            'average_value': round(self.total_value / self.total_properties, 2) if self.total_properties else 0.0,
+            'value_by_area': self.by_area.to_dict(),
+            'value_by_property_subtype': self.by_subtype.to_dict(),
+            'value_by_registration_type': self.by_regtype.to_dict(),
+            'price_per_sqm_percentiles': {
+                f"p{p}": round(v, 2) if v is not None else None for p, v in zip(PERCENTILES, price_per_sqm)
+            },
+            'price_percentiles': {
+                f"p{p}": round(v, 2) if v is not None else None for p, v in zip(PERCENTILES, prices)
+            },
+            'area_resolution': self.area_match_counts
+        }
+
+
+def in_quoted_field(line, in_quotes=False):
+    """
+    Whether a CSV record is still inside a quoted field at the end of line (default dialect).
+
+    Only a quote that opens a field starts a quoted field; any other quote in an unquoted field is
+    literal, as csv.reader treats it. in_quotes is the state at the start of the line.
+    """
+    if not in_quotes and '"' not in line:
+        return False
+    field_start = not in_quotes
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if in_quotes:
+            if char == '"':
+                if line[i + 1:i + 2] == '"':
+                    i += 1  # escaped quote
+                else:
+                    in_quotes = False
+        elif char == ',':
+            field_start = True
+            i += 1
+            continue
+        elif char == '"' and field_start:
+            in_quotes = True
+        field_start = False
+        i += 1
+    return in_quotes
+
+
+async def iter_records(lines, content_type):
+    """
+    Turn an async stream of text lines into (row_number, dict) records, or (row_number, ValueError)
+    for rows that cannot be parsed.
+
+    Supports newline-delimited JSON (one property object per line) and CSV with a header row.
+    CSV lines go through one csv.reader, so quoted fields may span lines: the lines of a record are
+    buffered until its quoted fields close (at most MAX_CSV_RECORD_CHARS, longer records are
+    rejected), then the reader parses the complete record.
+    """
+    if 'csv' in content_type:
+        buffered = deque()
+
+        def buffered_lines():
+            while buffered:
+                yield buffered.popleft()
+
+        reader = csv.reader(buffered_lines())
+        header = None
+        row_number = 0
+        record_lines = []
+        record_chars = 0
+        in_quotes = False
+        async for line in lines:
+            if not record_lines and not line.strip():
+                continue
+            record_lines.append(line + '\n')
+            record_chars += len(line) + 1
+            in_quotes = in_quoted_field(line, in_quotes)
+            if in_quotes:
+                if record_chars <= MAX_CSV_RECORD_CHARS:
+                    continue  # inside a quoted field that continues on the next line
+                # Unterminated quote: drop the record and start again at the next line
+                row_number += 1
+                yield row_number, ValueError(f"Invalid CSV (quoted field longer than {MAX_CSV_RECORD_CHARS:,} "
+                                             f"characters)")
+                record_lines, record_chars, in_quotes = [], 0, False
+                continue
+            buffered.extend(record_lines)
+            record_lines, record_chars = [], 0
+            values = next(reader)
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row_number += 1
+            yield row_number, dict(zip(header, values))
+        if record_lines:
+            row_number += 1
+            yield row_number, ValueError("Invalid CSV (unterminated quoted field at the end of the body)")
+    else:
+        row_number = 0
+        async for line in lines:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                yield row_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, ValueError(f"Invalid JSON ({e})")
+
+
+async def iter_lines(byte_stream):
+    """Split an async byte stream into decoded text lines without buffering the whole body"""
+    pending = b''
+    async for block in byte_stream:
+        pending += block
+        *complete, pending = pending.split(b'\n')
+        for line in complete:
+            yield line.decode('utf-8-sig')
+    if pending:
+        yield pending.decode('utf-8-sig')
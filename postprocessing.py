@@ -0,0 +1,83 @@
+"""
+Shared post-processing of raw model output, used by every prediction path (API, Streamlit, client)
+
+The forest predicts a base price; the final price applies the location multiplier of the
+property's area (through an array aligned with the area codes), and everything shown to users
+(price per sqm, the ±10% range, the location tier) is derived from whole arrays at once.
+Display strings are only built when a caller asks for them.
+"""
+import numpy as np
+
+# Half-width of the estimated price range shown around the prediction
+PRICE_BAND = 0.10
+
+# Location tier names by multiplier (see calculate_location_premiums.py / refresh_model.py)
+TIER_NAMES = {
+    2.0: "Ultra Luxury",
+    1.5: "Luxury",
+    1.2: "Premium",
+    1.0: "Standard",
+    0.9: "Budget"
+}
+
+
+class PricedProperties:
+    """Final prices for a batch of properties, as parallel numpy arrays"""
+
+    def __init__(self, base_prices, multipliers, sizes):
+        self.base_price = np.asarray(base_prices, dtype=np.float64)
+        self.location_multiplier = np.asarray(multipliers, dtype=np.float64)
+        self.price = self.base_price * self.location_multiplier
+        self.price_per_sqm = self.price / np.asarray(sizes, dtype=np.float64)
+        self.lower_bound = self.price * (1 - PRICE_BAND)
+        self.upper_bound = self.price * (1 + PRICE_BAND)
+
+    def __len__(self):
+        return len(self.price)
+
+    def tier_labels(self):
+        """Location tier name per property (computed once per distinct multiplier)"""
+        unique, inverse = np.unique(self.location_multiplier, return_inverse=True)
+        labels = np.array([tier_name(multiplier) for multiplier in unique], dtype=object)
+        return labels[inverse.ravel()]
+
+    def rounded(self, decimals=2):
+        """Columns rounded in one pass and converted to Python floats, ready for JSON responses"""
+        return {
+            'predicted_price': np.round(self.price, decimals).tolist(),
+            'base_price': np.round(self.base_price, decimals).tolist(),
+            'price_per_sqm': np.round(self.price_per_sqm, decimals).tolist(),
+            'price_lower': np.round(self.lower_bound, decimals).tolist(),
+            'price_upper': np.round(self.upper_bound, decimals).tolist(),
+            'location_multiplier': self.location_multiplier.tolist()
+        }
+
+
+def postprocess(base_prices, area_codes, sizes, multiplier_array):
+    """Apply location multipliers by area code and derive per-sqm prices and ranges"""
+    return PricedProperties(base_prices, multiplier_array[np.asarray(area_codes, dtype=np.int64)], sizes)
+
+
+def tier_name(multiplier):
+    """Location tier name for a multiplier"""
+    return TIER_NAMES.get(float(multiplier), "Standard")
+
+
+def format_aed(price):
+    """Full price string, e.g. '1,234,567 AED'"""
+    return f"{price:,.0f} AED"
+
+
+def format_price_millions(price):
+    """Format price in millions (e.g., 1.2M, 1.3M)"""
+    if price >= 1_000_000:
+        millions = price / 1_000_000
+        if millions >= 10:
+            return f"{millions:.1f}M"
+        else:
+            return f"{millions:.2f}M"
+    elif price >= 1_000:
+        thousands = price / 1_000
+        return f"{thousands:.0f}K"
+    else:
+        return f"{price:.0f}"
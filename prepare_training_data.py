@@ -0,0 +1,362 @@
+"""
+Reproducible, out-of-core training data preparation
+
+Splits the transaction CSVs into byte ranges that are parsed in parallel worker processes
+(categorical dtypes, cleaning and the outlier bounds from metadata['price_bounds']). In the same
+pass it gathers the statistics behind validation_rules.json and dynamic_form_rules.json. The main
+process fits the label encoders and writes the feature matrix as memory-mappable .npy files,
+plus the drift monitoring baseline (drift_baseline.json).
+Memory is bounded by the number of byte ranges in flight, not by the size of the history.
+
+Usage:
+    python prepare_training_data.py --data data/transaction_2000_2024.csv data/transaction_2025_cleaned.csv
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from artifacts import DEFAULT_MODEL_DIR, ENCODER_FILES, JSON_FILES, METADATA_FILE, load_json, load_pickle
+from drift import build_baseline
+from inference import FEATURES
+from streaming_stats import QuantileSketch
+
+DEFAULT_OUTPUT_DIR = 'training_data'
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+PARTS_DIR = '_parts'
+
+# Largest size accepted by the API (PropertyInput.procedure_area)
+MAX_PROCEDURE_AREA = 1000
+
+# Categorical model inputs -> encoder name
+ENCODED_COLUMNS = {
+    'area_name_en': 'le_area',
+    'property_sub_type_en': 'le_subtype',
+    'reg_type_en': 'le_regtype'
+}
+
+# Minimum share for a bedroom count / registration type to count as "typical"
+TYPICAL_SHARE = 0.05
+# Minimum rows for a sub-type to get its own validation rule
+MIN_SUBTYPE_ROWS = 100
+
+
+class PrepStatistics:
+    """Mergeable statistics for the validation and form rules"""
+
+    def __init__(self):
+        self.size_by_bedrooms = {}
+        self.size_by_subtype = {}
+        self.subtype_bedrooms = Counter()
+        self.usage_type = Counter()
+        self.type_subtype = Counter()
+        self.usage_subtype = Counter()
+        self.type_regtype = Counter()
+        self.type_rows = Counter()
+        self.type_with_bedrooms = Counter()
+        self.type_with_parking = Counter()
+
+    @staticmethod
+    def sketch(sketches, key):
+        if key not in sketches:
+            sketches[key] = QuantileSketch(min_value=1.0, max_value=100_000)
+        return sketches[key]
+
+    def add(self, chunk):
+        bedrooms = chunk['bedrooms'].to_numpy()
+        sizes = chunk['procedure_area'].to_numpy()
+        for count in range(6):
+            self.sketch(self.size_by_bedrooms, count).add(sizes[bedrooms == count])
+
+        subtypes = chunk['property_sub_type_en'].astype(str)
+        for subtype, group in chunk.groupby(subtypes, observed=True):
+            self.sketch(self.size_by_subtype, subtype).add(group['procedure_area'].to_numpy())
+        self.subtype_bedrooms.update(Counter(zip(subtypes, bedrooms.tolist())))
+
+        if 'property_type_en' in chunk.columns:
+            types = chunk['property_type_en'].astype(str)
+            self.type_subtype.update(Counter(zip(types, subtypes)))
+            self.type_regtype.update(Counter(zip(types, chunk['reg_type_en'].astype(str))))
+            self.type_rows.update(Counter(types))
+            self.type_with_bedrooms.update(Counter(types[bedrooms >= 0]))
+            self.type_with_parking.update(Counter(types[chunk['has_parking'].to_numpy() == 1]))
+            if 'property_usage_en' in chunk.columns:
+                self.usage_type.update(Counter(zip(chunk['property_usage_en'].astype(str), types)))
+        if 'property_usage_en' in chunk.columns:
+            self.usage_subtype.update(Counter(zip(chunk['property_usage_en'].astype(str), subtypes)))
+
+    def merge(self, other):
+        for sketches, other_sketches in [(self.size_by_bedrooms, other.size_by_bedrooms),
+                                         (self.size_by_subtype, other.size_by_subtype)]:
+            for key, sketch in other_sketches.items():
+                self.sketch(sketches, key).merge(sketch)
+        for name in ['subtype_bedrooms', 'usage_type', 'type_subtype', 'usage_subtype', 'type_regtype',
+                     'type_rows', 'type_with_bedrooms', 'type_with_parking']:
+            getattr(self, name).update(getattr(other, name))
+
+    def validation_rules(self, existing=None):
+        """validation_rules.json content derived from the statistics"""
+        rules = dict(existing or {})
+
+        size_ranges = {}
+        for bedrooms, sketch in sorted(self.size_by_bedrooms.items()):
+            if sketch.count == 0:
+                continue
+            q25, median, q75 = sketch.quantiles([0.25, 0.5, 0.75])
+            size_ranges['Studio' if bedrooms == 0 else f'{bedrooms}_bedroom'] = {
+                'min_typical': round(q25, 2),
+                'max_typical': round(q75, 2),
+                'average': round(sketch.mean, 2),
+                'median': round(median, 2),
+                'absolute_min': round(sketch.min, 2),
+                'absolute_max': round(sketch.max, 2)
+            }
+        rules['size_ranges'] = size_ranges
+
+        if self.type_rows:
+            rules['property_type_rules'] = {
+                property_type: {
+                    'must_have_bedrooms': self.type_with_bedrooms[property_type] / rows > 0.5,
+                    'typical_parking_pct': round(100 * self.type_with_parking[property_type] / rows, 2)
+                }
+                for property_type, rows in self.type_rows.most_common()
+            }
+
+        specifics = {}
+        for subtype, sketch in self.size_by_subtype.items():
+            if sketch.count < MIN_SUBTYPE_ROWS:
+                continue
+            counts = {b: n for (s, b), n in self.subtype_bedrooms.items() if s == subtype and b >= 0}
+            total = sum(counts.values())
+            p5, p95 = sketch.quantiles([0.05, 0.95])
+            specifics[subtype] = {
+                'typical_bedrooms': sorted(b for b, n in counts.items() if total and n / total >= TYPICAL_SHARE),
+                'size_range': [int(p5 // 10 * 10), int(-(-p95 // 10) * 10)]
+            }
+        rules['property_subtype_specifics'] = specifics
+        return rules
+
+    def form_rules(self):
+        """dynamic_form_rules.json content derived from the statistics"""
+        def grouped(counter):
+            groups = {}
+            for (parent, child), count in counter.most_common():
+                groups.setdefault(parent, []).append(child)
+            return groups
+
+        usage_rows = Counter()
+        for (usage, _), count in self.usage_type.items():
+            usage_rows[usage] += count
+
+        regtypes = {}
+        for (property_type, regtype), count in self.type_regtype.most_common():
+            if count / self.type_rows[property_type] >= TYPICAL_SHARE:
+                regtypes.setdefault(property_type, []).append(regtype)
+
+        return {
+            'property_usage_options': [usage for usage, _ in usage_rows.most_common()],
+            'property_type_by_usage': grouped(self.usage_type),
+            'property_subtype_by_type': grouped(self.type_subtype),
+            'property_subtype_by_usage': grouped(self.usage_subtype),
+            'requires_bedrooms': {
+                property_type: self.type_with_bedrooms[property_type] / rows > 0.5
+                for property_type, rows in self.type_rows.most_common()
+            },
+            'typical_registration_types': regtypes
+        }
+
+
+def process_range(path, start, end, header, price_bounds):
+    """Worker: parse, clean and compact one byte range of a CSV"""
+    from transactions import read_csv_range
+
+    chunk = read_csv_range(path, start, end, header)
+    rows_read = len(chunk)
+    keep = (
+        (chunk['actual_worth'] >= price_bounds['lower']) & (chunk['actual_worth'] <= price_bounds['upper'])
+        & (chunk['procedure_area'] < MAX_PROCEDURE_AREA)
+        & chunk['property_sub_type_en'].notna() & chunk['reg_type_en'].notna()
+    )
+    chunk = chunk[keep]
+
+    statistics = PrepStatistics()
+    statistics.add(chunk)
+
+    categories = {}
+    codes = {}
+    for column in ENCODED_COLUMNS:
+        values = chunk[column].cat.remove_unused_categories()
+        categories[column] = values.cat.categories.tolist()
+        codes[column] = values.cat.codes.to_numpy().astype(np.int32)
+
+    return {
+        'rows_read': rows_read,
+        'categories': categories,
+        'codes': codes,
+        'procedure_area': chunk['procedure_area'].to_numpy(dtype=np.float32),
+        'bedrooms': np.clip(chunk['bedrooms'].to_numpy(), 0, None).astype(np.int8),
+        'has_parking': chunk['has_parking'].to_numpy(dtype=np.int8),
+        'has_project': chunk['has_project'].to_numpy(dtype=np.int8),
+        'price': chunk['actual_worth'].to_numpy(dtype=np.float64),
+        'days': chunk['instance_date'].to_numpy(dtype='datetime64[D]').astype(np.int32),
+        'statistics': statistics
+    }
+
+
+def prepare_training_data(paths, output_dir=DEFAULT_OUTPUT_DIR, model_dir=DEFAULT_MODEL_DIR, workers=None,
+                          chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Run the pipeline; writes features/target/dates .npy files, encoders and rule files to output_dir"""
+    from sklearn.preprocessing import LabelEncoder
+    from transactions import csv_byte_ranges
+
+    start_time = time.time()
+    workers = workers or os.cpu_count() or 1
+    price_bounds = load_pickle(os.path.join(model_dir, METADATA_FILE))['price_bounds']
+
+    tasks = []
+    for path in paths:
+        header, ranges = csv_byte_ranges(path, chunk_bytes)
+        tasks.extend((path, start, end, header, price_bounds) for start, end in ranges)
+    print(f"  {len(tasks)} byte ranges across {len(paths)} file(s), {workers} workers")
+
+    parts_dir = os.path.join(output_dir, PARTS_DIR)
+    os.makedirs(parts_dir, exist_ok=True)
+
+    # Provisional codes in first-seen order; remapped to sorted LabelEncoder codes at the end
+    dictionaries = {column: {} for column in ENCODED_COLUMNS}
+    statistics = PrepStatistics()
+    part_rows = []
+    rows_read = 0
+
+    def collect(result):
+        nonlocal rows_read
+        rows_read += result['rows_read']
+        statistics.merge(result['statistics'])
+        encoded = {}
+        for column, mapping in dictionaries.items():
+            local_to_global = np.array(
+                [mapping.setdefault(value, len(mapping)) for value in result['categories'][column]] + [-1],
+                dtype=np.int32
+            )
+            encoded[column] = local_to_global[result['codes'][column]]
+        np.savez(
+            os.path.join(parts_dir, f'part-{len(part_rows):05d}.npz'),
+            procedure_area=result['procedure_area'], bedrooms=result['bedrooms'],
+            has_parking=result['has_parking'], has_project=result['has_project'],
+            price=result['price'], days=result['days'], **encoded
+        )
+        part_rows.append(len(result['price']))
+        print(f"  Processed {len(part_rows)}/{len(tasks)} ranges ({sum(part_rows):,} rows kept)")
+
+    # Results are collected in submission order so the output is reproducible; at most
+    # 2 x workers ranges are in flight, which bounds memory use
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(process_range, *task))
+            if len(pending) >= 2 * workers:
+                collect(pending.popleft().result())
+        while pending:
+            collect(pending.popleft().result())
+
+    # Fit the encoders on the complete category sets
+    encoders = {}
+    remaps = {}
+    for column, mapping in dictionaries.items():
+        encoder = LabelEncoder()
+        encoder.fit(list(mapping))
+        encoders[ENCODED_COLUMNS[column]] = encoder
+        sorted_codes = {value: code for code, value in enumerate(encoder.classes_)}
+        remaps[column] = np.array([sorted_codes[value] for value in mapping], dtype=np.int32)
+
+    # Assemble the feature matrix part by part into memory-mapped output files
+    total_rows = sum(part_rows)
+    features = np.lib.format.open_memmap(os.path.join(output_dir, 'features.npy'), mode='w+',
+                                         dtype=np.float32, shape=(total_rows, len(FEATURES)))
+    target = np.lib.format.open_memmap(os.path.join(output_dir, 'target.npy'), mode='w+',
+                                       dtype=np.float64, shape=(total_rows,))
+    dates = np.lib.format.open_memmap(os.path.join(output_dir, 'dates.npy'), mode='w+',
+                                      dtype=np.int32, shape=(total_rows,))
+    offset = 0
+    for index, rows in enumerate(part_rows):
+        part = np.load(os.path.join(parts_dir, f'part-{index:05d}.npz'))
+        block = slice(offset, offset + rows)
+        features[block, 0] = part['procedure_area']
+        features[block, 1] = part['bedrooms']
+        features[block, 2] = part['has_parking']
+        features[block, 3] = part['has_project']
+        features[block, 4] = remaps['area_name_en'][part['area_name_en']]
+        features[block, 5] = remaps['property_sub_type_en'][part['property_sub_type_en']]
+        features[block, 6] = remaps['reg_type_en'][part['reg_type_en']]
+        target[block] = part['price']
+        dates[block] = part['days']
+        offset += rows
+    features.flush()
+    target.flush()
+    dates.flush()
+    shutil.rmtree(parts_dir)
+
+    # Encoders and rule files, written alongside the data (copy into model/ once retrained)
+    for name, encoder in encoders.items():
+        with open(os.path.join(output_dir, ENCODER_FILES[name]), 'wb') as f:
+            pickle.dump(encoder, f)
+    with open(os.path.join(output_dir, JSON_FILES['validation_rules']), 'w') as f:
+        json.dump(statistics.validation_rules(load_json(model_dir, 'validation_rules')), f, indent=2)
+    if statistics.type_rows:
+        with open(os.path.join(output_dir, JSON_FILES['form_rules']), 'w') as f:
+            json.dump(statistics.form_rules(), f, indent=2)
+    with open(os.path.join(output_dir, JSON_FILES['drift_baseline']), 'w') as f:
+        json.dump(build_baseline(features, target, encoders['le_area'].classes_,
+                                 encoders['le_subtype'].classes_), f)
+
+    manifest = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'sources': [os.path.abspath(path) for path in paths],
+        'features': FEATURES,
+        'rows_read': rows_read,
+        'rows_kept': total_rows,
+        'price_bounds': price_bounds,
+        'categories': {ENCODED_COLUMNS[column]: len(mapping) for column, mapping in dictionaries.items()},
+        'seconds': round(time.time() - start_time, 1)
+    }
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_training_data(output_dir=DEFAULT_OUTPUT_DIR):
+    """Memory-map the prepared features, target and dates"""
+    return (np.load(os.path.join(output_dir, 'features.npy'), mmap_mode='r'),
+            np.load(os.path.join(output_dir, 'target.npy'), mmap_mode='r'),
+            np.load(os.path.join(output_dir, 'dates.npy'), mmap_mode='r'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare the training feature matrix from transaction CSVs")
+    parser.add_argument('--data', nargs='+', default=['data/transaction_2000_2024.csv'],
+                        help="Transaction CSV files")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_DIR, help="Output directory")
+    parser.add_argument('--model-dir', default=DEFAULT_MODEL_DIR, help="Artifact with metadata['price_bounds']")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--chunk-mb', type=int, default=DEFAULT_CHUNK_BYTES // (1024 * 1024),
+                        help="Size of each byte range parsed by a worker")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Preparing training data")
+    print("=" * 80)
+    manifest = prepare_training_data(args.data, args.output, args.model_dir, args.workers,
+                                     args.chunk_mb * 1024 * 1024)
+    print(f"Wrote {manifest['rows_kept']:,} of {manifest['rows_read']:,} rows to {args.output} "
+          f"in {manifest['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Opt-in request profiling for the prediction endpoints
+
+A request is profiled when it sends `X-Profile: 1` or is picked by the sampling rate set
+through the admin endpoint. Profiled requests get a cProfile capture of the inference
+call (saved to PROFILE_DIR for download) and a Server-Timing header with wall time per
+stage (parse, encode, validate, predict, serialize). Requests that are not profiled only
+pay for one header lookup and a context-variable read per stage.
+"""
+import asyncio
+import contextlib
+import contextvars
+import cProfile
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_PROFILE_DIR = 'profiles'
+DEFAULT_MAX_PROFILES = 100
+PROFILED_PATHS = ('/predict', '/predict/batch')
+STAGES = ('parse', 'encode', 'validate', 'predict', 'serialize')
+
+PROFILE_NAME_PATTERN = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-z_-]+-[0-9a-f]{6}\.prof$')
+
+_current = contextvars.ContextVar('request_profile', default=None)
+_no_stage = contextlib.nullcontext()
+
+
+class RequestProfile:
+    """Stage timings and CPU profile of one request"""
+
+    def __init__(self, path):
+        self.path = path
+        self.started = time.perf_counter()
+        self.handler_done = None
+        self.timings = dict.fromkeys(STAGES, 0.0)
+        self.cpu_profile = cProfile.Profile()
+        self.name = None
+
+    def add(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def handler_started(self):
+        """Everything before the endpoint body (body read and request validation) counts as parse"""
+        self.add('parse', time.perf_counter() - self.started)
+
+    def wrap(self, fn):
+        """Run fn under cProfile in whichever thread executes it, with this profile current"""
+        def profiled(*args):
+            token = _current.set(self)
+            self.cpu_profile.enable()
+            try:
+                return fn(*args)
+            finally:
+                self.cpu_profile.disable()
+                _current.reset(token)
+                self.handler_done = time.perf_counter()
+        return profiled
+
+    def response_started(self):
+        """Response model validation and JSON encoding by the framework count as serialize"""
+        if self.handler_done is not None:
+            self.add('serialize', time.perf_counter() - self.handler_done)
+
+    def server_timing(self):
+        total = time.perf_counter() - self.started
+        parts = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in self.timings.items()]
+        return ', '.join(parts + [f"total;dur={total * 1000:.3f}"])
+
+
+class Profiler:
+    """Decides which requests to profile and stores the captured profiles on disk"""
+
+    def __init__(self, profile_dir=DEFAULT_PROFILE_DIR, sample_rate=0.0, max_profiles=DEFAULT_MAX_PROFILES):
+        self.profile_dir = profile_dir
+        self.sample_rate = sample_rate
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def wants(self, headers):
+        """Profile when the client asks for it or the request is sampled"""
+        for key, value in headers:
+            if key == b'x-profile':
+                return value.strip() in (b'1', b'true', b'yes')
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def save(self, profile):
+        """Write the cProfile stats (plus stage timings) and return the profile name"""
+        slug = profile.path.strip('/').replace('/', '_') or 'root'
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{slug}-{os.urandom(3).hex()}.prof"
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profile.cpu_profile.dump_stats(os.path.join(self.profile_dir, name))
+        with open(os.path.join(self.profile_dir, name + '.json'), 'w') as f:
+            json.dump({
+                'path': profile.path,
+                'stages_ms': {stage: round(seconds * 1000, 3) for stage, seconds in profile.timings.items()}
+            }, f)
+        self._prune()
+        return name
+
+    def _prune(self):
+        with self._lock:
+            names = self.list_names()
+            for name in names[:max(0, len(names) - self.max_profiles)]:
+                for path in [self.path_for(name), self.path_for(name) + '.json']:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def list_names(self):
+        """Stored profile names, oldest first"""
+        if not os.path.isdir(self.profile_dir):
+            return []
+        return sorted(name for name in os.listdir(self.profile_dir) if PROFILE_NAME_PATTERN.match(name))
+
+    def list_profiles(self):
+        profiles = []
+        for name in reversed(self.list_names()):
+            path = self.path_for(name)
+            try:
+                with open(path + '.json', 'r') as f:
+                    details = json.load(f)
+            except (OSError, ValueError):
+                details = {}
+            profiles.append({
+                'name': name,
+                'path': details.get('path'),
+                'stages_ms': details.get('stages_ms'),
+                'size_bytes': os.path.getsize(path),
+                'created': datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec='seconds')
+            })
+        return profiles
+
+    def path_for(self, name):
+        """File path for a stored profile, or None for names that are not profiles"""
+        if not PROFILE_NAME_PATTERN.match(name):
+            return None
+        return os.path.join(self.profile_dir, name)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that attaches a RequestProfile to selected prediction requests"""
+
+    def __init__(self, app, profiler, paths=PROFILED_PATHS):
+        self.app = app
+        self.profiler = profiler
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.paths or not self.profiler.wants(scope['headers']):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope['path'])
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                profile.response_started()
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', profile.server_timing().encode()))
+                if profile.handler_done is not None:
+                    # Dumping the stats and pruning old profiles is file I/O, keep it off the event loop
+                    name = await asyncio.to_thread(self.profiler.save, profile)
+                    headers.append((b'x-profile-id', name.encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+
+
+def current_profile():
+    """The RequestProfile of the request being handled, or None when it is not profiled"""
+    return _current.get()
+
+
+def stage(name):
+    """Context manager timing one stage of a profiled request (no-op otherwise)"""
+    profile = _current.get()
+    if profile is None:
+        return _no_stage
+    return profile.stage(name)
@@ -0,0 +1,374 @@
+"""
+Incremental model refresh from newly arrived transactions
+
+Extends the existing Random Forest with trees fitted on the new transactions only (warm_start),
+retires old trees according to a configurable policy, updates validation size ranges from
+streaming statistics, and writes a new versioned artifact. Serve MODEL_DIR through a symlink and
+repoint it at the new version to hot swap it (the API's artifact watcher reloads it). Location multiplier re-tiering is only proposed in the report unless
+--update-location-multipliers is given.
+
+Usage:
+    python refresh_model.py --data data/transaction_2025_10.csv --new-trees 20 --retire oldest --max-trees 120
+    python refresh_model.py --data data/transaction_2025_10.csv --compare-full-retrain \\
+        --baseline-data data/transaction_2025_cleaned.csv
+"""
+import argparse
+import copy
+import os
+import time
+
+import numpy as np
+
+from artifacts import DEFAULT_MODEL_DIR, ENCODER_FILES, METADATA_FILE, load_json, load_model, load_pickle, \
+    write_artifact_version
+from inference import build_feature_matrix, class_index
+from streaming_stats import QuantileSketch
+
+# Location multiplier tiers (same values as location_multipliers.json) and the
+# area/overall median price-per-sqm ratio at which each tier starts
+MULTIPLIER_TIERS = [(1.75, 2.0), (1.35, 1.5), (1.1, 1.2), (0.95, 1.0)]
+BUDGET_MULTIPLIER = 0.9
+
+RETIRE_POLICIES = ['none', 'oldest', 'generations']
+
+
+def bedroom_key(bedrooms):
+    return 'Studio' if bedrooms == 0 else f'{bedrooms}_bedroom'
+
+
+class RefreshStatistics:
+    """Streaming size and price-per-sqm statistics gathered while the new data is read"""
+
+    def __init__(self, n_areas):
+        self.size_by_bedrooms = {bedrooms: QuantileSketch(min_value=1.0, max_value=10_000) for bedrooms in range(6)}
+        self.price_per_sqm_by_area = [None] * n_areas
+        self.price_per_sqm = QuantileSketch()
+
+    def add(self, sizes, bedrooms, area_codes, price_per_sqm):
+        for count in range(6):
+            self.size_by_bedrooms[count].add(sizes[bedrooms == count])
+        self.price_per_sqm.add(price_per_sqm)
+        for code in np.unique(area_codes):
+            if self.price_per_sqm_by_area[code] is None:
+                self.price_per_sqm_by_area[code] = QuantileSketch()
+            self.price_per_sqm_by_area[code].add(price_per_sqm[area_codes == code])
+
+    def updated_size_ranges(self, size_ranges, weight):
+        """Blend the current size ranges with the new data (weight = share given to the new data)"""
+        updated = copy.deepcopy(size_ranges)
+        for bedrooms, sketch in self.size_by_bedrooms.items():
+            if sketch.count == 0:
+                continue
+            key = bedroom_key(bedrooms)
+            q25, median, q75 = sketch.quantiles([0.25, 0.5, 0.75])
+            new_values = {'min_typical': q25, 'max_typical': q75, 'average': sketch.mean, 'median': median}
+            current = updated.setdefault(key, {})
+            for field, value in new_values.items():
+                old = current.get(field)
+                current[field] = round(value if old is None else (1 - weight) * old + weight * value, 2)
+            current['absolute_min'] = round(min(current.get('absolute_min', sketch.min), sketch.min), 2)
+            current['absolute_max'] = round(max(current.get('absolute_max', sketch.max), sketch.max), 2)
+        return updated
+
+    def updated_location_multipliers(self, location_multipliers, area_names, min_samples):
+        """Re-tier areas with enough new transactions from their median price per sqm"""
+        updated = dict(location_multipliers or {})
+        overall = self.price_per_sqm.quantile(0.5)
+        changed = {}
+        if overall is None:
+            return updated, changed
+
+        for code, sketch in enumerate(self.price_per_sqm_by_area):
+            if sketch is None or sketch.count < min_samples:
+                continue
+            ratio = sketch.quantile(0.5) / overall
+            multiplier = next((tier for threshold, tier in MULTIPLIER_TIERS if ratio >= threshold), BUDGET_MULTIPLIER)
+            area = str(area_names[code])
+            if updated.get(area, 1.0) != multiplier:
+                changed[area] = {'old': updated.get(area, 1.0), 'new': multiplier}
+            updated[area] = multiplier
+        return dict(sorted(updated.items())), changed
+
+
+def load_training_rows(paths, le_area, le_subtype, le_regtype, price_bounds, statistics=None, chunksize=None):
+    """
+    Read transactions in chunks and turn them into (features, prices, dates).
+
+    Rows with categories the current encoders do not know are dropped (they need a full retrain)
+    and counted in the returned report.
+
+    Unknown bedroom counts (-1, land and commercial units) are kept: the feature column encodes
+    them as 0 exactly like prepare_training_data.py, so the new trees see the same encoding as the
+    existing ones, while the size statistics use the raw counts and skip them (as PrepStatistics
+    does) instead of counting them as Studios.
+    """
+    from transactions import DEFAULT_CHUNK_SIZE, read_transactions
+
+    area_lookup = class_index(le_area)
+    subtype_lookup = class_index(le_subtype)
+    regtype_lookup = class_index(le_regtype)
+    features, prices, dates = [], [], []
+    report = {'rows_read': 0, 'unknown_category_rows': 0, 'out_of_bounds_rows': 0, 'unknown_bedroom_rows': 0}
+
+    for chunk in read_transactions(paths, chunksize=chunksize or DEFAULT_CHUNK_SIZE):
+        report['rows_read'] += len(chunk)
+        area_codes = chunk['area_name_en'].astype(str).map(area_lookup)
+        subtype_codes = chunk['property_sub_type_en'].astype(str).map(subtype_lookup)
+        regtype_codes = chunk['reg_type_en'].astype(str).map(regtype_lookup)
+        known = (area_codes.notna() & subtype_codes.notna() & regtype_codes.notna()).to_numpy()
+        in_bounds = (
+            (chunk['actual_worth'] >= price_bounds['lower']) & (chunk['actual_worth'] <= price_bounds['upper'])
+            & (chunk['procedure_area'] < 1000)
+        ).to_numpy()
+        report['unknown_category_rows'] += int((~known).sum())
+        report['out_of_bounds_rows'] += int((known & ~in_bounds).sum())
+        keep = known & in_bounds
+        if not keep.any():
+            continue
+
+        chunk = chunk[keep]
+        area_codes = area_codes[keep].to_numpy(dtype=np.int64)
+        sizes = chunk['procedure_area'].to_numpy(dtype=np.float64)
+        bedrooms = chunk['bedrooms'].to_numpy()
+        report['unknown_bedroom_rows'] += int((bedrooms < 0).sum())
+        worth = chunk['actual_worth'].to_numpy(dtype=np.float64)
+
+        features.append(build_feature_matrix(
+            sizes,
+            np.clip(bedrooms, 0, None),
+            chunk['has_parking'].to_numpy(),
+            chunk['has_project'].to_numpy(),
+            area_codes,
+            subtype_codes[keep].to_numpy(dtype=np.int64),
+            regtype_codes[keep].to_numpy(dtype=np.int64)
+        ))
+        prices.append(worth)
+        dates.append(chunk['instance_date'].to_numpy(dtype='datetime64[D]'))
+        if statistics is not None:
+            statistics.add(sizes, bedrooms, area_codes, worth / sizes)
+
+    if not features:
+        return np.empty((0, 7)), np.empty(0), np.empty(0, dtype='datetime64[D]'), report
+    return np.vstack(features), np.concatenate(prices), np.concatenate(dates), report
+
+
+def evaluate(model, features, prices):
+    """R² and MAE on a holdout set"""
+    from sklearn.metrics import mean_absolute_error, r2_score
+
+    predictions = model.predict(features)
+    return {'r2_score': round(float(r2_score(prices, predictions)), 4),
+            'mae': round(float(mean_absolute_error(prices, predictions)), 2)}
+
+
+def retire_trees(model, generations, policy, max_trees=None, max_generations=None):
+    """Drop the oldest trees according to the retirement policy; returns the number retired"""
+    keep = np.ones(len(model.estimators_), dtype=bool)
+    if policy == 'oldest' and max_trees and len(model.estimators_) > max_trees:
+        keep[:len(model.estimators_) - max_trees] = False
+    elif policy == 'generations' and max_generations:
+        newest = max(generations)
+        keep = np.array([newest - generation < max_generations for generation in generations])
+
+    model.estimators_ = [tree for tree, kept in zip(model.estimators_, keep) if kept]
+    model.n_estimators = len(model.estimators_)
+    generations[:] = [generation for generation, kept in zip(generations, keep) if kept]
+    return int((~keep).sum())
+
+
+def extend_forest(model, base_estimators, base_generations, new_trees, features, prices, retire,
+                  max_trees=None, max_generations=None):
+    """
+    Reset the forest to base_estimators, add new_trees fitted on (features, prices) with warm_start
+    and retire trees per the policy; returns (tree generations, number retired)
+    """
+    generations = list(base_generations)
+    generation = max(generations) + 1 if generations else 1
+    previous_n_jobs = model.n_jobs
+    model.estimators_ = list(base_estimators)
+    model.set_params(warm_start=True, n_estimators=len(base_estimators) + new_trees, n_jobs=-1)
+    model.fit(features, prices)
+    model.set_params(warm_start=False, n_jobs=previous_n_jobs)
+    generations.extend([generation] * (len(model.estimators_) - len(generations)))
+    retired = retire_trees(model, generations, retire, max_trees, max_generations)
+    return generations, retired
+
+
+def refresh_model(data_paths, model_dir=DEFAULT_MODEL_DIR, new_trees=20, retire='oldest', max_trees=None,
+                  max_generations=None, holdout=0.2, stats_weight=0.25, min_area_samples=30,
+                  update_location_multipliers=False, baseline_paths=None, output_root=None, chunksize=None):
+    """
+    Run the incremental refresh and write a new artifact version; returns the refresh report.
+
+    Accuracy is measured with new trees fitted on all but the newest holdout share of the new rows;
+    the trees shipped in the artifact are then refitted on every new row, holdout included.
+
+    The shipped location multipliers are copied unchanged unless update_location_multipliers is
+    set: the re-tiering compares areas with the refresh window's median price per sqm, which is not
+    the basis the original tiers were computed on, so by default it is only reported.
+    """
+    model = load_model(model_dir)
+    le_area = load_pickle(f'{model_dir}/{ENCODER_FILES["le_area"]}')
+    le_subtype = load_pickle(f'{model_dir}/{ENCODER_FILES["le_subtype"]}')
+    le_regtype = load_pickle(f'{model_dir}/{ENCODER_FILES["le_regtype"]}')
+    metadata = load_pickle(f'{model_dir}/{METADATA_FILE}')
+    validation_rules = load_json(model_dir, 'validation_rules')
+    location_multipliers = load_json(model_dir, 'location_multipliers')
+
+    print("Reading new transactions...")
+    statistics = RefreshStatistics(len(le_area.classes_))
+    features, prices, dates, data_report = load_training_rows(
+        data_paths, le_area, le_subtype, le_regtype, metadata['price_bounds'], statistics, chunksize
+    )
+    if len(prices) == 0:
+        raise ValueError("No usable transactions in the new data")
+
+    # Time-based holdout: the most recent transactions are used to measure accuracy
+    order = np.argsort(dates, kind='stable')
+    split = int(len(order) * (1 - holdout))
+    train_rows, test_rows = order[:split], order[split:]
+    print(f"  {len(train_rows):,} rows for evaluation trees, {len(test_rows):,} held out")
+
+    report = {'data': data_report, 'train_rows': int(len(train_rows)), 'holdout_rows': int(len(test_rows)),
+              'shipped_tree_rows': int(len(prices))}
+    report['previous_model'] = evaluate(model, features[test_rows], prices[test_rows])
+
+    # Extend the forest with trees fitted on the new data only: first without the holdout, to measure it
+    base_estimators = list(model.estimators_)
+    base_generations = list(metadata.get('tree_generations', [0] * len(base_estimators)))
+    start = time.time()
+    extend_forest(model, base_estimators, base_generations, new_trees, features[train_rows], prices[train_rows],
+                  retire, max_trees, max_generations)
+    report['refresh_seconds'] = round(time.time() - start, 2)
+    report['refreshed_model'] = evaluate(model, features[test_rows], prices[test_rows])
+    print(f"  Refresh took {report['refresh_seconds']}s")
+
+    # ...then the shipped trees on every new row, so the newest transactions reach the artifact
+    generations, retired = extend_forest(model, base_estimators, base_generations, new_trees, features, prices,
+                                         retire, max_trees, max_generations)
+    report['trees'] = {'previous': len(base_estimators), 'added': new_trees, 'retired': retired,
+                       'total': len(model.estimators_)}
+    print(f"  Shipped trees refitted on all {len(prices):,} new rows: {report['trees']}")
+
+    if baseline_paths:
+        report['full_retrain'] = full_retrain(
+            baseline_paths, features[train_rows], prices[train_rows], features[test_rows], prices[test_rows],
+            le_area, le_subtype, le_regtype, metadata, chunksize
+        )
+
+    # Updated rules from the streaming statistics
+    json_updates = {}
+    if validation_rules is not None:
+        validation_rules = copy.deepcopy(validation_rules)
+        validation_rules['size_ranges'] = statistics.updated_size_ranges(validation_rules.get('size_ranges', {}),
+                                                                         stats_weight)
+        json_updates['validation_rules'] = validation_rules
+    updated_multipliers, changed = statistics.updated_location_multipliers(
+        location_multipliers, le_area.classes_, min_area_samples
+    )
+    report['location_multiplier_changes'] = changed
+    report['location_multipliers_updated'] = bool(update_location_multipliers)
+    if update_location_multipliers:
+        json_updates['location_multipliers'] = updated_multipliers
+
+    metadata = dict(metadata)
+    metadata.update({
+        'n_estimators': len(model.estimators_),
+        'training_samples': metadata['training_samples'] + len(prices),
+        # Holdout accuracy of the evaluation trees (the shipped trees have also seen the holdout)
+        'r2_score': report['refreshed_model']['r2_score'],
+        'mae': report['refreshed_model']['mae'],
+        'tree_generations': generations
+    })
+
+    output_dir = write_artifact_version(
+        model_dir, model=model, metadata=metadata, json_updates=json_updates,
+        manifest={'refresh_report': report}, output_root=output_root
+    )
+    report['output_dir'] = output_dir
+    return report
+
+
+def full_retrain(baseline_paths, new_features, new_prices, test_features, test_prices,
+                 le_area, le_subtype, le_regtype, metadata, chunksize=None):
+    """Retrain from scratch on baseline + new data with the original hyper-parameters, for comparison"""
+    from sklearn.ensemble import RandomForestRegressor
+
+    print("Full retrain for comparison...")
+    base_features, base_prices, _, _ = load_training_rows(
+        baseline_paths, le_area, le_subtype, le_regtype, metadata['price_bounds'], chunksize=chunksize
+    )
+    start = time.time()
+    model = RandomForestRegressor(
+        n_estimators=metadata.get('n_estimators', 100),
+        max_depth=metadata.get('max_depth'),
+        n_jobs=-1,
+        random_state=42
+    )
+    model.fit(np.vstack([base_features, new_features]), np.concatenate([base_prices, new_prices]))
+    result = {'seconds': round(time.time() - start, 2), 'train_rows': int(len(base_prices) + len(new_prices))}
+    result.update(evaluate(model, test_features, test_prices))
+    print(f"  Full retrain took {result['seconds']}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally refresh the model with new transactions")
+    parser.add_argument('--data', nargs='+', required=True, help="CSV files with the newly arrived transactions")
+    parser.add_argument('--model-dir', default=DEFAULT_MODEL_DIR, help="Artifact to refresh")
+    parser.add_argument('--output-root', default=None, help="Where versions are written (default: model/versions)")
+    parser.add_argument('--new-trees', type=int, default=20, help="Trees fitted on the new data")
+    parser.add_argument('--retire', choices=RETIRE_POLICIES, default='oldest', help="Tree retirement policy")
+    parser.add_argument('--max-trees', type=int, default=None,
+                        help="'oldest' policy: forest size to keep (default: size before the refresh)")
+    parser.add_argument('--max-generations', type=int, default=6,
+                        help="'generations' policy: number of refresh generations to keep")
+    parser.add_argument('--holdout', type=float, default=0.2, help="Share of the newest rows held out for accuracy")
+    parser.add_argument('--stats-weight', type=float, default=0.25,
+                        help="Weight of the new data when blending validation size ranges")
+    parser.add_argument('--min-area-samples', type=int, default=30,
+                        help="New transactions an area needs before its multiplier is re-tiered")
+    parser.add_argument('--update-location-multipliers', action='store_true',
+                        help="Write the re-tiered location multipliers (default: keep the shipped ones, report only)")
+    parser.add_argument('--compare-full-retrain', action='store_true', help="Also time a full retrain")
+    parser.add_argument('--baseline-data', nargs='+', default=None,
+                        help="Original training CSVs (needed for --compare-full-retrain)")
+    parser.add_argument('--chunksize', type=int, default=None, help="CSV rows read per chunk")
+    args = parser.parse_args()
+
+    if args.compare_full_retrain and not args.baseline_data:
+        parser.error("--compare-full-retrain requires --baseline-data")
+
+    max_trees = args.max_trees
+    if args.retire == 'oldest' and max_trees is None:
+        max_trees = len(load_model(args.model_dir).estimators_)
+
+    print("=" * 80)
+    print("Incremental model refresh")
+    print("=" * 80)
+    report = refresh_model(
+        args.data, args.model_dir, new_trees=args.new_trees, retire=args.retire, max_trees=max_trees,
+        max_generations=args.max_generations, holdout=args.holdout, stats_weight=args.stats_weight,
+        min_area_samples=args.min_area_samples, update_location_multipliers=args.update_location_multipliers,
+        baseline_paths=args.baseline_data if args.compare_full_retrain else None,
+        output_root=args.output_root, chunksize=args.chunksize
+    )
+
+    print()
+    print(f"Previous model on holdout:  R² {report['previous_model']['r2_score']:.4f}, "
+          f"MAE {report['previous_model']['mae']:,.0f} AED")
+    print(f"Refreshed model on holdout: R² {report['refreshed_model']['r2_score']:.4f}, "
+          f"MAE {report['refreshed_model']['mae']:,.0f} AED ({report['refresh_seconds']}s)")
+    if 'full_retrain' in report:
+        print(f"Full retrain on holdout:    R² {report['full_retrain']['r2_score']:.4f}, "
+              f"MAE {report['full_retrain']['mae']:,.0f} AED ({report['full_retrain']['seconds']}s)")
+    action = 'changed' if report['location_multipliers_updated'] else 'proposed (not applied)'
+    print(f"Location multiplier changes {action}: {len(report['location_multiplier_changes'])}")
+    print(f"New artifact: {report['output_dir']}")
+    print("Hot swap: serve MODEL_DIR through a symlink and repoint it atomically; the API's artifact watcher")
+    print("reloads within ARTIFACT_CHECK_INTERVAL seconds without a restart:")
+    print(f"  ln -sfn {os.path.abspath(report['output_dir'])} model/current.tmp && mv -T model/current.tmp model/current")
+
+
+if __name__ == "__main__":
+    main()
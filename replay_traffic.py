@@ -0,0 +1,202 @@
+"""
+Replay captured production traffic (traffic_capture.py) against a running API
+
+Re-sends every captured /predict and /predict/batch request, either on the original schedule
+(optionally sped up or slowed down) or as fast as the concurrency allows, and reports latency
+percentiles, throughput and error counts. Predicted prices are compared with the captured ones
+(or with a second server given by --compare-target) to show what a new model version changes.
+
+Usage:
+    python replay_traffic.py captures/ --target http://localhost:8000
+    python replay_traffic.py captures/traffic-*.ndjson.gz --speed 4 --concurrency 16
+    python replay_traffic.py captures/ --speed max --compare-target http://localhost:8001 --output replay.json
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from client import DEFAULT_BASE_URL, HTTPBackend
+from traffic_capture import capture_files, predicted_prices
+
+DEFAULT_CONCURRENCY = 8
+# Relative price difference above which two predictions count as different
+DEFAULT_TOLERANCE = 1e-6
+# Largest differences listed in the report
+TOP_DIFFERENCES = 10
+
+
+def read_capture(paths, limit=None):
+    """Captured records from files and/or capture directories, in arrival order"""
+    files = []
+    for path in paths:
+        files.extend(capture_files(path) if os.path.isdir(path) else [path])
+    records = []
+    for path in files:
+        with gzip.open(path, 'rt') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda record: record['t'])
+    return records[:limit] if limit else records
+
+
+def percentiles(values):
+    if not values:
+        return None
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'p50': round(float(p50), 2), 'p90': round(float(p90), 2), 'p99': round(float(p99), 2),
+            'max': round(float(max(values)), 2), 'mean': round(float(np.mean(values)), 2)}
+
+
+class Replayer:
+    def __init__(self, target, compare_target=None, concurrency=DEFAULT_CONCURRENCY):
+        self.target = HTTPBackend(target, pool_size=concurrency, retries=0)
+        self.compare = HTTPBackend(compare_target, pool_size=concurrency, retries=0) if compare_target else None
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+        self.results = []
+
+    def send(self, backend, record):
+        start = time.perf_counter()
+        url = backend.base_url + record['path'] + (f"?{record['query']}" if record.get('query') else '')
+        response = backend.session.post(url, json=record['body'], timeout=backend.timeout)
+        return response, (time.perf_counter() - start) * 1000
+
+    def replay_one(self, record, lag_ms):
+        try:
+            response, latency_ms = self.send(self.target, record)
+            result = {'path': record['path'], 'n': record.get('n', 1), 'status': response.status_code,
+                      'ms': latency_ms, 'lag_ms': lag_ms, 'captured_ms': record.get('ms')}
+            if response.status_code == 200:
+                result['prices'] = predicted_prices(record['path'], response.content)
+                if self.compare is not None:
+                    reference, _ = self.send(self.compare, record)
+                    if reference.status_code == 200:
+                        result['reference'] = predicted_prices(record['path'], reference.content)
+                elif 'prices' in record:
+                    result['reference'] = record['prices']
+        except Exception as e:
+            result = {'path': record['path'], 'n': record.get('n', 1), 'status': type(e).__name__,
+                      'ms': None, 'lag_ms': lag_ms}
+        with self.lock:
+            self.results.append(result)
+
+    def run(self, records, speed):
+        """speed: None for as fast as possible, otherwise the factor applied to the original pacing"""
+        started = time.perf_counter()
+        first = records[0]['t'] if records else 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for record in records:
+                lag_ms = 0.0
+                if speed is not None:
+                    due = (record['t'] - first) / speed
+                    wait = due - (time.perf_counter() - started)
+                    if wait > 0:
+                        time.sleep(wait)
+                    # How far behind schedule the send is (the server or the replayer cannot keep up)
+                    lag_ms = max(0.0, -wait) * 1000
+                pool.submit(self.replay_one, record, lag_ms)
+        return time.perf_counter() - started
+
+    def close(self):
+        self.target.close()
+        if self.compare is not None:
+            self.compare.close()
+
+
+def summarize(results, seconds, tolerance=DEFAULT_TOLERANCE):
+    ok = [result for result in results if result['status'] == 200]
+    statuses = {}
+    for result in results:
+        statuses[str(result['status'])] = statuses.get(str(result['status']), 0) + 1
+
+    by_path = {}
+    for path in sorted({result['path'] for result in results}):
+        latencies = [result['ms'] for result in ok if result['path'] == path]
+        captured = [result['captured_ms'] for result in ok if result['path'] == path and result.get('captured_ms')]
+        by_path[path] = {'requests': len(latencies), 'latency_ms': percentiles(latencies),
+                         'captured_latency_ms': percentiles(captured)}
+
+    batch_sizes = [result['n'] for result in results if result['path'] == '/predict/batch']
+    report = {
+        'requests': len(results),
+        'seconds': round(seconds, 2),
+        'throughput_rps': round(len(results) / seconds, 2) if seconds else None,
+        'throughput_rows_per_s': round(sum(result['n'] for result in ok) / seconds, 2) if seconds else None,
+        'statuses': statuses,
+        'latency_ms': percentiles([result['ms'] for result in ok]),
+        'schedule_lag_ms': percentiles([result['lag_ms'] for result in results]),
+        'by_path': by_path,
+        'batch_sizes': percentiles(batch_sizes)
+    }
+
+    # Prediction differences against the captured prices or the comparison server
+    compared = [result for result in ok if result.get('reference') is not None
+                and len(result['reference']) == len(result['prices'])]
+    if compared:
+        prices = np.concatenate([np.asarray(result['prices'], dtype=np.float64) for result in compared])
+        reference = np.concatenate([np.asarray(result['reference'], dtype=np.float64) for result in compared])
+        relative = np.abs(prices - reference) / np.maximum(np.abs(reference), 1.0)
+        order = np.argsort(-relative)[:TOP_DIFFERENCES]
+        report['prediction_differences'] = {
+            'predictions_compared': int(len(prices)),
+            'different': int((relative > tolerance).sum()),
+            'mean_relative_difference': round(float(relative.mean()), 6),
+            'max_relative_difference': round(float(relative.max()), 6),
+            'largest': [{'price': float(prices[i]), 'reference': float(reference[i]),
+                         'relative_difference': round(float(relative[i]), 6)} for i in order if relative[i] > tolerance]
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured prediction traffic against an API server")
+    parser.add_argument('captures', nargs='+', help="Capture files or directories (default capture dir: captures/)")
+    parser.add_argument('--target', default=DEFAULT_BASE_URL, help="Server to replay against")
+    parser.add_argument('--compare-target', default=None,
+                        help="Second server to diff predictions with (default: the captured prices)")
+    parser.add_argument('--speed', default='1',
+                        help="'max' for no pacing, or a factor applied to the original pacing (1 = original)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Requests in flight at most")
+    parser.add_argument('--limit', type=int, default=None, help="Replay only the first N records")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative price difference counted as a changed prediction")
+    parser.add_argument('--output', default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    records = read_capture(args.captures, args.limit)
+    if not records:
+        parser.error("No captured records found")
+    speed = None if args.speed == 'max' else float(args.speed)
+
+    print(f"Replaying {len(records):,} requests against {args.target} "
+          f"({'max speed' if speed is None else f'{speed}x original pacing'}, concurrency {args.concurrency})...")
+    replayer = Replayer(args.target, args.compare_target, args.concurrency)
+    try:
+        seconds = replayer.run(records, speed)
+    finally:
+        replayer.close()
+    report = summarize(replayer.results, seconds, args.tolerance)
+
+    print(f"Throughput: {report['throughput_rps']} requests/s, {report['throughput_rows_per_s']} properties/s")
+    print(f"Statuses: {report['statuses']}")
+    if report['latency_ms']:
+        latency = report['latency_ms']
+        print(f"Latency: p50 {latency['p50']} ms, p90 {latency['p90']} ms, p99 {latency['p99']} ms, "
+              f"max {latency['max']} ms")
+    differences = report.get('prediction_differences')
+    if differences:
+        print(f"Predictions changed: {differences['different']:,} of {differences['predictions_compared']:,} "
+              f"(max relative difference {differences['max_relative_difference']})")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
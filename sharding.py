@@ -0,0 +1,362 @@
+"""
+Area-sharded sub-models: smaller forests per location tier or per area price cluster
+
+Building trains one forest per shard from the prepared training data (prepare_training_data.py)
+and writes them to <model-dir>/shards with a routing table from area_name_en to shard. Serving
+(ShardedModel, the 'sharded' inference backend) loads a shard from disk the first time one of
+its areas is requested and keeps loaded shards in an LRU bounded by SHARD_CACHE_MB, so a box
+that serves a few areas only holds the forests for those areas.
+
+Partitions:
+    tier     one shard per location tier in location_multipliers.json (Ultra Luxury ... Budget)
+    cluster  --clusters groups of areas with similar median price per sqm in the training data
+
+Usage:
+    python sharding.py --training-data training_data --model-dir model
+    python sharding.py --partition cluster --clusters 8 --n-estimators 60
+"""
+import argparse
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+from artifacts import DEFAULT_MODEL_DIR, ENCODER_FILES, METADATA_FILE, load_json, load_pickle
+from parallelism import single_threaded
+from postprocessing import tier_name
+
+SHARDS_DIR = 'shards'
+SHARD_MANIFEST = 'shards.json'
+PARTITIONS = ['tier', 'cluster']
+
+# Memory budget for loaded shards (their pickle sizes, which track the in-memory tree arrays)
+DEFAULT_SHARD_CACHE_MB = 512
+
+
+def shard_slug(name):
+    return name.lower().replace(' ', '_')
+
+
+def code_remap(source_encoder, target_encoder):
+    """Array mapping codes of source_encoder to codes of target_encoder (-1 where the class is unknown)"""
+    target = {name: code for code, name in enumerate(target_encoder.classes_)}
+    return np.array([target.get(name, -1) for name in source_encoder.classes_], dtype=np.int64)
+
+
+def tier_partition(area_classes, location_multipliers):
+    """Shard per location tier; areas without a multiplier are Standard"""
+    return {area: shard_slug(tier_name(location_multipliers.get(area, 1.0))) for area in area_classes}
+
+
+def cluster_partition(area_classes, features, prices, n_clusters):
+    """Shard per price cluster: areas binned by their median price per sqm into equal-count groups"""
+    area_codes = features[:, 4].astype(np.int64)
+    price_per_sqm = prices / features[:, 0]
+    medians = {}
+    for code in np.unique(area_codes):
+        medians[area_classes[code]] = float(np.median(price_per_sqm[area_codes == code]))
+
+    ordered = sorted(medians, key=medians.get)
+    routing = {}
+    for cluster, areas in enumerate(np.array_split(np.array(ordered, dtype=object), n_clusters)):
+        for area in areas:
+            routing[area] = f'cluster_{cluster:02d}'
+    return routing
+
+
+def evaluate(predictions, prices):
+    """R² and MAE (same measures as refresh_model.evaluate)"""
+    from sklearn.metrics import mean_absolute_error, r2_score
+
+    if len(prices) < 2:
+        return None
+    return {'r2_score': round(float(r2_score(prices, predictions)), 4),
+            'mae': round(float(mean_absolute_error(prices, predictions)), 2)}
+
+
+def build_shards(training_dir, model_dir=DEFAULT_MODEL_DIR, output_dir=None, partition='tier', n_clusters=8,
+                 n_estimators=None, max_depth=None, holdout=0.2, compare=True):
+    """
+    Train one forest per shard, write them with the routing table and return the manifest.
+
+    Each shard is first fit on its rows before the holdout split to measure accuracy on the
+    newest transactions, then refit on all its rows for the shipped forest.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+
+    from prepare_training_data import load_training_data
+
+    output_dir = output_dir or os.path.join(model_dir, SHARDS_DIR)
+    metadata = load_pickle(os.path.join(model_dir, METADATA_FILE))
+    n_estimators = n_estimators or metadata.get('n_estimators', 100)
+    max_depth = max_depth or metadata.get('max_depth')
+
+    # The training data has its own encoders; codes are mapped onto the served model's encoders
+    print("Loading training data...")
+    features, prices, dates = (np.asarray(array) for array in load_training_data(training_dir))
+    features = features.astype(np.float64)
+    keep = np.ones(len(prices), dtype=bool)
+    encoders = {}
+    for column, name in [(4, 'le_area'), (5, 'le_subtype'), (6, 'le_regtype')]:
+        encoders[name] = load_pickle(os.path.join(model_dir, ENCODER_FILES[name]))
+        remap = code_remap(load_pickle(os.path.join(training_dir, ENCODER_FILES[name])), encoders[name])
+        features[:, column] = remap[features[:, column].astype(np.int64)]
+        keep &= features[:, column] >= 0
+    features, prices, dates = features[keep], prices[keep], dates[keep]
+    area_classes = list(encoders['le_area'].classes_)
+    print(f"  {len(prices):,} rows ({int((~keep).sum()):,} dropped for categories the model does not know)")
+
+    # Time-based holdout: the most recent transactions are used to measure accuracy
+    order = np.argsort(dates, kind='stable')
+    split = int(len(order) * (1 - holdout))
+    train_rows, test_rows = order[:split], order[split:]
+
+    if partition == 'tier':
+        routing = tier_partition(area_classes, load_json(model_dir, 'location_multipliers') or {})
+    else:
+        routing = cluster_partition(area_classes, features[train_rows], prices[train_rows], n_clusters)
+
+    area_codes = features[:, 4].astype(np.int64)
+    row_shards = np.array([routing.get(area, '') for area in area_classes], dtype=object)[area_codes]
+    shard_rows = {name: int((row_shards[train_rows] == name).sum()) for name in sorted(set(routing.values()))}
+    shard_rows = {name: rows for name, rows in shard_rows.items() if rows}
+    # Areas of empty shards (and areas outside the routing table) go to the largest shard
+    default_shard = max(shard_rows, key=shard_rows.get)
+    routing = {area: shard if shard in shard_rows else default_shard for area, shard in routing.items()}
+    row_shards = np.array([routing.get(area, default_shard) for area in area_classes], dtype=object)[area_codes]
+
+    def forest(rows):
+        model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth, n_jobs=-1, random_state=42)
+        return model.fit(features[rows], prices[rows])
+
+    os.makedirs(output_dir, exist_ok=True)
+    shards = {}
+    holdout_predictions = np.empty(len(test_rows), dtype=np.float64)
+    for name in shard_rows:
+        rows = train_rows[row_shards[train_rows] == name]
+        held_out = row_shards[test_rows] == name
+        print(f"Training shard {name} on {len(rows):,} rows...")
+        start = time.time()
+        model = forest(rows)
+        if held_out.any():
+            holdout_predictions[held_out] = model.predict(features[test_rows[held_out]])
+            rows = np.concatenate([rows, test_rows[held_out]])
+            print(f"  refitting on all {len(rows):,} rows")
+            model = forest(rows)
+        filename = f'shard-{name}.pkl'
+        with open(os.path.join(output_dir, filename), 'wb') as f:
+            pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+        shards[name] = {
+            'file': filename,
+            'areas': sorted(area for area, shard in routing.items() if shard == name),
+            'train_rows': int(len(rows)),
+            'bytes': os.path.getsize(os.path.join(output_dir, filename)),
+            'seconds': round(time.time() - start, 2)
+        }
+
+    manifest = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'partition': partition,
+        'n_estimators': n_estimators,
+        'max_depth': max_depth,
+        'default_shard': default_shard,
+        'shards': shards,
+        'routing': routing
+    }
+    if compare and len(test_rows):
+        # The shipped monolithic model may have seen the holdout rows, so the reference forest is
+        # fit on the same rows as the holdout shards
+        print(f"Training the reference monolithic forest on {len(train_rows):,} rows...")
+        manifest['comparison'] = compare_with_monolithic(
+            model_dir, forest(train_rows), holdout_predictions, features[test_rows], prices[test_rows],
+            row_shards[test_rows], manifest
+        )
+    with open(os.path.join(output_dir, SHARD_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def compare_with_monolithic(model_dir, model, sharded_predictions, features, prices, row_shards, manifest):
+    """
+    Holdout accuracy of the sharded models against a monolithic forest, overall and per shard.
+    Both must be fit on rows before the holdout: sharded_predictions come from the holdout shards.
+    Sizes are those of the shipped files (the shards and the model in model_dir).
+    """
+    print(f"Comparing with the monolithic model on {len(prices):,} held-out rows...")
+    monolithic_predictions = model.predict(features)
+    comparison = {
+        'holdout_rows': int(len(prices)),
+        'sharded': evaluate(sharded_predictions, prices),
+        'sharded_bytes': sum(shard['bytes'] for shard in manifest['shards'].values()),
+        'monolithic': evaluate(monolithic_predictions, prices),
+        'per_shard': {}
+    }
+    for filename in ['random_forest_model.pkl', 'random_forest_model.pkl.gz']:
+        if os.path.exists(os.path.join(model_dir, filename)):
+            comparison['monolithic_bytes'] = os.path.getsize(os.path.join(model_dir, filename))
+            break
+    for name in manifest['shards']:
+        rows = row_shards == name
+        comparison['per_shard'][name] = {
+            'holdout_rows': int(rows.sum()),
+            'sharded': evaluate(sharded_predictions[rows], prices[rows]),
+            'monolithic': evaluate(monolithic_predictions[rows], prices[rows])
+        }
+    return comparison
+
+
+class ShardedModel:
+    """
+    Drop-in predictor over the shards: rows are grouped by the shard of their area and each
+    group is scored by that shard's forest, loaded on first use and evicted least recently used
+    """
+
+    name = 'sharded'
+    # Timing it at startup would load every shard; its batches run inline
+    calibrate = False
+
+    def __init__(self, shard_dir, area_classes, max_bytes=DEFAULT_SHARD_CACHE_MB * 1024 * 1024, manifest=None):
+        if manifest is None:
+            with open(os.path.join(shard_dir, SHARD_MANIFEST), 'r') as f:
+                manifest = json.load(f)
+        self.shard_dir = shard_dir
+        self.max_bytes = max_bytes
+        self.names = list(manifest['shards'])
+        index = {name: i for i, name in enumerate(self.names)}
+        default = index[manifest['default_shard']]
+        routing = manifest['routing']
+        # Shard index aligned with the area codes, so routing a batch is one array lookup
+        self.area_shard = np.array([index.get(routing.get(area), default) for area in area_classes], dtype=np.int64)
+        self.files = [manifest['shards'][name]['file'] for name in self.names]
+        self.sizes = [manifest['shards'][name]['bytes'] for name in self.names]
+
+        self.loaded = OrderedDict()
+        # Shards being loaded: shard index -> Future of its forest, so concurrent misses load it once
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.load_waits = 0
+        self.evictions = 0
+
+    def shard(self, i):
+        """
+        Forest of shard i, loading it (and evicting others past the memory budget) when needed.
+
+        The pickle is read outside the lock, so requests for loaded shards are not held up by a
+        load; concurrent requests for the same missing shard wait for the one load in progress.
+        """
+        with self.lock:
+            model = self.loaded.get(i)
+            if model is not None:
+                self.hits += 1
+                self.loaded.move_to_end(i)
+                return model
+            loading = self.loading.get(i)
+            if loading is None:
+                self.misses += 1
+                future = self.loading[i] = Future()
+            else:
+                self.load_waits += 1
+        if loading is not None:
+            return loading.result()
+
+        try:
+            print(f"Loading model shard {self.names[i]}...")
+            model = single_threaded(load_pickle(os.path.join(self.shard_dir, self.files[i])))
+        except BaseException as e:
+            with self.lock:
+                del self.loading[i]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            del self.loading[i]
+            self.loaded[i] = model
+            if self.max_bytes is not None:
+                while len(self.loaded) > 1 and self.loaded_bytes() > self.max_bytes:
+                    evicted, _ = self.loaded.popitem(last=False)
+                    self.evictions += 1
+                    print(f"Evicted model shard {self.names[evicted]}")
+        future.set_result(model)
+        return model
+
+    def loaded_bytes(self):
+        return sum(self.sizes[i] for i in self.loaded)
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        shard_ids = self.area_shard[features[:, 4].astype(np.int64)]
+        present = np.unique(shard_ids)
+        if len(present) == 1:
+            return self.shard(present[0]).predict(features)
+
+        predictions = np.empty(len(features), dtype=np.float64)
+        for i in present:
+            rows = np.flatnonzero(shard_ids == i)
+            predictions[rows] = self.shard(i).predict(features[rows])
+        return predictions
+
+    def stats(self):
+        with self.lock:
+            return {
+                'shards': len(self.names),
+                'loaded': [self.names[i] for i in self.loaded],
+                'loaded_mb': round(self.loaded_bytes() / (1024 * 1024), 1),
+                'budget_mb': round(self.max_bytes / (1024 * 1024), 1) if self.max_bytes is not None else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'load_waits': self.load_waits,
+                'evictions': self.evictions
+            }
+
+
+def sharded_backend(shard_dir, area_classes, max_mb=DEFAULT_SHARD_CACHE_MB):
+    """Backend factory for backends.register_backend (the monolithic model argument is unused)"""
+    def factory(model):
+        return ShardedModel(shard_dir, area_classes, max_bytes=max_mb * 1024 * 1024)
+    return factory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train area-sharded sub-models with a routing table")
+    parser.add_argument('--training-data', default='training_data', help="Output of prepare_training_data.py")
+    parser.add_argument('--model-dir', default=DEFAULT_MODEL_DIR, help="Artifact whose encoders the shards serve")
+    parser.add_argument('--output', default=None, help="Shard directory (default: <model-dir>/shards)")
+    parser.add_argument('--partition', choices=PARTITIONS, default='tier', help="How areas are grouped into shards")
+    parser.add_argument('--clusters', type=int, default=8, help="'cluster' partition: number of shards")
+    parser.add_argument('--n-estimators', type=int, default=None, help="Trees per shard (default: as the model)")
+    parser.add_argument('--max-depth', type=int, default=None, help="Tree depth (default: as the model)")
+    parser.add_argument('--holdout', type=float, default=0.2, help="Share of the newest rows held out for accuracy")
+    parser.add_argument('--no-compare', action='store_true', help="Skip the reference monolithic forest and the comparison")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("Building model shards")
+    print("=" * 80)
+    manifest = build_shards(
+        args.training_data, args.model_dir, args.output, args.partition, args.clusters,
+        args.n_estimators, args.max_depth, args.holdout, compare=not args.no_compare
+    )
+
+    print()
+    for name, shard in manifest['shards'].items():
+        print(f"{name:>16}: {len(shard['areas']):3d} areas, {shard['train_rows']:,} rows, "
+              f"{shard['bytes'] / (1024 * 1024):.1f} MB")
+    comparison = manifest.get('comparison', {})
+    for label in ['monolithic', 'sharded']:
+        if comparison.get(label):
+            size = comparison.get(f'{label}_bytes')
+            size = f", {size / (1024 * 1024):.1f} MB" if size else ""
+            print(f"{label.capitalize():>16}: R² {comparison[label]['r2_score']:.4f}, "
+                  f"MAE {comparison[label]['mae']:,.0f} AED{size}")
+    print(f"Serve with: INFERENCE_BACKEND=sharded MODEL_DIR={args.model_dir} python api.py")
+
+
+if __name__ == "__main__":
+    main()
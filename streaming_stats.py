@@ -0,0 +1,145 @@
+"""
+Constant-memory streaming statistics (quantile sketches and grouped sums)
+"""
+import math
+import numpy as np
+
+# Up to this many values, add() updates buckets one value at a time (constant cost per value)
+SMALL_ADD = 64
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch with a fixed number of buckets.
+
+    Every value is placed in a bucket whose width grows geometrically, so any
+    quantile is returned within `relative_accuracy` of the true value while
+    memory stays constant regardless of how many values are added.
+    Values outside [min_value, max_value] are clamped into the edge buckets.
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=1e-2, max_value=1e10):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.offset = math.ceil(math.log(min_value) / self.log_gamma)
+        self.n_buckets = math.ceil(math.log(max_value) / self.log_gamma) - self.offset + 1
+        self.counts = np.zeros(self.n_buckets, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def bucket_index(self, values):
+        """Bucket index for each value"""
+        clipped = np.clip(np.asarray(values, dtype=np.float64), self.min_value, self.max_value)
+        index = np.ceil(np.log(clipped) / self.log_gamma).astype(np.int64) - self.offset
+        return np.clip(index, 0, self.n_buckets - 1)
+
+    def add(self, values):
+        """Add an array of values"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) <= SMALL_ADD:
+            # A few values (e.g. one request): scalar updates avoid the full-size bincount
+            for value in values.tolist():
+                self.add_value(value)
+            return
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        self.counts += np.bincount(self.bucket_index(values), minlength=self.n_buckets)
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def add_value(self, value):
+        """Add a single value in constant time"""
+        if not math.isfinite(value):
+            return
+        clipped = min(max(value, self.min_value), self.max_value)
+        index = math.ceil(math.log(clipped) / self.log_gamma) - self.offset
+        self.counts[min(max(index, 0), self.n_buckets - 1)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Merge another sketch built with the same parameters into this one"""
+        if other.n_buckets != self.n_buckets or other.offset != self.offset:
+            raise ValueError("Cannot merge sketches with different parameters")
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantiles(self, qs):
+        """Approximate values at the given quantiles (0-1), or None for an empty sketch"""
+        if self.count == 0:
+            return [None for _ in qs]
+        cumulative = np.cumsum(self.counts)
+        ranks = np.clip(np.asarray(qs, dtype=np.float64) * (self.count - 1), 0, self.count - 1)
+        buckets = np.searchsorted(cumulative, ranks, side='right')
+        # Geometric mid-point of each bucket, kept inside the observed range
+        values = 2 * self.gamma ** (buckets + self.offset) / (self.gamma + 1)
+        return [float(v) for v in np.clip(values, self.min, self.max)]
+
+    def quantile(self, q):
+        """Approximate value at quantile q (0-1)"""
+        return self.quantiles([q])[0]
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def to_dict(self):
+        """JSON-serializable form (non-empty buckets only)"""
+        nonzero = np.flatnonzero(self.counts)
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'min_value': self.min_value,
+            'max_value': self.max_value,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'buckets': {str(int(i)): int(self.counts[i]) for i in nonzero}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'], data['min_value'], data['max_value'])
+        for index, count in data['buckets'].items():
+            sketch.counts[int(index)] = count
+        sketch.count = data['count']
+        sketch.total = data['total']
+        if data['count']:
+            sketch.min, sketch.max = data['min'], data['max']
+        return sketch
+
+
+class GroupedSums:
+    """Running count and value sum per category code (fixed size, one slot per encoder class)"""
+
+    def __init__(self, labels):
+        self.labels = list(labels)
+        self.counts = np.zeros(len(self.labels), dtype=np.int64)
+        self.sums = np.zeros(len(self.labels), dtype=np.float64)
+
+    def add(self, codes, values):
+        """Fold a chunk of (code, value) pairs into the running totals"""
+        size = len(self.labels)
+        self.counts += np.bincount(codes, minlength=size)[:size]
+        self.sums += np.bincount(codes, weights=values, minlength=size)[:size]
+
+    def to_dict(self):
+        """Non-empty groups as {label: {count, total_value}}, largest total first"""
+        order = np.argsort(-self.sums, kind='stable')
+        return {
+            str(self.labels[i]): {'count': int(self.counts[i]), 'total_value': round(float(self.sums[i]), 2)}
+            for i in order if self.counts[i] > 0
+        }
@@ -0,0 +1,96 @@
+import importlib
+import os
+import pickle
+import shutil
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import synthetic_features  # noqa: E402
+
+N_AREAS, N_SUBTYPES, N_REGTYPES = 12, 4, 2
+
+REPO_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model')
+
+PROPERTY = {
+    'procedure_area': 100,
+    'bedrooms': 2,
+    'has_parking': 1,
+    'has_project': 1,
+    'area_name_en': 'DUBAI MARINA',
+    'property_sub_type_en': 'Flat',
+    'reg_type_en': 'Off-Plan Properties'
+}
+
+API_ENV = {
+    'INFERENCE_WORKERS': '1',
+    'INFERENCE_QUEUE_SIZE': '0',
+    'ARTIFACT_CHECK_INTERVAL': '0',
+    'INFERENCE_BACKEND': 'sklearn'
+}
+
+
+def synthetic_prices(features, seed=0):
+    """Prices with size, bedroom and area effects, so every feature gets splits"""
+    rng = np.random.default_rng(seed)
+    return (features[:, 0] * 9000 * (1 + features[:, 4] / 10) + features[:, 1] * 60000
+            + features[:, 2] * 40000 + rng.normal(0, 50000, len(features)))
+
+
+@pytest.fixture(scope='session')
+def forest():
+    from sklearn.ensemble import RandomForestRegressor
+
+    features = synthetic_features(4000, N_AREAS, N_SUBTYPES, N_REGTYPES)
+    model = RandomForestRegressor(n_estimators=12, max_depth=10, random_state=0)
+    return model.fit(features, synthetic_prices(features))
+
+
+@pytest.fixture
+def features():
+    return synthetic_features(300, N_AREAS, N_SUBTYPES, N_REGTYPES, seed=7)
+
+
+@pytest.fixture(scope='module')
+def api(tmp_path_factory):
+    """The API module serving a small forest fitted over the shipped encoders"""
+    from sklearn.ensemble import RandomForestRegressor
+
+    from artifacts import MODEL_FILE
+
+    model_dir = tmp_path_factory.mktemp('model')
+    for name in os.listdir(REPO_MODEL_DIR):
+        path = os.path.join(REPO_MODEL_DIR, name)
+        if os.path.isfile(path):
+            shutil.copy(path, model_dir)
+    encoders = [pickle.load(open(os.path.join(model_dir, f'label_encoder_{name}.pkl'), 'rb'))
+                for name in ('area', 'subtype', 'regtype')]
+    features = synthetic_features(3000, *(len(encoder.classes_) for encoder in encoders))
+    model = RandomForestRegressor(n_estimators=8, max_depth=8, random_state=0)
+    model.fit(features, synthetic_prices(features))
+    with open(os.path.join(model_dir, MODEL_FILE), 'wb') as f:
+        pickle.dump(model, f)
+
+    saved = {name: os.environ.get(name) for name in list(API_ENV) + ['MODEL_DIR']}
+    os.environ.update(API_ENV, MODEL_DIR=str(model_dir))
+    sys.modules.pop('api', None)
+    try:
+        yield importlib.import_module('api')
+    finally:
+        sys.modules.pop('api', None)
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@pytest.fixture(scope='module')
+def client(api):
+    from fastapi.testclient import TestClient
+
+    # No startup/shutdown events: no artifact watcher, and the executor stays up between tests
+    return TestClient(api.app)
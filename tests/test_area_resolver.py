@@ -0,0 +1,60 @@
+import pytest
+
+from area_resolver import AreaResolver, match_counts
+
+CLASSES = ['AL BARSHA FIRST', 'BUSINESS BAY', 'DUBAI MARINA', 'JUMEIRAH VILLAGE CIRCLE', "ME'AISEM FIRST"]
+ALIASES = {'JVC': 'JUMEIRAH VILLAGE CIRCLE', 'Marina': 'DUBAI MARINA'}
+
+
+@pytest.fixture
+def resolver():
+    return AreaResolver(CLASSES, ALIASES)
+
+
+def test_exact_match(resolver):
+    match = resolver.resolve('BUSINESS BAY')
+    assert (match.code, match.name, match.match, match.score) == (1, 'BUSINESS BAY', 'exact', 1.0)
+
+
+@pytest.mark.parametrize('value', ['business bay', ' Business-Bay ', 'BUSINESS   BAY'])
+def test_normalized_match(resolver, value):
+    assert resolver.resolve(value)[1:3] == ('BUSINESS BAY', 'normalized')
+
+
+def test_apostrophes_are_ignored(resolver):
+    assert resolver.resolve('MEAISEM FIRST')[1:3] == ("ME'AISEM FIRST", 'normalized')
+
+
+@pytest.mark.parametrize('value, name', [('JVC', 'JUMEIRAH VILLAGE CIRCLE'), ('jvc', 'JUMEIRAH VILLAGE CIRCLE'),
+                                         ('marina', 'DUBAI MARINA')])
+def test_alias_match(resolver, value, name):
+    assert resolver.resolve(value)[1:3] == (name, 'alias')
+
+
+def test_alias_to_unknown_area_is_skipped():
+    resolver = AreaResolver(CLASSES, {'XYZ': 'NOT AN AREA'})
+    assert resolver.resolve('XYZ').match == 'unknown'
+
+
+def test_fuzzy_match(resolver):
+    match = resolver.resolve('Dubai Marinaa')
+    assert (match.name, match.match) == ('DUBAI MARINA', 'fuzzy')
+    assert resolver.min_score <= match.score < 1.0
+
+
+def test_unknown_below_threshold(resolver):
+    match = resolver.resolve('Completely Different Place')
+    assert (match.code, match.match, match.score) == (0, 'unknown', 0.0)
+
+
+def test_min_score_is_the_fuzzy_threshold():
+    score = AreaResolver(CLASSES).resolve('Dubai Marinaa').score  # rounded to 3 decimals
+    assert AreaResolver(CLASSES, min_score=score - 0.001).resolve('Dubai Marinaa').match == 'fuzzy'
+    assert AreaResolver(CLASSES, min_score=score + 0.001).resolve('Dubai Marinaa').match == 'unknown'
+
+
+def test_resolve_column(resolver):
+    values = ['DUBAI MARINA', 'jvc', 'nowhere at all', 'DUBAI MARINA']
+    codes, matches = resolver.resolve_column(values)
+    assert codes.tolist() == [2, 3, 0, 2]
+    assert match_counts(matches) == {'exact': 2, 'normalized': 0, 'alias': 1, 'fuzzy': 0, 'unknown': 1}
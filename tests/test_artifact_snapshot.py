@@ -0,0 +1,33 @@
+from conftest import PROPERTY
+
+COMPARISON = {key: value for key, value in PROPERTY.items() if key != 'area_name_en'}
+
+
+def test_reload_swaps_one_artifact_snapshot(api, client):
+    before = api.current_artifacts()
+    api.load_artifacts()
+    after = api.current_artifacts()
+
+    assert after is not before and after.predictor is api.predictor and after.le_area is api.le_area
+    assert after.model_version == api.model_version
+    assert client.post('/predict', json=PROPERTY).status_code == 200
+
+
+def test_area_comparisons_are_cached_per_snapshot(api, client):
+    body = {**COMPARISON, 'areas': ['DUBAI MARINA']}
+    first = client.post('/predict/compare-areas', json=body)
+    assert first.status_code == 200
+    assert api.current_artifacts().area_comparisons.cache_info().hits == 0
+    assert client.post('/predict/compare-areas', json=body).json() == first.json()
+
+    before = api.current_artifacts()
+    assert before.area_comparisons.cache_info().hits == 1
+    api.load_artifacts()
+    after = api.current_artifacts()
+
+    # A comparison finishing on the old snapshot can only fill the old cache
+    assert after.area_comparisons is not before.area_comparisons
+    assert after.area_comparisons.cache_info().currsize == 0
+    assert client.post('/predict/compare-areas', json=body).json() == first.json()
+    assert before.area_comparisons.cache_info().currsize == 1
+
@@ -0,0 +1,40 @@
+import threading
+
+import numpy as np
+import pytest
+
+from backends import CORRECTNESS_RTOL, BackendRouter, create_backends
+
+
+@pytest.mark.parametrize('name', ['flat', 'lookup'])
+def test_exact_backends_match_sklearn(forest, features, name):
+    backend = create_backends(forest, [name])[name]
+    # Twice: the lookup backend builds its surfaces on the first call and reads them on the second
+    for _ in range(2):
+        np.testing.assert_allclose(backend.predict(features), forest.predict(features),
+                                   rtol=CORRECTNESS_RTOL[name], atol=1e-6)
+
+
+def test_compressed_backend_within_tolerance(forest, features):
+    backend = create_backends(forest, ['compressed'])['compressed']
+    expected = forest.predict(features)
+    predictions = backend.predict(features)
+    assert not np.array_equal(predictions, expected)  # float32 node values
+    np.testing.assert_allclose(predictions, expected, rtol=CORRECTNESS_RTOL['compressed'])
+
+
+def test_compressed_thresholds_keep_split_decisions(forest, features):
+    backend = create_backends(forest, ['compressed'])['compressed']
+    flat = create_backends(forest, ['flat'])['flat']
+    features = features.astype(np.float32).astype(np.float64)
+    np.testing.assert_array_equal(backend.leaves(features), flat.leaves(features))
+
+
+def test_router_counts_calls_from_many_threads(forest, features):
+    router = BackendRouter(create_backends(forest, ['flat']))
+    threads = [threading.Thread(target=lambda: [router.predict(features[:2]) for _ in range(200)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert router.describe()['calls'] == {'flat': 1600}
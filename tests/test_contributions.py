@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from backends import SPARSE_CONTRIBUTION_ROWS, build_router
+from conftest import PROPERTY
+from inference import explain_deduplicated
+
+
+@pytest.mark.parametrize('name', ['sklearn', 'flat', 'compressed', 'lookup'])
+@pytest.mark.parametrize('n_rows', [1, SPARSE_CONTRIBUTION_ROWS - 1, SPARSE_CONTRIBUTION_ROWS, 300])
+def test_contributions_sum_to_prediction(forest, features, name, n_rows):
+    router = build_router(forest, name)
+    predictions, contributions, bias = router.explain(features[:n_rows])
+
+    assert contributions.shape == (n_rows, 7)
+    np.testing.assert_allclose(predictions, router.predict(features[:n_rows]), rtol=1e-5)
+    # The path table is float32: additive up to its rounding
+    np.testing.assert_allclose(bias + contributions.sum(axis=1), predictions, rtol=1e-5)
+
+
+def test_explainer_predictions_match_sklearn(forest, features):
+    predictions, _, _ = build_router(forest, 'sklearn').explain(features)
+    np.testing.assert_allclose(predictions, forest.predict(features), rtol=1e-12)
+
+
+def test_explain_deduplicated_scatters_in_input_order(forest, features):
+    rows = features[np.random.default_rng(1).integers(0, 50, 400)]
+    router = build_router(forest, 'flat')
+
+    predictions, contributions, bias, n_unique = explain_deduplicated(router, rows)
+    _, expected, _ = router.explain(rows)
+
+    np.testing.assert_allclose(predictions, forest.predict(rows), rtol=1e-9)
+    np.testing.assert_allclose(contributions, expected, rtol=1e-6, atol=1e-3)
+    assert n_unique == len(np.unique(rows, axis=0))
+
+
+def test_predict_contributions_add_up(client):
+    body = client.post('/predict?include_contributions=true', json=PROPERTY).json()
+    contributions = body['contributions']
+
+    assert set(contributions['features']) == set(PROPERTY)
+    total = contributions['bias'] + sum(contributions['features'].values())
+    assert total == pytest.approx(body['base_price'], rel=1e-5)
+    assert body['base_price'] + contributions['location_premium'] == pytest.approx(body['predicted_price'], abs=0.05)
+
+
+def test_contributions_are_opt_in(client):
+    assert client.post('/predict', json=PROPERTY).json()['contributions'] is None
@@ -0,0 +1,36 @@
+import numpy as np
+
+from inference import predict_deduplicated, unique_rows
+
+
+class RowSumModel:
+    """Predicts the sum of each row and records the batches it was given"""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, features):
+        self.batches.append(features)
+        return features.sum(axis=1)
+
+
+def test_predict_deduplicated_scatters_in_input_order(features):
+    rows = features[np.random.default_rng(0).integers(0, 20, 500)]
+    model = RowSumModel()
+
+    predictions, n_unique = predict_deduplicated(model, rows)
+
+    np.testing.assert_array_equal(predictions, rows.sum(axis=1))
+    assert n_unique == len(np.unique(rows, axis=0)) == len(model.batches[0])
+
+
+def test_predict_deduplicated_empty():
+    predictions, n_unique = predict_deduplicated(RowSumModel(), np.empty((0, 7)))
+    assert len(predictions) == 0 and n_unique == 0
+
+
+def test_unique_rows_inverse_rebuilds_input(features):
+    rows = np.ascontiguousarray(np.vstack([features, features[::-1]]))
+    unique, inverse = unique_rows(rows)
+    assert len(unique) == len(features)
+    np.testing.assert_array_equal(unique[inverse], rows)
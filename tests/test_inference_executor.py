@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from inference_executor import DeadlineExceeded, InferenceExecutor, QueueFull
+
+
+@pytest.fixture
+def executor():
+    executor = InferenceExecutor(workers=1, queue_size=1)
+    yield executor
+    executor.shutdown()
+
+
+def test_queue_full_is_shed(executor):
+    release = threading.Event()
+    running = executor.submit(release.wait)
+    queued = executor.submit(lambda: 'queued')
+    with pytest.raises(QueueFull):
+        executor.submit(lambda: 'rejected')
+    release.set()
+
+    assert running.result(timeout=5) is True
+    assert queued.result(timeout=5) == 'queued'
+    stats = executor.stats()
+    assert (stats['shed_queue_full'], stats['completed']) == (1, 2)
+
+
+def test_unmeetable_deadline_is_shed_before_queueing(executor):
+    executor.submit(time.sleep, 0.05).result(timeout=5)  # service time estimate of ~50 ms
+    with pytest.raises(DeadlineExceeded):
+        executor.submit(lambda: None, deadline=time.monotonic() + 0.001)
+    assert executor.stats()['shed_deadline'] == 1
+
+
+def test_deadline_expired_in_queue(executor):
+    release = threading.Event()
+    executor.submit(release.wait)
+    queued = executor.submit(lambda: None, deadline=time.monotonic() + 0.01)
+    time.sleep(0.05)
+    release.set()
+    with pytest.raises(DeadlineExceeded):
+        queued.result(timeout=5)
+    assert executor.stats()['shed_deadline'] == 1
+
+
+def test_failures_are_counted_and_release_the_slot(executor):
+    def fail():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        executor.submit(fail).result(timeout=5)
+    assert executor.submit(lambda: 1).result(timeout=5) == 1
+    stats = executor.stats()
+    assert (stats['failed'], stats['completed'], stats['queue_depth']) == (1, 1, 0)
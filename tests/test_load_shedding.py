@@ -0,0 +1,57 @@
+import json
+import threading
+import time
+
+from conftest import PROPERTY
+
+
+def occupy_worker(api, seconds):
+    """Block the single inference worker until the returned event is set (at least `seconds`)"""
+    release = threading.Event()
+
+    def hold():
+        release.wait()
+        time.sleep(seconds)
+
+    return release, api.inference_executor.submit(hold)
+
+
+def test_busy_workers_shed_with_429(api, client):
+    release, held = occupy_worker(api, 0)
+    try:
+        response = client.post('/predict', json=PROPERTY)
+    finally:
+        release.set()
+        held.result(timeout=5)
+
+    assert response.status_code == 429
+    assert response.headers['retry-after'] == '1'
+    assert client.post('/predict', json=PROPERTY).status_code == 200
+
+
+def test_unmeetable_deadline_sheds_with_503(api, client):
+    release, held = occupy_worker(api, 0.1)
+    release.set()
+    held.result(timeout=5)  # the service time estimate is now ~100 ms
+
+    response = client.post('/predict', json=PROPERTY, headers={'X-Deadline-Ms': '1'})
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert client.post('/predict', json=PROPERTY, headers={'X-Deadline-Ms': 'soon'}).status_code == 400
+
+
+def test_portfolio_chunks_share_one_deadline(api, client, monkeypatch):
+    deadlines = []
+    run = api.inference_executor.run
+
+    def record(fn, *args, deadline=None):
+        deadlines.append(deadline)
+        return run(fn, *args, deadline=deadline)
+
+    monkeypatch.setattr(api.inference_executor, 'run', record)
+    body = '\n'.join(json.dumps(PROPERTY) for _ in range(250))
+    response = client.post('/portfolio/valuation?chunk_size=100', content=body,
+                           headers={'Content-Type': 'application/x-ndjson', 'X-Deadline-Ms': '60000'})
+
+    assert response.status_code == 200
+    assert len(deadlines) == 3 and len(set(deadlines)) == 1
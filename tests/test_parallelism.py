@@ -0,0 +1,29 @@
+from backends import calibration_features, create_backends
+from conftest import N_AREAS, N_REGTYPES, N_SUBTYPES
+from parallelism import ParallelismPolicy
+
+
+def features_for(n_rows):
+    return calibration_features(n_rows, N_AREAS, N_SUBTYPES, N_REGTYPES)
+
+
+def test_backends_are_calibrated_once(forest, features):
+    policy = ParallelismPolicy(threads=2)
+    try:
+        policy.calibrate(create_backends(forest, ['sklearn']), features_for, batch_sizes=(256,), repeats=1)
+        routes = policy.routes['sklearn']
+        policy.predict(create_backends(forest, ['sklearn'])['sklearn'], features)
+
+        # A hot reload builds new backends under the same names: routes and call counts are kept
+        policy.calibrate(create_backends(forest, ['sklearn', 'flat']), features_for, batch_sizes=(256,), repeats=1)
+        assert policy.routes['sklearn'] is routes
+        assert set(policy.routes) == {'sklearn', 'flat'}
+        assert sum(policy.describe()['calls'].values()) == 1
+    finally:
+        policy.shutdown()
+
+
+def test_calibration_is_skipped_with_one_thread(forest):
+    policy = ParallelismPolicy(threads=1)
+    policy.calibrate(create_backends(forest, ['sklearn']), features_for)
+    assert policy.routes == {}
@@ -0,0 +1,71 @@
+import asyncio
+
+import portfolio
+from portfolio import in_quoted_field, iter_lines, iter_records
+
+
+async def byte_blocks(body, size):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def records(body, content_type, block_size=7):
+    async def collect():
+        return [record async for record in iter_records(iter_lines(byte_blocks(body, block_size)), content_type)]
+    return asyncio.run(collect())
+
+
+def test_csv_quoted_fields_span_lines():
+    body = ('\ufeffarea_name_en,procedure_area,notes\n'
+            '"DUBAI MARINA",100,"sea view,\nhigh floor"\n'
+            '\n'
+            'BUSINESS BAY,80,"said ""nice""\n\nthen left"\n'
+            'JVC,60,plain\n').encode('utf-8')
+
+    assert records(body, 'text/csv') == [
+        (1, {'area_name_en': 'DUBAI MARINA', 'procedure_area': '100', 'notes': 'sea view,\nhigh floor'}),
+        (2, {'area_name_en': 'BUSINESS BAY', 'procedure_area': '80', 'notes': 'said "nice"\n\nthen left'}),
+        (3, {'area_name_en': 'JVC', 'procedure_area': '60', 'notes': 'plain'})
+    ]
+
+
+def test_csv_quote_inside_unquoted_field_is_literal():
+    body = b'area_name_en,procedure_area,notes\nJVC,50,5" balcony\nJLT,60,a\n"DUBAI MARINA",70,"x,\ny"\nJVC,80,b\n'
+    rows = records(body, 'text/csv')
+    assert [row for _, row in rows] == [
+        {'area_name_en': 'JVC', 'procedure_area': '50', 'notes': '5" balcony'},
+        {'area_name_en': 'JLT', 'procedure_area': '60', 'notes': 'a'},
+        {'area_name_en': 'DUBAI MARINA', 'procedure_area': '70', 'notes': 'x,\ny'},
+        {'area_name_en': 'JVC', 'procedure_area': '80', 'notes': 'b'}
+    ]
+
+
+def test_csv_unterminated_quote_at_end_is_invalid():
+    body = b'area_name_en,notes\r\nJVC,"ok"\r\nJLT,"never closed\r\nstill open'
+    rows = records(body, 'text/csv', block_size=3)
+    assert rows[0] == (1, {'area_name_en': 'JVC', 'notes': 'ok'})
+    assert rows[1][0] == 2 and isinstance(rows[1][1], ValueError)
+    assert len(rows) == 2
+
+
+def test_csv_oversized_quoted_record_is_rejected(monkeypatch):
+    monkeypatch.setattr(portfolio, 'MAX_CSV_RECORD_CHARS', 100)
+    body = ('area_name_en,notes\nJLT,"open\n' + 'x' * 60 + '\n' + 'y' * 60 + '\nJVC,fine\n').encode()
+    rows = records(body, 'text/csv')
+    assert isinstance(rows[0][1], ValueError) and 'longer than' in str(rows[0][1])
+    assert rows[-1] == (len(rows), {'area_name_en': 'JVC', 'notes': 'fine'})
+
+
+def test_in_quoted_field():
+    assert not in_quoted_field('a,5" b,c')
+    assert in_quoted_field('a,"open')
+    assert not in_quoted_field('a,"x ""quoted"" y",b')
+    assert in_quoted_field('still ""inside', in_quotes=True)
+    assert not in_quoted_field('closes" here', in_quotes=True)
+
+
+def test_ndjson_records_and_errors():
+    body = b'{"bedrooms": 1}\n\nnot json\n{"bedrooms": 2}'
+    rows = records(body, 'application/x-ndjson')
+    assert rows[0] == (1, {'bedrooms': 1}) and rows[2] == (3, {'bedrooms': 2})
+    assert isinstance(rows[1][1], ValueError)
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+import sharding
+from sharding import ShardedModel
+
+MANIFEST = {
+    'shards': {'a': {'file': 'a.pkl', 'bytes': 100}, 'b': {'file': 'b.pkl', 'bytes': 100}},
+    'default_shard': 'a',
+    'routing': {'AREA A': 'a', 'AREA B': 'b'}
+}
+
+
+@pytest.fixture
+def slow_loads(monkeypatch):
+    """Record every shard file read; reading 'a.pkl' blocks until the returned event is set"""
+    loads = []
+    release = threading.Event()
+
+    def load_pickle(path):
+        loads.append(path)
+        if path.endswith('a.pkl'):
+            release.wait(5)
+        return object()
+
+    monkeypatch.setattr(sharding, 'load_pickle', load_pickle)
+    monkeypatch.setattr(sharding, 'single_threaded', lambda model: model)
+    return loads, release
+
+
+def test_concurrent_misses_load_a_shard_once(slow_loads):
+    loads, release = slow_loads
+    model = ShardedModel('shards', ['AREA A', 'AREA B'], max_bytes=None, manifest=MANIFEST)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(model.shard(0))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+
+    # Shard b loads (and the stats lock is free) while shard a is still being read
+    model.shard(1)
+    assert model.stats()['loaded'] == ['b']
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert [path for path in loads if path.endswith('a.pkl')] == ['shards/a.pkl']
+    assert len({id(result) for result in results}) == 1
+    stats = model.stats()
+    assert (stats['misses'], stats['load_waits']) == (2, 3)
+
+
+def test_failed_load_is_retried(monkeypatch):
+    calls = []
+
+    def load_pickle(path):
+        calls.append(path)
+        if len(calls) == 1:
+            raise OSError('disk error')
+        return object()
+
+    monkeypatch.setattr(sharding, 'load_pickle', load_pickle)
+    monkeypatch.setattr(sharding, 'single_threaded', lambda model: model)
+    model = ShardedModel('shards', ['AREA A', 'AREA B'], max_bytes=None, manifest=MANIFEST)
+
+    with pytest.raises(OSError):
+        model.shard(0)
+    assert model.shard(0) is model.shard(0)
+    assert len(calls) == 2
+
+
+def test_lru_eviction_past_budget(slow_loads):
+    loads, release = slow_loads
+    release.set()
+    model = ShardedModel('shards', ['AREA A', 'AREA B'], max_bytes=150, manifest=MANIFEST)
+    model.shard(0)
+    model.shard(1)
+    assert model.stats()['loaded'] == ['b'] and model.stats()['evictions'] == 1
+
+
+def test_missing_shards_do_not_fall_back_without_a_model(tmp_path):
+    from backends import build_router, register_backend
+    from parallelism import ParallelismPolicy
+
+    register_backend('sharded', sharding.sharded_backend(str(tmp_path), ['AREA A']), exact=False)
+    policy = ParallelismPolicy(threads=2)
+    try:
+        with pytest.raises(ValueError):
+            build_router(None, 'sharded', policy=policy)
+        assert policy.routes == {}
+    finally:
+        policy.shutdown()
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from streaming_stats import QuantileSketch
+
+QUANTILES = [0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0]
+
+
+@pytest.mark.parametrize('relative_accuracy', [0.01, 0.05])
+@pytest.mark.parametrize('n_values', [50, 100_000])
+def test_quantiles_within_relative_accuracy(relative_accuracy, n_values):
+    values = np.random.default_rng(0).lognormal(mean=9, sigma=1.5, size=n_values)
+    sketch = QuantileSketch(relative_accuracy=relative_accuracy)
+    sketch.add(values)
+
+    # The sketch answers with the value at rank q * (n - 1), rounded down
+    expected = np.quantile(values, QUANTILES, method='lower')
+    relative_error = np.abs(np.array(sketch.quantiles(QUANTILES)) - expected) / expected
+    assert relative_error.max() <= relative_accuracy * (1 + 1e-9)
+
+
+def test_merged_sketches_match_single_sketch():
+    values = np.random.default_rng(1).lognormal(mean=8, sigma=1, size=10_000)
+    single, left, right = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    single.add(values)
+    left.add(values[:3000])
+    for value in values[3000:3040]:
+        right.add_value(value)
+    right.add(values[3040:])
+    left.merge(right)
+
+    assert left.count == single.count
+    assert left.quantiles(QUANTILES) == single.quantiles(QUANTILES)
+
+
+def test_round_trip_and_empty():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) is None
+    sketch.add([10.0, 20.0, 30.0])
+    restored = QuantileSketch.from_dict(sketch.to_dict())
+    assert restored.quantiles(QUANTILES) == sketch.quantiles(QUANTILES)
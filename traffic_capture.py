@@ -0,0 +1,185 @@
+"""
+Opt-in capture of production prediction traffic for replay (see replay_traffic.py)
+
+A sampled request to /predict or /predict/batch is recorded with its arrival time, latency,
+status, batch size, model version, request body and the predicted prices. The middleware only
+copies the bytes of sampled requests and hands them to a bounded queue (dropping records when
+it is full); a background thread parses them and appends compact JSON lines to gzip files in
+CAPTURE_DIR, rotating after CAPTURE_FILE_MB and keeping at most CAPTURE_MAX_FILES files.
+"""
+import gzip
+import json
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_CAPTURE_DIR = 'captures'
+DEFAULT_FILE_MB = 64
+DEFAULT_MAX_FILES = 20
+DEFAULT_QUEUE_SIZE = 10_000
+CAPTURED_PATHS = ('/predict', '/predict/batch')
+FILE_PATTERN = 'traffic-{}.ndjson.gz'
+
+# Seconds between flushes of the current file when traffic is light
+FLUSH_INTERVAL = 5.0
+
+
+def capture_files(directory):
+    """Capture files in a directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith('traffic-') and name.endswith('.ndjson.gz'))
+    return [os.path.join(directory, name) for name in names]
+
+
+def predicted_prices(path, body):
+    """Predicted prices from a /predict or /predict/batch response body"""
+    response = json.loads(body)
+    if path == '/predict':
+        return [response['predicted_price']]
+    return [prediction['predicted_price'] for prediction in response['predictions']]
+
+
+class TrafficCapture:
+    """Bounded queue plus writer thread appending sampled requests to rotating gzip NDJSON files"""
+
+    def __init__(self, directory=DEFAULT_CAPTURE_DIR, sample_rate=0.0, file_mb=DEFAULT_FILE_MB,
+                 max_files=DEFAULT_MAX_FILES, queue_size=DEFAULT_QUEUE_SIZE):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_file_bytes = int(file_mb * 1024 * 1024)
+        self.max_files = max_files
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.captured = 0
+        self.dropped = 0
+        self.errors = 0
+        self._file = None
+        self._file_path = None
+        self._writer = threading.Thread(target=self._write_loop, name='traffic-capture', daemon=True)
+        self._writer.start()
+
+    def wants(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def record(self, record):
+        """Queue a raw record for the writer; never blocks (drops when the queue is full)"""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                if self._file is not None:
+                    self._file.flush()
+                continue
+            if record is None:
+                break
+            try:
+                self._write(self._encode(record))
+                self.captured += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"Warning: Could not capture request: {e}")
+        if self._file is not None:
+            self._file.close()
+
+    def _encode(self, record):
+        """Parse the raw bodies into one compact JSON line"""
+        line = {
+            't': round(record['time'], 3),
+            'path': record['path'],
+            'query': record['query'],
+            'status': record['status'],
+            'ms': round(record['seconds'] * 1000, 2),
+            'version': record['version'],
+            'body': json.loads(record['request']) if record['request'] else None
+        }
+        line['n'] = len(line['body'].get('properties', [])) if record['path'] == '/predict/batch' else 1
+        if record['status'] == 200:
+            line['prices'] = predicted_prices(record['path'], record['response'])
+        return (json.dumps(line, separators=(',', ':')) + '\n').encode()
+
+    def _write(self, data):
+        if self._file is None or self._file.fileobj.tell() >= self.max_file_bytes:
+            self._rotate()
+        self._file.write(data)
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        name = FILE_PATTERN.format(datetime.now().strftime('%Y%m%d-%H%M%S-%f'))
+        self._file_path = os.path.join(self.directory, name)
+        self._file = gzip.open(self._file_path, 'wb')
+        for path in capture_files(self.directory)[:-self.max_files]:
+            os.remove(path)
+
+    def stats(self):
+        return {
+            'sample_rate': self.sample_rate,
+            'capture_dir': self.directory,
+            'captured': self.captured,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queued': self.queue.qsize(),
+            'current_file': self._file_path
+        }
+
+    def shutdown(self):
+        """Write out queued records and close the current file"""
+        self.queue.put(None)
+        self._writer.join(timeout=10)
+
+
+class TrafficCaptureMiddleware:
+    """ASGI middleware that copies sampled prediction requests and responses to a TrafficCapture"""
+
+    def __init__(self, app, capture, version, paths=CAPTURED_PATHS):
+        self.app = app
+        self.capture = capture
+        self.version = version
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.paths or not self.capture.wants():
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.time()
+        started = time.perf_counter()
+        request_chunks, response_chunks = [], []
+        status = [None]
+
+        async def receive_copy():
+            message = await receive()
+            if message['type'] == 'http.request':
+                request_chunks.append(message.get('body', b''))
+            return message
+
+        async def send_copy(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            elif message['type'] == 'http.response.body':
+                response_chunks.append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    self.capture.record({
+                        'time': arrived,
+                        'seconds': time.perf_counter() - started,
+                        'path': scope['path'],
+                        'query': scope.get('query_string', b'').decode('latin-1'),
+                        'status': status[0],
+                        'version': self.version(),
+                        'request': b''.join(request_chunks),
+                        'response': b''.join(response_chunks)
+                    })
+            await send(message)
+
+        await self.app(scope, receive_copy, send_copy)
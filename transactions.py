@@ -0,0 +1,139 @@
+"""
+Helpers for reading the Dubai Land Department transaction CSVs (data/transaction_*.csv)
+"""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+# Columns read from the raw transaction exports (missing ones are derived or skipped)
+RAW_COLUMNS = [
+    'instance_date',
+    'trans_group_en',
+    'property_type_en',
+    'property_sub_type_en',
+    'property_usage_en',
+    'reg_type_en',
+    'area_name_en',
+    'project_name_en',
+    'rooms_en',
+    'bedrooms',
+    'has_parking',
+    'has_project',
+    'procedure_area',
+    'actual_worth'
+]
+
+# String columns read as pandas categoricals to keep chunk memory small
+CATEGORICAL_COLUMNS = [
+    'trans_group_en',
+    'property_type_en',
+    'property_sub_type_en',
+    'property_usage_en',
+    'reg_type_en',
+    'area_name_en',
+    'project_name_en',
+    'rooms_en'
+]
+
+DEFAULT_CHUNK_SIZE = 200_000
+
+
+def parse_bedrooms(rooms):
+    """Map rooms_en values ('Studio', '2 B/R', ...) to a bedroom count, -1 when not applicable"""
+    rooms = rooms.astype('string').str.strip().str.upper()
+    bedrooms = pd.to_numeric(rooms.str.extract(r'^(\d+)\s*B/R', expand=False), errors='coerce')
+    bedrooms = bedrooms.mask(rooms == 'STUDIO', 0)
+    return bedrooms.fillna(-1).astype(np.int8)
+
+
+def normalize_chunk(chunk):
+    """
+    Bring a raw chunk to the standard transaction schema.
+
+    Keeps only sales with a usable date, size and price, derives bedrooms / has_project when the
+    export does not carry them, and adds price_per_sqm.
+    """
+    if 'trans_group_en' in chunk.columns:
+        chunk = chunk[chunk['trans_group_en'].astype('string').str.strip() == 'Sales']
+
+    normalized = pd.DataFrame({
+        'instance_date': pd.to_datetime(chunk['instance_date'], errors='coerce'),
+        'procedure_area': pd.to_numeric(chunk['procedure_area'], errors='coerce'),
+        'actual_worth': pd.to_numeric(chunk['actual_worth'], errors='coerce')
+    }, index=chunk.index)
+
+    if 'bedrooms' in chunk.columns:
+        normalized['bedrooms'] = pd.to_numeric(chunk['bedrooms'], errors='coerce').fillna(-1).astype(np.int8)
+    elif 'rooms_en' in chunk.columns:
+        normalized['bedrooms'] = parse_bedrooms(chunk['rooms_en'])
+    else:
+        normalized['bedrooms'] = np.int8(-1)
+
+    if 'has_parking' in chunk.columns:
+        normalized['has_parking'] = pd.to_numeric(chunk['has_parking'], errors='coerce').fillna(0).astype(np.int8)
+    else:
+        normalized['has_parking'] = np.int8(0)
+
+    if 'has_project' in chunk.columns:
+        normalized['has_project'] = pd.to_numeric(chunk['has_project'], errors='coerce').fillna(0).astype(np.int8)
+    elif 'project_name_en' in chunk.columns:
+        normalized['has_project'] = chunk['project_name_en'].notna().astype(np.int8)
+    else:
+        normalized['has_project'] = np.int8(0)
+
+    for column in ['area_name_en', 'property_sub_type_en', 'reg_type_en', 'property_usage_en',
+                   'property_type_en', 'project_name_en']:
+        if column in chunk.columns:
+            normalized[column] = chunk[column].astype('string').str.strip().astype('category')
+
+    normalized = normalized.dropna(subset=['instance_date', 'procedure_area', 'actual_worth', 'area_name_en'])
+    normalized = normalized[(normalized['procedure_area'] > 0) & (normalized['actual_worth'] > 0)]
+    normalized['price_per_sqm'] = normalized['actual_worth'] / normalized['procedure_area']
+    return normalized.reset_index(drop=True)
+
+
+def read_transactions(paths, chunksize=DEFAULT_CHUNK_SIZE):
+    """Yield normalized chunks from one or more transaction CSVs without loading them whole"""
+    for path in paths:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [column for column in RAW_COLUMNS if column in header]
+        dtype = {column: 'category' for column in CATEGORICAL_COLUMNS if column in usecols}
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize, low_memory=False):
+            yield normalize_chunk(chunk)
+
+
+def csv_byte_ranges(path, chunk_bytes):
+    """
+    Split a CSV into (start, end) byte ranges that begin and end on line boundaries.
+
+    Each range can be parsed independently (e.g. in a separate process). Assumes no quoted
+    field spans several lines, which holds for the transaction exports.
+    Returns the header column names and the ranges.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        header = pd.read_csv(io.BytesIO(f.readline()), nrows=0).columns.tolist()
+        start = f.tell()
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def read_csv_range(path, start, end, header):
+    """Parse and normalize the rows in one byte range of a transaction CSV"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    usecols = [column for column in RAW_COLUMNS if column in header]
+    dtype = {column: 'category' for column in CATEGORICAL_COLUMNS if column in usecols}
+    chunk = pd.read_csv(io.BytesIO(data), names=header, header=None, usecols=usecols, dtype=dtype, low_memory=False)
+    return normalize_chunk(chunk)